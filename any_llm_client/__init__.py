@@ -1,18 +1,33 @@
+from any_llm_client.balancer import LoadBalancer, Replica
+from any_llm_client.cache import (
+    CachedLLMClient,
+    InMemoryResponseCache,
+    ResponseCache,
+    ResponseCacheStats,
+    SQLiteResponseCache,
+)
+from any_llm_client.circuit_breaker import CircuitBreaker, CircuitState
 from any_llm_client.clients.mock import MockLLMClient, MockLLMConfig
-from any_llm_client.clients.openai import OpenAIClient, OpenAIConfig
+from any_llm_client.clients.openai import OpenAIClient, OpenAIConfig, OpenAIReplicaConfig
 from any_llm_client.clients.yandexgpt import YandexGPTClient, YandexGPTConfig
+from any_llm_client.coalescing import CoalescingLLMClient
 from any_llm_client.core import (
     AnyContentItem,
     AnyLLMClientError,
     AssistantMessage,
     ContentItemList,
+    Conversation,
     ImageContentItem,
+    LLMCircuitOpenError,
     LLMClient,
     LLMConfig,
     LLMError,
+    LLMQueueTimeoutError,
+    LLMRequestTimeoutError,
     LLMRequestValidationError,
     LLMResponse,
     LLMResponseValidationError,
+    LLMStreamTimeoutError,
     Message,
     MessageRole,
     OutOfTokensOrSymbolsError,
@@ -20,35 +35,79 @@ from any_llm_client.core import (
     TextContentItem,
     UserMessage,
 )
+from any_llm_client.hedging import HedgedLLMClient, HedgingStats
+from any_llm_client.limiter import (
+    AdaptiveConcurrencyLimiter,
+    ConcurrencyLimitedLLMClient,
+    ConcurrencyLimiter,
+    ConcurrencyLimiterStats,
+    RequestPriority,
+)
 from any_llm_client.main import AnyLLMConfig, get_client
-from any_llm_client.retry import RequestRetryConfig
+from any_llm_client.pipeline import map_llm_messages
+from any_llm_client.rate_limit import RateLimiter
+from any_llm_client.retry import RequestRetryConfig, RetryBudget, RetryBudgetStats
+from any_llm_client.server_metrics import ServerMetrics
+from any_llm_client.transport_pool import SharedTransportPool
+from any_llm_client.warm_up import ConnectionsWarmUp, WarmUpState
 
 
 __all__ = [
+    "AdaptiveConcurrencyLimiter",
     "AnyContentItem",
     "AnyLLMClientError",
     "AnyLLMConfig",
     "AssistantMessage",
+    "CachedLLMClient",
+    "CircuitBreaker",
+    "CircuitState",
+    "CoalescingLLMClient",
+    "ConcurrencyLimitedLLMClient",
+    "ConcurrencyLimiter",
+    "ConcurrencyLimiterStats",
+    "ConnectionsWarmUp",
     "ContentItemList",
+    "Conversation",
+    "HedgedLLMClient",
+    "HedgingStats",
     "ImageContentItem",
+    "InMemoryResponseCache",
+    "LLMCircuitOpenError",
     "LLMClient",
     "LLMConfig",
     "LLMError",
+    "LLMQueueTimeoutError",
+    "LLMRequestTimeoutError",
     "LLMRequestValidationError",
     "LLMResponse",
     "LLMResponseValidationError",
+    "LLMStreamTimeoutError",
+    "LoadBalancer",
     "Message",
     "MessageRole",
     "MockLLMClient",
     "MockLLMConfig",
     "OpenAIClient",
     "OpenAIConfig",
+    "OpenAIReplicaConfig",
     "OutOfTokensOrSymbolsError",
+    "RateLimiter",
+    "Replica",
+    "RequestPriority",
     "RequestRetryConfig",
+    "ResponseCache",
+    "ResponseCacheStats",
+    "RetryBudget",
+    "RetryBudgetStats",
+    "SQLiteResponseCache",
+    "ServerMetrics",
+    "SharedTransportPool",
     "SystemMessage",
     "TextContentItem",
     "UserMessage",
+    "WarmUpState",
     "YandexGPTClient",
     "YandexGPTConfig",
     "get_client",
+    "map_llm_messages",
 ]
@@ -0,0 +1,132 @@
+import contextlib
+import dataclasses
+import hashlib
+import math
+import time
+import typing
+
+from any_llm_client.server_metrics import ServerMetrics
+
+
+@dataclasses.dataclass(kw_only=True, slots=True)
+class Replica:
+    url: str
+    weight: float = 1.0
+    in_flight_count: int = 0
+    consecutive_failures_count: int = 0
+    ejections_count: int = 0
+    "Number of ejections in a row, is reset on success."
+    ejected_until: float = 0.0
+    server_metrics: ServerMetrics | None = None
+
+    def is_available(self, now: float) -> bool:
+        return now >= self.ejected_until
+
+    def get_load(self, now: float, max_server_metrics_age: float) -> float:
+        requests_count = self.in_flight_count + 1.0
+        if self.server_metrics and now - self.server_metrics.scraped_at <= max_server_metrics_age:
+            # Own in-flight requests are counted too, since they're the only load change that is known between scrapes
+            requests_count += self.server_metrics.waiting_requests_count + self.server_metrics.kv_cache_usage
+        return requests_count / self.weight
+
+
+def _get_affinity_score(replica: Replica, affinity_key: bytes) -> float:
+    hash_value: typing.Final = int.from_bytes(
+        hashlib.blake2b(affinity_key + replica.url.encode(), digest_size=8).digest(), "big"
+    )
+    return replica.weight / -math.log((hash_value + 1) / (2**64 + 1))
+
+
+@dataclasses.dataclass(kw_only=True, slots=True)
+class LoadBalancer:
+    """Routes each request to the replica with the fewest in-flight requests relative to its weight.
+
+    Health is tracked passively: a replica is ejected after `max_consecutive_failures` transport or server errors in
+    a row, and readmitted after `base_ejection_time` multiplied by the number of ejections in a row, but not longer
+    than `max_ejection_time`. A readmitted replica that fails again is ejected right away. When all replicas are
+    ejected, the one that is readmitted first is used.
+
+    When replicas have fresh server metrics (see `scrape_server_metrics_periodically()`), requests waiting in the
+    server queue are added to the load, and KV cache usage breaks ties between replicas with equal queues.
+
+    Requests with the same affinity key go to the same replica (chosen with weighted rendezvous hashing, so that
+    only keys of an ejected replica move to other replicas), unless that replica is overloaded: then the next replica
+    in the key's order is used.
+    """
+
+    replicas: list[Replica]
+    max_consecutive_failures: int = 3
+    base_ejection_time: float = 30.0
+    max_ejection_time: float = 300.0
+    max_server_metrics_age: float = 5.0
+    "Server metrics that were scraped earlier than that are ignored."
+    max_affinity_load_factor: float = 1.25
+    "Requests with affinity key skip replicas which load is higher than average load multiplied by this factor."
+    _next_index: int = dataclasses.field(default=0, init=False, repr=False)
+
+    def _pick_least_loaded_replica(self, available_replicas: list[Replica], now: float) -> Replica:
+        # Ties are broken in round-robin order, so that sequential requests are spread across idle replicas
+        start_index: typing.Final = self._next_index % len(available_replicas)
+        self._next_index = start_index + 1
+        return min(
+            available_replicas[start_index:] + available_replicas[:start_index],
+            key=lambda one_replica: one_replica.get_load(now, self.max_server_metrics_age),
+        )
+
+    def _pick_affine_replica(self, available_replicas: list[Replica], now: float, affinity_key: bytes) -> Replica:
+        loads: typing.Final = {
+            one_replica.url: one_replica.get_load(now, self.max_server_metrics_age)
+            for one_replica in available_replicas
+        }
+        max_load: typing.Final = self.max_affinity_load_factor * sum(loads.values()) / len(loads)
+        ranked_replicas: typing.Final = sorted(
+            available_replicas, key=lambda one_replica: _get_affinity_score(one_replica, affinity_key), reverse=True
+        )
+        return next(
+            (one_replica for one_replica in ranked_replicas if loads[one_replica.url] <= max_load),
+            None,
+        ) or self._pick_least_loaded_replica(available_replicas, now)
+
+    def _pick_replica(
+        self, affinity_key: bytes | None, accepts_requests: typing.Callable[[str], bool] | None
+    ) -> Replica:
+        now: typing.Final = time.monotonic()
+        # When no replica accepts requests, the caller rejects the request to whichever replica is picked
+        replicas: typing.Final = (
+            [one_replica for one_replica in self.replicas if accepts_requests(one_replica.url)]
+            if accepts_requests
+            else None
+        ) or self.replicas
+        available_replicas: typing.Final = [one_replica for one_replica in replicas if one_replica.is_available(now)]
+        if not available_replicas:
+            return min(replicas, key=lambda one_replica: one_replica.ejected_until)
+        if affinity_key is None:
+            return self._pick_least_loaded_replica(available_replicas, now)
+        return self._pick_affine_replica(available_replicas, now, affinity_key)
+
+    @contextlib.contextmanager
+    def choose_replica(
+        self, affinity_key: bytes | None = None, *, accepts_requests: typing.Callable[[str], bool] | None = None
+    ) -> typing.Iterator[Replica]:
+        """Choose replica for a request, and count the request as in-flight on it until exit.
+
+        Replicas for which `accepts_requests(url)` is false (for example, with open circuit) are skipped, unless all
+        of them are.
+        """
+        replica: typing.Final = self._pick_replica(affinity_key, accepts_requests)
+        replica.in_flight_count += 1
+        try:
+            yield replica
+        finally:
+            replica.in_flight_count -= 1
+
+    def record_success(self, replica: Replica) -> None:
+        replica.consecutive_failures_count = 0
+        replica.ejections_count = 0
+
+    def record_failure(self, replica: Replica) -> None:
+        replica.consecutive_failures_count += 1
+        now: typing.Final = time.monotonic()
+        if replica.consecutive_failures_count >= self.max_consecutive_failures and replica.is_available(now):
+            replica.ejections_count += 1
+            replica.ejected_until = now + min(self.base_ejection_time * replica.ejections_count, self.max_ejection_time)
@@ -0,0 +1,213 @@
+"""Run prompts from a JSONL file through an LLM and write responses to another JSONL file.
+
+```sh
+export LLM_MODEL='{"api_type": "openai", "url": "http://127.0.0.1:11434/v1/chat/completions", "model_name": "qwen2.5-coder:1.5b"}'
+python -m any_llm_client.batch prompts.jsonl responses.jsonl --max-concurrency 16
+```
+
+Each input line is a JSON object with either `prompt` string or `messages` list, and optional `id`. Each output line
+contains the input line number, `id`, `content` and `reasoning_content`.
+
+Output file is also a checkpoint: responses are appended as soon as they are received, and lines that are already
+in the output file are skipped when the command is run again, for example, after a crash or SIGTERM. Failed lines are
+reported to stderr and are not written, so that they are retried on the next run.
+"""  # noqa: E501
+
+import argparse
+import asyncio
+import contextlib
+import dataclasses
+import json
+import os
+import pathlib
+import signal
+import sys
+import typing
+
+import pydantic
+
+from any_llm_client.core import LLMClient, LLMResponse, Message
+from any_llm_client.main import AnyLLMConfig, get_client
+from any_llm_client.pipeline import map_llm_messages
+
+
+LLM_CONFIG_ENV_NAME: typing.Final = "LLM_MODEL"
+
+
+class BatchInputRow(pydantic.BaseModel):
+    id: typing.Any = None
+    prompt: str | None = None
+    messages: list[Message] | None = None
+
+    @pydantic.model_validator(mode="after")
+    def _check_prompt_or_messages(self) -> "BatchInputRow":
+        if (self.prompt is None) == (self.messages is None):
+            raise ValueError("Exactly one of `prompt` and `messages` is required")
+        return self
+
+    def get_messages(self) -> str | list[Message]:
+        return typing.cast("str | list[Message]", self.prompt if self.messages is None else self.messages)
+
+
+class BatchOutputRow(pydantic.BaseModel):
+    line: int
+    id: typing.Any = None
+    content: str | None
+    reasoning_content: str | None = None
+
+
+@dataclasses.dataclass(slots=True)
+class BatchStats:
+    completed_count: int = 0
+    skipped_count: int = 0
+    failed_count: int = 0
+
+
+def _read_checkpoint(output_path: pathlib.Path) -> set[int]:
+    """Return input line numbers that are already in the output file.
+
+    A line that was torn by a crash in the middle of a write is truncated, so that its request is made again. Other
+    invalid lines are reported to stderr and kept, and their requests are made again too.
+    """
+    completed_lines: typing.Final[set[int]] = set()
+    if not output_path.exists():
+        return completed_lines
+
+    valid_size = 0
+    with output_path.open("rb") as output_file:
+        for output_line_number, one_line in enumerate(output_file, start=1):
+            if not one_line.endswith(b"\n"):
+                break
+            valid_size += len(one_line)
+            try:
+                completed_lines.add(BatchOutputRow.model_validate_json(one_line).line)
+            except pydantic.ValidationError as exception:
+                sys.stderr.write(f"Output line {output_line_number} is invalid, it's requested again: {exception!r}\n")
+    if valid_size < output_path.stat().st_size:
+        with output_path.open("rb+") as output_file:
+            output_file.truncate(valid_size)
+    return completed_lines
+
+
+def _report_failure(line_number: int, error: Exception) -> None:
+    sys.stderr.write(f"Line {line_number} failed: {error!r}\n")
+
+
+def _iter_pending_rows(
+    input_path: pathlib.Path, completed_lines: set[int], stats: BatchStats
+) -> typing.Iterator[tuple[int, BatchInputRow]]:
+    with input_path.open("rb") as input_file:
+        for line_number, one_line in enumerate(input_file, start=1):
+            if line_number in completed_lines:
+                stats.skipped_count += 1
+            elif one_line.strip():
+                try:
+                    yield line_number, BatchInputRow.model_validate_json(one_line)
+                except pydantic.ValidationError as exception:
+                    stats.failed_count += 1
+                    _report_failure(line_number, exception)
+
+
+async def run_batch(
+    client: LLMClient,
+    input_path: pathlib.Path,
+    output_path: pathlib.Path,
+    *,
+    max_concurrency: int = 8,
+    extra: dict[str, typing.Any] | None = None,
+) -> BatchStats:
+    """Request LLM message for each line of input JSONL file that is not in output JSONL file yet."""
+    stats: typing.Final = BatchStats()
+    completed_lines: typing.Final = _read_checkpoint(output_path)
+
+    with output_path.open("a", encoding="utf-8") as output_file:
+        async with contextlib.aclosing(
+            map_llm_messages(
+                client,
+                _iter_pending_rows(input_path, completed_lines, stats),
+                get_messages=lambda item: item[1].get_messages(),
+                extra=extra,
+                max_concurrency=max_concurrency,
+                ordered=False,
+            )
+        ) as results:
+            async for (line_number, input_row), result in results:
+                if isinstance(result, LLMResponse):
+                    output_row = BatchOutputRow(
+                        line=line_number,
+                        id=input_row.id,
+                        content=result.content,
+                        reasoning_content=result.reasoning_content,
+                    )
+                    output_file.write(output_row.model_dump_json() + "\n")
+                    output_file.flush()
+                    stats.completed_count += 1
+                else:
+                    stats.failed_count += 1
+                    _report_failure(line_number, result)
+    return stats
+
+
+def _load_config(config_path: pathlib.Path | None) -> AnyLLMConfig:
+    raw_config: typing.Final = (
+        config_path.read_text(encoding="utf-8") if config_path else os.environ.get(LLM_CONFIG_ENV_NAME)
+    )
+    if raw_config is None:
+        raise SystemExit(f"Pass LLM config in {LLM_CONFIG_ENV_NAME} environment variable or with --config")
+    return pydantic.TypeAdapter(AnyLLMConfig).validate_json(raw_config)
+
+
+async def _run_until_terminated(awaitable: typing.Awaitable[BatchStats]) -> BatchStats:
+    task: typing.Final = asyncio.ensure_future(awaitable)
+    loop: typing.Final = asyncio.get_running_loop()
+    with contextlib.suppress(NotImplementedError):
+        loop.add_signal_handler(signal.SIGTERM, task.cancel)
+    try:
+        return await task
+    finally:
+        with contextlib.suppress(NotImplementedError):
+            loop.remove_signal_handler(signal.SIGTERM)
+
+
+async def _main(arguments: argparse.Namespace) -> BatchStats:
+    async with get_client(_load_config(arguments.config)) as client:
+        return await _run_until_terminated(
+            run_batch(
+                client,
+                arguments.input_path,
+                arguments.output_path,
+                max_concurrency=arguments.max_concurrency,
+                extra=json.loads(arguments.extra) if arguments.extra else None,
+            )
+        )
+
+
+def main(argv: typing.Sequence[str] | None = None) -> int:
+    parser: typing.Final = argparse.ArgumentParser(
+        prog="python -m any_llm_client.batch",
+        description="Run prompts from input JSONL file through LLM and append responses to output JSONL file.",
+    )
+    parser.add_argument("input_path", type=pathlib.Path)
+    parser.add_argument("output_path", type=pathlib.Path, help="also used as a checkpoint to resume from")
+    parser.add_argument(
+        "--config", type=pathlib.Path, help=f"JSON file with LLM config, ${LLM_CONFIG_ENV_NAME} by default"
+    )
+    parser.add_argument("--max-concurrency", type=int, default=8)
+    parser.add_argument("--extra", help="JSON object that is merged into request payloads")
+    arguments: typing.Final = parser.parse_args(argv)
+    if arguments.max_concurrency < 1:
+        parser.error("--max-concurrency must be at least 1")
+
+    try:
+        stats: typing.Final = asyncio.run(_main(arguments))
+    except (asyncio.CancelledError, KeyboardInterrupt):
+        sys.stderr.write("Interrupted, run the same command again to resume\n")
+        return 1
+    sys.stderr.write(
+        f"Completed: {stats.completed_count}, skipped: {stats.skipped_count}, failed: {stats.failed_count}\n"
+    )
+    return 1 if stats.failed_count else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,427 @@
+import asyncio
+import collections
+import contextlib
+import dataclasses
+import datetime
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import types
+import typing
+
+import pydantic
+import typing_extensions
+
+from any_llm_client.core import LLMClient, LLMConfigValue, LLMResponse, Message
+
+
+def _prepare_request_payload(
+    client: LLMClient,
+    messages: str | list[Message],
+    *,
+    temperature: float,
+    extra: dict[str, typing.Any] | None,
+) -> dict[str, typing.Any] | None:
+    prepare_payload: typing.Final = getattr(client, "_prepare_payload", None)
+    if prepare_payload is None:
+        return None
+    return typing.cast(
+        "dict[str, typing.Any]",
+        prepare_payload(messages=messages, temperature=temperature, stream=False, extra=extra),
+    )
+
+
+def _hash_payload(payload: dict[str, typing.Any]) -> str:
+    return hashlib.sha256(
+        json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode()
+    ).hexdigest()
+
+
+def _get_payload_temperature(payload: dict[str, typing.Any]) -> object:
+    completion_options: typing.Final = payload.get("completionOptions")  # YandexGPT
+    if isinstance(completion_options, dict):
+        return completion_options.get("temperature")
+    return payload.get("temperature")
+
+
+def make_request_cache_key(
+    client: LLMClient,
+    messages: str | list[Message],
+    *,
+    temperature: float,
+    extra: dict[str, typing.Any] | None,
+) -> str | None:
+    """Hash of the final provider payload, or None if the client doesn't build one (for example, mock client)."""
+    payload: typing.Final = _prepare_request_payload(client, messages, temperature=temperature, extra=extra)
+    return None if payload is None else _hash_payload(payload)
+
+
+def _get_response_size(key: str, response: LLMResponse) -> int:
+    return len(key) + len((response.content or "").encode()) + len((response.reasoning_content or "").encode())
+
+
+def _to_seconds(value: float | datetime.timedelta) -> float:
+    return value.total_seconds() if isinstance(value, datetime.timedelta) else value
+
+
+@dataclasses.dataclass(slots=True)
+class ResponseCacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+
+class ResponseCache(typing.Protocol):
+    stats: ResponseCacheStats
+
+    async def get(self, key: str) -> LLMResponse | None: ...
+    async def set(self, key: str, response: LLMResponse) -> None: ...
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class _InMemoryCacheEntry:
+    response: LLMResponse
+    size: int
+    expires_at: float | None
+
+
+@dataclasses.dataclass(kw_only=True, slots=True)
+class InMemoryResponseCache(ResponseCache):
+    """LRU cache of LLM responses that lives in the current process."""
+
+    max_entries: int | None = 1024
+    "Maximum number of cached responses. Least recently used responses are evicted first."
+    max_bytes: int | None = None
+    "Maximum total size of cached keys and response texts in bytes."
+    ttl: float | datetime.timedelta | None = None
+    "Time after which a cached response expires."
+    stats: ResponseCacheStats = dataclasses.field(default_factory=ResponseCacheStats)
+    _entries: collections.OrderedDict[str, _InMemoryCacheEntry] = dataclasses.field(
+        default_factory=collections.OrderedDict, init=False, repr=False
+    )
+    _total_bytes: int = dataclasses.field(default=0, init=False, repr=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+    def _pop(self, key: str) -> None:
+        self._total_bytes -= self._entries.pop(key).size
+
+    async def get(self, key: str) -> LLMResponse | None:
+        entry: typing.Final = self._entries.get(key)
+        if entry is None:
+            self.stats.misses += 1
+            return None
+        if entry.expires_at is not None and entry.expires_at <= time.monotonic():
+            self._pop(key)
+            self.stats.evictions += 1
+            self.stats.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.stats.hits += 1
+        return entry.response
+
+    async def set(self, key: str, response: LLMResponse) -> None:
+        size: typing.Final = _get_response_size(key, response)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._pop(key)
+
+        self._entries[key] = _InMemoryCacheEntry(
+            response=response,
+            size=size,
+            expires_at=None if self.ttl is None else time.monotonic() + _to_seconds(self.ttl),
+        )
+        self._total_bytes += size
+
+        while (self.max_entries is not None and len(self._entries) > self.max_entries) or (
+            self.max_bytes is not None and self._total_bytes > self.max_bytes
+        ):
+            self._pop(next(iter(self._entries)))
+            self.stats.evictions += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._total_bytes = 0
+
+
+_LLM_RESPONSE_ADAPTER: typing.Final = pydantic.TypeAdapter(LLMResponse)
+_SQLITE_SCHEMA: typing.Final = """
+PRAGMA auto_vacuum = INCREMENTAL;
+PRAGMA journal_mode = WAL;
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    response BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    accessed_at REAL NOT NULL,
+    expires_at REAL
+);
+CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at);
+"""
+
+
+@dataclasses.dataclass(kw_only=True, slots=True)
+class SQLiteResponseCache(ResponseCache):
+    """Persistent cache of LLM responses that can be shared between processes on one host.
+
+    Uses SQLite database in WAL mode, so concurrent readers don't block each other and the writer. Expired and
+    least recently used responses are removed on compaction, which runs periodically while the cache is entered:
+
+    ```python
+    async with (
+        any_llm_client.SQLiteResponseCache(path="/var/cache/llm-responses.sqlite3", ttl=3600) as cache,
+        any_llm_client.CachedLLMClient(any_llm_client.get_client(config), cache=cache) as client,
+    ):
+        ...
+    ```
+    """
+
+    path: str | os.PathLike[str]
+    ttl: float | datetime.timedelta | None = None
+    "Time after which a cached response expires."
+    max_entries: int | None = None
+    "Maximum number of cached responses that are kept on compaction."
+    max_bytes: int | None = None
+    "Maximum total size of cached keys and response texts in bytes that are kept on compaction."
+    compaction_interval: float | datetime.timedelta = 60.0
+    "How often to run compaction while the cache is entered, in seconds."
+    busy_timeout: float = 5.0
+    "How long to wait for a lock held by another process, in seconds."
+    access_time_update_interval: float = 60.0
+    "Access time of a response is updated on hit only when it's older than that, so that most hits don't write."
+    stats: ResponseCacheStats = dataclasses.field(default_factory=ResponseCacheStats)
+    _connection: sqlite3.Connection | None = dataclasses.field(default=None, init=False, repr=False)
+    _connection_lock: threading.Lock = dataclasses.field(default_factory=threading.Lock, init=False, repr=False)
+    _compaction_task: asyncio.Task[None] | None = dataclasses.field(default=None, init=False, repr=False)
+
+    def _get_connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            connection: typing.Final = sqlite3.connect(
+                self.path, timeout=self.busy_timeout, isolation_level=None, check_same_thread=False
+            )
+            try:
+                connection.executescript(_SQLITE_SCHEMA)
+            except sqlite3.Error:
+                connection.close()
+                raise
+            self._connection = connection
+        return self._connection
+
+    def _get_sync(self, key: str) -> LLMResponse | None:
+        now: typing.Final = time.time()
+        with self._connection_lock:
+            connection: typing.Final = self._get_connection()
+            row: typing.Final = connection.execute(
+                "SELECT response, accessed_at FROM responses WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (key, now),
+            ).fetchone()
+            if row is None:
+                return None
+            if now - row[1] >= self.access_time_update_interval:
+                # Response is read already, it's served even if the database is locked by another process
+                with contextlib.suppress(sqlite3.OperationalError):
+                    connection.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+        return _LLM_RESPONSE_ADAPTER.validate_json(row[0])
+
+    def _set_sync(self, key: str, response: LLMResponse) -> None:
+        now: typing.Final = time.time()
+        with self._connection_lock:
+            self._get_connection().execute(
+                "INSERT OR REPLACE INTO responses (key, response, size, accessed_at, expires_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (
+                    key,
+                    _LLM_RESPONSE_ADAPTER.dump_json(response),
+                    _get_response_size(key, response),
+                    now,
+                    None if self.ttl is None else now + _to_seconds(self.ttl),
+                ),
+            )
+
+    def _compact_sync(self) -> int:
+        with self._connection_lock:
+            connection: typing.Final = self._get_connection()
+            removed_count = connection.execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),)).rowcount
+            if self.max_entries is not None:
+                removed_count += connection.execute(
+                    "DELETE FROM responses WHERE key IN"
+                    " (SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                ).rowcount
+            if self.max_bytes is not None:
+                removed_count += connection.execute(
+                    "DELETE FROM responses WHERE key IN (SELECT key FROM"
+                    " (SELECT key, SUM(size) OVER (ORDER BY accessed_at DESC, key) AS total_size FROM responses)"
+                    " WHERE total_size > ?)",
+                    (self.max_bytes,),
+                ).rowcount
+            connection.execute("PRAGMA incremental_vacuum")
+        return removed_count
+
+    async def get(self, key: str) -> LLMResponse | None:
+        """Return cached response or None. Locked database is a miss, so that it doesn't fail requests."""
+        response: LLMResponse | None
+        try:
+            response = await asyncio.to_thread(self._get_sync, key)
+        except sqlite3.OperationalError:
+            response = None
+        if response is None:
+            self.stats.misses += 1
+        else:
+            self.stats.hits += 1
+        return response
+
+    async def set(self, key: str, response: LLMResponse) -> None:
+        """Cache response. It's not cached when the database is locked."""
+        with contextlib.suppress(sqlite3.OperationalError):
+            await asyncio.to_thread(self._set_sync, key, response)
+
+    async def compact(self) -> None:
+        """Remove expired responses and enforce size limits."""
+        self.stats.evictions += await asyncio.to_thread(self._compact_sync)
+
+    async def _compact_if_not_locked(self) -> None:
+        with contextlib.suppress(sqlite3.OperationalError):  # Database may be locked by another process
+            await self.compact()
+
+    async def _compact_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(_to_seconds(self.compaction_interval))
+            await self._compact_if_not_locked()
+
+    def close(self) -> None:
+        with self._connection_lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    async def __aenter__(self) -> typing_extensions.Self:
+        await self._compact_if_not_locked()
+        self._compaction_task = asyncio.create_task(self._compact_periodically())
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: types.TracebackType | None,
+    ) -> None:
+        if self._compaction_task is not None:
+            self._compaction_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._compaction_task
+            self._compaction_task = None
+        await asyncio.to_thread(self.close)
+
+
+async def _iter_cached_response(response: LLMResponse) -> typing.AsyncIterable[LLMResponse]:
+    yield response
+
+
+@dataclasses.dataclass(slots=True)
+class CachedLLMClient(LLMClient):
+    """Serves repeated requests with identical provider payload from cache.
+
+    Streaming and non-streaming requests share cache entries: a cached response is replayed as a single chunk, and
+    a streamed response is cached only after it was consumed completely.
+    Only requests with zero temperature are cached unless `cache_sampled_responses` is set.
+    """
+
+    client: LLMClient
+    cache: ResponseCache = dataclasses.field(default_factory=InMemoryResponseCache)
+    cache_sampled_responses: bool = False
+    "Cache responses to requests with non-zero temperature, so that they always get the same sampled response"
+
+    @property
+    def _prepare_payload(self) -> typing.Callable[..., dict[str, typing.Any]] | None:
+        return getattr(self.client, "_prepare_payload", None)
+
+    def _make_cache_key(
+        self, messages: str | list[Message], *, temperature: float, extra: dict[str, typing.Any] | None
+    ) -> str | None:
+        payload: typing.Final = _prepare_request_payload(self.client, messages, temperature=temperature, extra=extra)
+        if payload is None or (not self.cache_sampled_responses and _get_payload_temperature(payload) != 0):
+            return None
+        return _hash_payload(payload)
+
+    async def request_llm_message(
+        self,
+        messages: str | list[Message],
+        *,
+        temperature: float = LLMConfigValue(attr="temperature"),
+        extra: dict[str, typing.Any] | None = None,
+        timeout: float | None = None,
+    ) -> LLMResponse:
+        cache_key: typing.Final = self._make_cache_key(messages, temperature=temperature, extra=extra)
+        if cache_key is not None and (cached_response := await self.cache.get(cache_key)) is not None:
+            return cached_response
+
+        response: typing.Final = await self.client.request_llm_message(
+            messages, temperature=temperature, extra=extra, timeout=timeout
+        )
+        if cache_key is not None:
+            await self.cache.set(cache_key, response)
+        return response
+
+    async def _iter_and_cache_response_chunks(
+        self, cache_key: str, response_chunks: typing.AsyncIterable[LLMResponse]
+    ) -> typing.AsyncIterable[LLMResponse]:
+        content_chunks: typing.Final[list[str]] = []
+        reasoning_content_chunks: typing.Final[list[str]] = []
+        async for one_chunk in response_chunks:
+            if one_chunk.content:
+                content_chunks.append(one_chunk.content)
+            if one_chunk.reasoning_content:
+                reasoning_content_chunks.append(one_chunk.reasoning_content)
+            yield one_chunk
+
+        await self.cache.set(
+            cache_key,
+            LLMResponse(
+                content="".join(content_chunks) if content_chunks else None,
+                reasoning_content="".join(reasoning_content_chunks) if reasoning_content_chunks else None,
+            ),
+        )
+
+    @contextlib.asynccontextmanager
+    async def stream_llm_message_chunks(
+        self,
+        messages: str | list[Message],
+        *,
+        temperature: float = LLMConfigValue(attr="temperature"),
+        extra: dict[str, typing.Any] | None = None,
+        timeout: float | None = None,
+    ) -> typing.AsyncIterator[typing.AsyncIterable[LLMResponse]]:
+        cache_key: typing.Final = self._make_cache_key(messages, temperature=temperature, extra=extra)
+        if cache_key is not None and (cached_response := await self.cache.get(cache_key)) is not None:
+            yield _iter_cached_response(cached_response)
+            return
+
+        async with self.client.stream_llm_message_chunks(
+            messages, temperature=temperature, extra=extra, timeout=timeout
+        ) as response_chunks:
+            yield (
+                response_chunks
+                if cache_key is None
+                else self._iter_and_cache_response_chunks(cache_key, response_chunks)
+            )
+
+    async def __aenter__(self) -> typing_extensions.Self:
+        await self.client.__aenter__()
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: types.TracebackType | None,
+    ) -> None:
+        await self.client.__aexit__(exc_type, exc_value, traceback)
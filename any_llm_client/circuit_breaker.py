@@ -0,0 +1,123 @@
+import collections
+import contextlib
+import dataclasses
+import enum
+import time
+import typing
+
+from any_llm_client.core import LLMCircuitOpenError
+
+
+class CircuitState(str, enum.Enum):
+    closed = "closed"
+    open = "open"
+    half_open = "half_open"
+
+
+@dataclasses.dataclass(kw_only=True, slots=True)
+class _Circuit:
+    state: CircuitState = CircuitState.closed
+    outcomes: collections.deque[bool]
+    "Recent outcomes, `True` for failure."
+    failures_count: int = 0
+    consecutive_timeouts_count: int = 0
+    open_until: float = 0.0
+    probes_count: int = 0
+
+    def record_outcome(self, *, is_failure: bool) -> None:
+        if len(self.outcomes) == self.outcomes.maxlen and self.outcomes[0]:
+            self.failures_count -= 1
+        self.outcomes.append(is_failure)
+        self.failures_count += is_failure
+
+
+@dataclasses.dataclass(kw_only=True, slots=True)
+class CircuitBreaker:
+    """Rejects requests to a backend URL right away while it is failing, instead of waiting for timeouts and retries.
+
+    Each URL has its own circuit. A closed circuit opens when at least `failure_rate_threshold` of the last
+    `window_size` requests failed (but not before `min_requests_count` requests are seen), or after
+    `max_consecutive_timeouts` timeouts without a success in between. Transport errors and server errors (5xx) are
+    failures. An open circuit raises `LLMCircuitOpenError` for `open_time` seconds, then becomes half-open and lets
+    `half_open_max_requests` probe requests through: the circuit closes when a probe succeeds and opens again when it
+    fails.
+    """
+
+    failure_rate_threshold: float = 0.5
+    window_size: int = 20
+    min_requests_count: int = 10
+    max_consecutive_timeouts: int = 3
+    open_time: float = 30.0
+    half_open_max_requests: int = 1
+    _circuits: dict[str, _Circuit] = dataclasses.field(default_factory=dict, init=False, repr=False)
+
+    def _get_circuit(self, url: str) -> _Circuit:
+        circuit = self._circuits.get(url)
+        if circuit is None:
+            circuit = self._circuits[url] = _Circuit(outcomes=collections.deque(maxlen=self.window_size))
+        return circuit
+
+    def get_state(self, url: str) -> CircuitState:
+        circuit: typing.Final = self._circuits.get(url)
+        if circuit is None:
+            return CircuitState.closed
+        if circuit.state is CircuitState.open and time.monotonic() >= circuit.open_until:
+            return CircuitState.half_open
+        return circuit.state
+
+    def accepts_requests(self, url: str) -> bool:
+        """Whether `guard()` would let a request to `url` through now."""
+        circuit: typing.Final = self._circuits.get(url)
+        if circuit is None:
+            return True
+        state: typing.Final = self.get_state(url)
+        return state is CircuitState.closed or (
+            state is CircuitState.half_open and circuit.probes_count < self.half_open_max_requests
+        )
+
+    @contextlib.contextmanager
+    def guard(self, url: str) -> typing.Iterator[None]:
+        """Let a request to `url` through or raise `LLMCircuitOpenError`. Outcome is recorded by the caller."""
+        circuit: typing.Final = self._get_circuit(url)
+        if circuit.state is CircuitState.open:
+            now: typing.Final = time.monotonic()
+            if now < circuit.open_until:
+                raise LLMCircuitOpenError(response_content=b"", url=url, retry_after=circuit.open_until - now)
+            circuit.state = CircuitState.half_open
+
+        is_probe: typing.Final = circuit.state is CircuitState.half_open
+        if is_probe:
+            if circuit.probes_count >= self.half_open_max_requests:
+                raise LLMCircuitOpenError(response_content=b"", url=url, retry_after=0.0)
+            circuit.probes_count += 1
+        try:
+            yield
+        finally:
+            # Cancelled probe frees its slot, so that the circuit doesn't stay half-open forever
+            if is_probe:
+                circuit.probes_count -= 1
+
+    def record_success(self, url: str) -> None:
+        circuit: typing.Final = self._get_circuit(url)
+        if circuit.state is CircuitState.half_open:
+            self._circuits[url] = _Circuit(outcomes=collections.deque(maxlen=self.window_size))
+        elif circuit.state is CircuitState.closed:
+            circuit.record_outcome(is_failure=False)
+            circuit.consecutive_timeouts_count = 0
+
+    def record_failure(self, url: str, *, is_timeout: bool = False) -> None:
+        circuit: typing.Final = self._get_circuit(url)
+        if circuit.state is CircuitState.half_open:
+            self._open(circuit)
+        elif circuit.state is CircuitState.closed:
+            circuit.record_outcome(is_failure=True)
+            circuit.consecutive_timeouts_count += is_timeout
+            if circuit.consecutive_timeouts_count >= self.max_consecutive_timeouts or (
+                len(circuit.outcomes) >= self.min_requests_count
+                and circuit.failures_count >= self.failure_rate_threshold * len(circuit.outcomes)
+            ):
+                self._open(circuit)
+
+    def _open(self, circuit: _Circuit) -> None:
+        circuit.state = CircuitState.open
+        circuit.open_until = time.monotonic() + self.open_time
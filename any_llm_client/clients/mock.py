@@ -25,6 +25,7 @@ class MockLLMClient(LLMClient):
         *,
         temperature: float = LLMConfigValue(attr="temperature"),  # noqa: ARG002
         extra: dict[str, typing.Any] | None = None,  # noqa: ARG002
+        timeout: float | None = None,  # noqa: ARG002
     ) -> LLMResponse:
         return self.config.response_message
 
@@ -39,6 +40,7 @@ class MockLLMClient(LLMClient):
         *,
         temperature: float = LLMConfigValue(attr="temperature"),  # noqa: ARG002
         extra: dict[str, typing.Any] | None = None,  # noqa: ARG002
+        timeout: float | None = None,  # noqa: ARG002
     ) -> typing.AsyncIterator[typing.AsyncIterable[LLMResponse]]:
         yield self._iter_config_stream_messages()
 
@@ -1,5 +1,8 @@
+import asyncio
 import contextlib
 import dataclasses
+import functools
+import hashlib
 import os
 import types
 import typing
@@ -7,11 +10,13 @@ from http import HTTPStatus
 
 import annotated_types
 import httpx
-import httpx_sse
 import pydantic
 import typing_extensions
 
+from any_llm_client.balancer import LoadBalancer, Replica
+from any_llm_client.circuit_breaker import CircuitBreaker
 from any_llm_client.core import (
+    Conversation,
     LLMClient,
     LLMConfig,
     LLMConfigValue,
@@ -24,18 +29,55 @@ from any_llm_client.core import (
     TextContentItem,
     UserMessage,
 )
-from any_llm_client.http import get_http_client_from_kwargs, make_http_request, make_streaming_http_request
+from any_llm_client.http import (
+    RequestDeadline,
+    RequestTemplate,
+    get_http_client_from_kwargs,
+    iter_with_chunk_timeouts,
+    make_http_request,
+    make_streaming_http_request,
+)
+from any_llm_client.limiter import AdaptiveConcurrencyLimiter
+from any_llm_client.rate_limit import RateLimiter
 from any_llm_client.retry import RequestRetryConfig
+from any_llm_client.server_metrics import scrape_server_metrics_periodically
+from any_llm_client.sse import iter_sse_data
+from any_llm_client.transport_pool import SharedTransportPool
+from any_llm_client.warm_up import ConnectionsWarmUp
 
 
 OPENAI_AUTH_TOKEN_ENV_NAME: typing.Final = "ANY_LLM_CLIENT_OPENAI_AUTH_TOKEN"  # noqa: S105
+SERVER_METRICS_MAX_AGE_INTERVALS: typing.Final = 3
 
 
-class OpenAIConfig(LLMConfig):
+class OpenAIReplicaConfig(pydantic.BaseModel):
     if typing.TYPE_CHECKING:
         url: str
     else:
         url: pydantic.HttpUrl
+    weight: float = pydantic.Field(1.0, gt=0)
+
+
+class OpenAIConfig(LLMConfig):
+    if typing.TYPE_CHECKING:
+        url: str | list[str | OpenAIReplicaConfig]
+    else:
+        url: (
+            pydantic.HttpUrl | typing.Annotated[list[pydantic.HttpUrl | OpenAIReplicaConfig], annotated_types.MinLen(1)]
+        )
+    "Chat completions URL, or URLs of several replicas (optionally with weights) that requests are balanced across."
+    server_metrics_scrape_interval: float = pydantic.Field(0.0, ge=0)
+    "Scrape vLLM metrics of replicas every that many seconds, and route requests by server queue depth. 0 disables."
+    prefix_affinity_messages_count: int = pydantic.Field(0, ge=0)
+    "Route requests with the same first messages to the same replica to reuse its prefix cache. 0 disables."
+    first_chunk_timeout: float = pydantic.Field(0.0, ge=0)
+    "Seconds to wait for the first chunk of streaming response before raising `LLMStreamTimeoutError`. 0 disables."
+    chunk_idle_timeout: float = pydantic.Field(0.0, ge=0)
+    "Maximum seconds between chunks of streaming response before raising `LLMStreamTimeoutError`. 0 disables."
+    warm_up_connections_count: int = pydantic.Field(0, ge=0)
+    "Open that many connections to each replica on entering the client, see `ConnectionsWarmUp`. 0 disables."
+    keep_alive_interval: float = pydantic.Field(0.0, ge=0)
+    "Repeat warm-up every that many seconds, so that idle connections are not closed. 0 disables."
     auth_token: str | None = pydantic.Field(default_factory=lambda: os.environ.get(OPENAI_AUTH_TOKEN_ENV_NAME))
     model_name: str
     request_extra: dict[str, typing.Any] = pydantic.Field(default_factory=dict)
@@ -75,6 +117,10 @@ class ChatCompletionsRequest(pydantic.BaseModel):
     temperature: float
 
 
+class ChatCompletionsUsage(pydantic.BaseModel):
+    total_tokens: int
+
+
 class OneStreamingChoiceDelta(pydantic.BaseModel):
     role: typing.Literal[MessageRole.assistant] | None = None
     content: str | None = None
@@ -87,6 +133,7 @@ class OneStreamingChoice(pydantic.BaseModel):
 
 class ChatCompletionsStreamingEvent(pydantic.BaseModel):
     choices: list[OneStreamingChoice]
+    usage: ChatCompletionsUsage | None = None
 
 
 class OneNotStreamingChoiceMessage(pydantic.BaseModel):
@@ -101,6 +148,7 @@ class OneNotStreamingChoice(pydantic.BaseModel):
 
 class ChatCompletionsNotStreamingResponse(pydantic.BaseModel):
     choices: typing.Annotated[list[OneNotStreamingChoice], annotated_types.MinLen(1)]
+    usage: ChatCompletionsUsage | None = None
 
 
 def _prepare_one_message(one_message: Message) -> ChatCompletionsInputMessage:
@@ -160,6 +208,21 @@ def _make_user_assistant_alternate_messages(
         )
 
 
+def _make_load_balancer(config: OpenAIConfig) -> LoadBalancer:
+    replica_configs: typing.Final = config.url if isinstance(config.url, list) else [config.url]
+    load_balancer: typing.Final = LoadBalancer(
+        replicas=[
+            Replica(url=str(one_config.url), weight=one_config.weight)
+            if isinstance(one_config, OpenAIReplicaConfig)
+            else Replica(url=str(one_config))
+            for one_config in replica_configs
+        ]
+    )
+    if config.server_metrics_scrape_interval:
+        load_balancer.max_server_metrics_age = config.server_metrics_scrape_interval * SERVER_METRICS_MAX_AGE_INTERVALS
+    return load_balancer
+
+
 def _handle_status_error(*, status_code: int, content: bytes) -> typing.NoReturn:
     if status_code == HTTPStatus.BAD_REQUEST and b"Please reduce the length of the messages" in content:  # vLLM
         raise OutOfTokensOrSymbolsError(response_content=content)
@@ -177,97 +240,188 @@ class OpenAIClient(LLMClient):
     config: OpenAIConfig
     httpx_client: httpx.AsyncClient
     request_retry: RequestRetryConfig
-
-    def __init__(
+    rate_limiter: RateLimiter | None
+    circuit_breaker: CircuitBreaker | None
+    concurrency_limiter: AdaptiveConcurrencyLimiter | None
+    load_balancer: LoadBalancer
+    connections_warm_up: ConnectionsWarmUp
+    _request_template: RequestTemplate
+    _server_metrics_task: asyncio.Task[None] | None
+
+    def __init__(  # noqa: PLR0913
         self,
         config: OpenAIConfig,
         *,
         request_retry: RequestRetryConfig | None = None,
+        rate_limiter: RateLimiter | None = None,
+        circuit_breaker: CircuitBreaker | None = None,
+        concurrency_limiter: AdaptiveConcurrencyLimiter | None = None,
+        transport_pool: SharedTransportPool | None = None,
         **httpx_kwargs: typing.Any,  # noqa: ANN401
     ) -> None:
         self.config = config
         self.request_retry = request_retry or RequestRetryConfig()
-        self.httpx_client = get_http_client_from_kwargs(httpx_kwargs)
-
-    def _build_request(self, payload: dict[str, typing.Any]) -> httpx.Request:
-        return self.httpx_client.build_request(
-            method="POST",
-            url=str(self.config.url),
-            json=payload,
-            headers={"Authorization": f"Bearer {self.config.auth_token}"} if self.config.auth_token else None,
+        self.rate_limiter = rate_limiter
+        self.circuit_breaker = circuit_breaker
+        self.concurrency_limiter = concurrency_limiter
+        self.load_balancer = _make_load_balancer(config)
+        self._request_template = RequestTemplate.from_replicas(
+            self.load_balancer,
+            headers={"Authorization": f"Bearer {config.auth_token}"} if config.auth_token else {},
+        )
+        self._server_metrics_task = None
+        self.httpx_client = get_http_client_from_kwargs(
+            httpx_kwargs,
+            transport_pool=transport_pool,
+            urls=(one_replica.url for one_replica in self.load_balancer.replicas),
+        )
+        self.connections_warm_up = ConnectionsWarmUp(
+            connections_count=config.warm_up_connections_count, keep_alive_interval=config.keep_alive_interval
         )
 
     def _prepare_messages(self, messages: str | list[Message]) -> list[ChatCompletionsInputMessage]:
-        messages = [UserMessage(messages)] if isinstance(messages, str) else messages
-        initial_messages: typing.Final = (_prepare_one_message(one_message) for one_message in messages)
+        if isinstance(messages, str):
+            messages = [UserMessage(messages)]
+        initial_messages: typing.Final = (
+            messages.encode(_prepare_one_message)
+            if isinstance(messages, Conversation)
+            else [_prepare_one_message(one_message) for one_message in messages]
+        )
         return (
             list(_make_user_assistant_alternate_messages(initial_messages))
             if self.config.force_user_assistant_message_alternation
-            else list(initial_messages)
+            else initial_messages
         )
 
-    def _prepare_payload(
+    def _prepare_request_body(
         self,
         *,
         messages: str | list[Message],
         temperature: float,
         stream: bool,
         extra: dict[str, typing.Any] | None,
-    ) -> dict[str, typing.Any]:
+    ) -> ChatCompletionsRequest:
         return ChatCompletionsRequest(
             stream=stream,
             model=self.config.model_name,
             messages=self._prepare_messages(messages),
             temperature=self.config._resolve_request_temperature(temperature),  # noqa: SLF001
             **self.config.request_extra | (extra or {}),
+        )
+
+    def _prepare_payload(
+        self,
+        *,
+        messages: str | list[Message],
+        temperature: float,
+        stream: bool,
+        extra: dict[str, typing.Any] | None,
+    ) -> dict[str, typing.Any]:
+        return self._prepare_request_body(
+            messages=messages, temperature=temperature, stream=stream, extra=extra
         ).model_dump(mode="json")
 
+    def _encode_request_body(self, request_body: ChatCompletionsRequest) -> tuple[bytes, bytes | None]:
+        """Encode request body once for all attempts, and hash the encoded first messages for prefix affinity.
+
+        With prefix affinity, messages are encoded one by one and joined into the body, so that the prefix, which is
+        usually a long system prompt, is not encoded a second time just to be hashed.
+        """
+        if not self.config.prefix_affinity_messages_count:
+            return request_body.model_dump_json().encode(), None
+
+        encoded_messages: typing.Final = [
+            one_message.model_dump_json().encode() for one_message in request_body.messages
+        ]
+        prefix_hash: typing.Final = hashlib.blake2b(digest_size=16)
+        for one_encoded_message in encoded_messages[: self.config.prefix_affinity_messages_count]:
+            prefix_hash.update(one_encoded_message)
+        encoded_other_fields: typing.Final = request_body.model_dump_json(exclude={"messages"}).encode()
+        return (
+            b'{"messages":[' + b",".join(encoded_messages) + b"]," + encoded_other_fields.removeprefix(b"{"),
+            prefix_hash.digest(),
+        )
+
+    def _estimate_tokens(self, request_body: ChatCompletionsRequest) -> int:
+        if not self.rate_limiter or self.rate_limiter.tokens_per_minute is None:
+            return 0
+        payload: typing.Final = request_body.model_dump(mode="json")
+        max_output_tokens: typing.Final = payload.get("max_completion_tokens") or payload.get("max_tokens")
+        return self.rate_limiter.estimate_tokens(payload, max_output_tokens=max_output_tokens)
+
+    def _record_usage(self, *, estimated_tokens: int, usage: ChatCompletionsUsage | None) -> None:
+        if self.rate_limiter and usage:
+            self.rate_limiter.record_usage(estimated_tokens=estimated_tokens, used_tokens=usage.total_tokens)
+
     async def request_llm_message(
         self,
         messages: str | list[Message],
         *,
         temperature: float = LLMConfigValue(attr="temperature"),
         extra: dict[str, typing.Any] | None = None,
+        timeout: float | None = None,
     ) -> LLMResponse:
-        payload: typing.Final = self._prepare_payload(
+        deadline: typing.Final = RequestDeadline.from_timeout(timeout)
+        request_body: typing.Final = self._prepare_request_body(
             messages=messages,
             temperature=temperature,
             stream=False,
             extra=extra,
         )
+        # Encoded once and sent as is by each attempt
+        request_content, affinity_key = self._encode_request_body(request_body)
+        estimated_tokens: typing.Final = self._estimate_tokens(request_body)
         try:
             response: typing.Final = await make_http_request(
                 httpx_client=self.httpx_client,
                 request_retry=self.request_retry,
-                build_request=lambda: self._build_request(payload),
+                load_balancer=self.load_balancer,
+                build_request=functools.partial(
+                    self._request_template.build_request, self.httpx_client, request_content
+                ),
+                rate_limiter=self.rate_limiter,
+                circuit_breaker=self.circuit_breaker,
+                concurrency_limiter=self.concurrency_limiter,
+                estimated_tokens=estimated_tokens,
+                deadline=deadline,
+                affinity_key=affinity_key,
             )
         except httpx.HTTPStatusError as exception:
             _handle_status_error(status_code=exception.response.status_code, content=exception.response.content)
 
         try:
-            validated_message_model: typing.Final = (
-                ChatCompletionsNotStreamingResponse.model_validate_json(response.content).choices[0].message
-            )
+            validated_response: typing.Final = ChatCompletionsNotStreamingResponse.model_validate_json(response.content)
         except pydantic.ValidationError as validation_error:
             _handle_validation_error(content=response.content, original_error=validation_error)
         finally:
             await response.aclose()
 
+        self._record_usage(estimated_tokens=estimated_tokens, usage=validated_response.usage)
+        validated_message_model: typing.Final = validated_response.choices[0].message
+
         return LLMResponse(
             content=validated_message_model.content,
             reasoning_content=validated_message_model.reasoning_content,
         )
 
-    async def _iter_response_chunks(self, response: httpx.Response) -> typing.AsyncIterable[LLMResponse]:
-        async for event in httpx_sse.EventSource(response).aiter_sse():
-            if event.data == "[DONE]":
+    async def _iter_response_chunks(
+        self, byte_chunks: typing.AsyncIterable[bytes], *, estimated_tokens: int, deadline: RequestDeadline | None
+    ) -> typing.AsyncIterable[LLMResponse]:
+        async for event_data in iter_with_chunk_timeouts(
+            iter_sse_data(byte_chunks),
+            first_chunk_timeout=self.config.first_chunk_timeout,
+            chunk_idle_timeout=self.config.chunk_idle_timeout,
+            deadline=deadline,
+        ):
+            if event_data == b"[DONE]":
                 break
 
             try:
-                validated_response = ChatCompletionsStreamingEvent.model_validate_json(event.data)
+                validated_response = ChatCompletionsStreamingEvent.model_validate_json(event_data)
             except pydantic.ValidationError as validation_error:
-                _handle_validation_error(content=event.data.encode(), original_error=validation_error)
+                _handle_validation_error(content=event_data, original_error=validation_error)
 
+            self._record_usage(estimated_tokens=estimated_tokens, usage=validated_response.usage)
             if not (
                 (validated_choices := validated_response.choices)
                 and (validated_delta := validated_choices[0].delta)
@@ -284,20 +438,35 @@ class OpenAIClient(LLMClient):
         *,
         temperature: float = LLMConfigValue(attr="temperature"),
         extra: dict[str, typing.Any] | None = None,
+        timeout: float | None = None,
     ) -> typing.AsyncIterator[typing.AsyncIterable[LLMResponse]]:
-        payload: typing.Final = self._prepare_payload(
+        deadline: typing.Final = RequestDeadline.from_timeout(timeout)
+        request_body: typing.Final = self._prepare_request_body(
             messages=messages,
             temperature=temperature,
             stream=True,
             extra=extra,
         )
+        # Encoded once and sent as is by each attempt
+        request_content, affinity_key = self._encode_request_body(request_body)
+        estimated_tokens: typing.Final = self._estimate_tokens(request_body)
         try:
             async with make_streaming_http_request(
                 httpx_client=self.httpx_client,
                 request_retry=self.request_retry,
-                build_request=lambda: self._build_request(payload),
-            ) as response:
-                yield self._iter_response_chunks(response)
+                load_balancer=self.load_balancer,
+                build_request=functools.partial(
+                    self._request_template.build_request, self.httpx_client, request_content
+                ),
+                rate_limiter=self.rate_limiter,
+                circuit_breaker=self.circuit_breaker,
+                concurrency_limiter=self.concurrency_limiter,
+                estimated_tokens=estimated_tokens,
+                deadline=deadline,
+                affinity_key=affinity_key,
+                first_chunk_timeout=self.config.first_chunk_timeout,
+            ) as byte_chunks:
+                yield self._iter_response_chunks(byte_chunks, estimated_tokens=estimated_tokens, deadline=deadline)
         except httpx.HTTPStatusError as exception:
             content: typing.Final = await exception.response.aread()
             await exception.response.aclose()
@@ -305,6 +474,15 @@ class OpenAIClient(LLMClient):
 
     async def __aenter__(self) -> typing_extensions.Self:
         await self.httpx_client.__aenter__()
+        self.connections_warm_up.start(
+            self.httpx_client, [one_replica.url for one_replica in self.load_balancer.replicas]
+        )
+        if self.config.server_metrics_scrape_interval:
+            self._server_metrics_task = asyncio.create_task(
+                scrape_server_metrics_periodically(
+                    self.httpx_client, self.load_balancer, interval=self.config.server_metrics_scrape_interval
+                )
+            )
         return self
 
     async def __aexit__(
@@ -313,4 +491,10 @@ class OpenAIClient(LLMClient):
         exc_value: BaseException | None,
         traceback: types.TracebackType | None,
     ) -> None:
+        if self._server_metrics_task:
+            self._server_metrics_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._server_metrics_task
+            self._server_metrics_task = None
+        await self.connections_warm_up.stop()
         await self.httpx_client.__aexit__(exc_type=exc_type, exc_value=exc_value, traceback=traceback)
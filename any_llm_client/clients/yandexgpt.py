@@ -1,6 +1,9 @@
 import contextlib
 import dataclasses
+import functools
+import json
 import os
+import re
 import types
 import typing
 from http import HTTPStatus
@@ -10,7 +13,10 @@ import httpx
 import pydantic
 import typing_extensions
 
+from any_llm_client.balancer import LoadBalancer, Replica
+from any_llm_client.circuit_breaker import CircuitBreaker
 from any_llm_client.core import (
+    Conversation,
     ImageContentItem,
     LLMClient,
     LLMConfig,
@@ -23,8 +29,20 @@ from any_llm_client.core import (
     MessageRole,
     OutOfTokensOrSymbolsError,
 )
-from any_llm_client.http import get_http_client_from_kwargs, make_http_request, make_streaming_http_request
+from any_llm_client.http import (
+    RequestDeadline,
+    RequestTemplate,
+    get_http_client_from_kwargs,
+    iter_byte_lines,
+    iter_with_chunk_timeouts,
+    make_http_request,
+    make_streaming_http_request,
+)
+from any_llm_client.limiter import AdaptiveConcurrencyLimiter
+from any_llm_client.rate_limit import RateLimiter
 from any_llm_client.retry import RequestRetryConfig
+from any_llm_client.transport_pool import SharedTransportPool
+from any_llm_client.warm_up import ConnectionsWarmUp
 
 
 YANDEXGPT_AUTH_HEADER_ENV_NAME: typing.Final = "ANY_LLM_CLIENT_YANDEXGPT_AUTH_HEADER"
@@ -47,6 +65,14 @@ class YandexGPTConfig(LLMConfig):
     model_name: str
     model_version: str = "latest"
     max_tokens: int = 7400
+    first_chunk_timeout: float = pydantic.Field(0.0, ge=0)
+    "Seconds to wait for the first chunk of streaming response before raising `LLMStreamTimeoutError`. 0 disables."
+    chunk_idle_timeout: float = pydantic.Field(0.0, ge=0)
+    "Maximum seconds between chunks of streaming response before raising `LLMStreamTimeoutError`. 0 disables."
+    warm_up_connections_count: int = pydantic.Field(0, ge=0)
+    "Open that many connections to each replica on entering the client, see `ConnectionsWarmUp`. 0 disables."
+    keep_alive_interval: float = pydantic.Field(0.0, ge=0)
+    "Repeat warm-up every that many seconds, so that idle connections are not closed. 0 disables."
     api_type: typing.Literal["yandexgpt"] = "yandexgpt"
 
 
@@ -72,8 +98,13 @@ class YandexGPTAlternative(pydantic.BaseModel):
     message: YandexGPTMessage
 
 
+class YandexGPTUsage(pydantic.BaseModel):
+    total_tokens: int = pydantic.Field(alias="totalTokens")
+
+
 class YandexGPTResult(pydantic.BaseModel):
     alternatives: typing.Annotated[list[YandexGPTAlternative], annotated_types.MinLen(1)]
+    usage: YandexGPTUsage | None = None
 
 
 class YandexGPTResponse(pydantic.BaseModel):
@@ -89,59 +120,153 @@ def _handle_status_error(*, status_code: int, content: bytes) -> typing.NoReturn
     raise LLMError(response_content=content)
 
 
+def _prepare_one_message(one_message: Message) -> YandexGPTMessage:
+    if isinstance(one_message.content, list):
+        if len(one_message.content) != 1:
+            raise LLMRequestValidationError(
+                "YandexGPTClient does not support multiple content items per message",
+            )
+        message_content = one_message.content[0]
+        if isinstance(message_content, ImageContentItem):
+            raise LLMRequestValidationError("YandexGPTClient does not support image content items")
+        message_text = message_content.text
+    else:
+        message_text = one_message.content
+    return YandexGPTMessage(role=one_message.role, text=message_text)
+
+
+def _validate_response(content: bytes) -> YandexGPTResponse:
+    try:
+        return YandexGPTResponse.model_validate_json(content)
+    except pydantic.ValidationError as validation_error:
+        raise LLMResponseValidationError(
+            response_content=content, original_error=validation_error
+        ) from validation_error
+
+
+_TEXT_KEY_PATTERN: typing.Final = re.compile(rb'"text"\s*:\s*"')
+
+
+def _find_string_end(line: bytes, start: int) -> int:
+    """Index of the quote that closes JSON string, or -1."""
+    while (quote_index := line.find(b'"', start)) != -1:
+        backslashes_count = 0
+        while line[quote_index - backslashes_count - 1] == ord("\\"):
+            backslashes_count += 1
+        if backslashes_count % 2 == 0:
+            return quote_index
+        start = quote_index + 1
+    return -1
+
+
+@dataclasses.dataclass(slots=True)
+class _CumulativeTextDecoder:
+    """Extracts text that is new in each line of YandexGPT stream, where each line has all the text generated so far.
+
+    JSON-escaped text of the previous line is compared with the start of the text in the next line without decoding,
+    and only the rest of it is decoded. A line that doesn't continue the previous text is validated in full. Only the
+    previous line is kept in memory.
+    """
+
+    escaped_text: memoryview | None = None
+    text_length: int = 0
+
+    def _decode_new_text_fast(self, line: bytes) -> str | None:
+        if self.escaped_text is None or not (text_key_match := _TEXT_KEY_PATTERN.search(line)):
+            return None
+        text_start: typing.Final = text_key_match.end()
+        new_text_start: typing.Final = text_start + len(self.escaped_text)
+        if (
+            not line.startswith(self.escaped_text, text_start)
+            or (text_end := _find_string_end(line, new_text_start)) == -1
+        ):
+            return None
+        try:
+            new_text: typing.Final[str] = json.loads(b'"' + line[new_text_start:text_end] + b'"')
+        except json.JSONDecodeError:
+            return None
+        self.escaped_text = memoryview(line)[text_start:text_end]
+        self.text_length += len(new_text)
+        return new_text
+
+    def decode_new_text(self, line: bytes) -> str:
+        new_text: typing.Final = self._decode_new_text_fast(line)
+        if new_text is not None:
+            return new_text
+
+        text: typing.Final = _validate_response(line).result.alternatives[0].message.text
+        # Next line is decoded fast only when the escaped text here is found where JSON parser found it
+        text_key_match: typing.Final = _TEXT_KEY_PATTERN.search(line)
+        self.escaped_text = None
+        if text_key_match and (text_end := _find_string_end(line, text_key_match.end())) != -1:
+            escaped_text: typing.Final = memoryview(line)[text_key_match.end() : text_end]
+            if json.loads(b'"' + escaped_text + b'"') == text:
+                self.escaped_text = escaped_text
+        previous_text_length: typing.Final = self.text_length
+        self.text_length = len(text)
+        return text[previous_text_length:]
+
+
 @dataclasses.dataclass(slots=True, init=False)
 class YandexGPTClient(LLMClient):
     config: YandexGPTConfig
     httpx_client: httpx.AsyncClient
     request_retry: RequestRetryConfig
-
-    def __init__(
+    rate_limiter: RateLimiter | None
+    circuit_breaker: CircuitBreaker | None
+    concurrency_limiter: AdaptiveConcurrencyLimiter | None
+    load_balancer: LoadBalancer
+    connections_warm_up: ConnectionsWarmUp
+    _request_template: RequestTemplate
+    _model_uri: str
+
+    def __init__(  # noqa: PLR0913
         self,
         config: YandexGPTConfig,
         *,
         request_retry: RequestRetryConfig | None = None,
+        rate_limiter: RateLimiter | None = None,
+        circuit_breaker: CircuitBreaker | None = None,
+        concurrency_limiter: AdaptiveConcurrencyLimiter | None = None,
+        transport_pool: SharedTransportPool | None = None,
         **httpx_kwargs: typing.Any,  # noqa: ANN401
     ) -> None:
         self.config = config
         self.request_retry = request_retry or RequestRetryConfig()
-        self.httpx_client = get_http_client_from_kwargs(httpx_kwargs)
-
-    def _build_request(self, payload: dict[str, typing.Any]) -> httpx.Request:
-        return self.httpx_client.build_request(
-            method="POST",
-            url=str(self.config.url),
-            json=payload,
-            headers={"Authorization": self.config.auth_header, "x-data-logging-enabled": "false"},
+        self.rate_limiter = rate_limiter
+        self.circuit_breaker = circuit_breaker
+        self.concurrency_limiter = concurrency_limiter
+        self.load_balancer = LoadBalancer(replicas=[Replica(url=str(config.url))])
+        self._request_template = RequestTemplate.from_replicas(
+            self.load_balancer, headers={"Authorization": config.auth_header, "x-data-logging-enabled": "false"}
+        )
+        self._model_uri = f"gpt://{config.folder_id}/{config.model_name}/{config.model_version}"
+        self.httpx_client = get_http_client_from_kwargs(
+            httpx_kwargs,
+            transport_pool=transport_pool,
+            urls=(one_replica.url for one_replica in self.load_balancer.replicas),
+        )
+        self.connections_warm_up = ConnectionsWarmUp(
+            connections_count=config.warm_up_connections_count, keep_alive_interval=config.keep_alive_interval
         )
 
-    def _prepare_payload(
+    def _prepare_request_body(
         self,
         *,
         messages: str | list[Message],
         temperature: float,
         stream: bool,
         extra: dict[str, typing.Any] | None,
-    ) -> dict[str, typing.Any]:
+    ) -> YandexGPTRequest:
         if isinstance(messages, str):
             prepared_messages = [YandexGPTMessage(role=MessageRole.user, text=messages)]
+        elif isinstance(messages, Conversation):
+            prepared_messages = messages.encode(_prepare_one_message)
         else:
-            prepared_messages = []
-            for one_message in messages:
-                if isinstance(one_message.content, list):
-                    if len(one_message.content) != 1:
-                        raise LLMRequestValidationError(
-                            "YandexGPTClient does not support multiple content items per message",
-                        )
-                    message_content = one_message.content[0]
-                    if isinstance(message_content, ImageContentItem):
-                        raise LLMRequestValidationError("YandexGPTClient does not support image content items")
-                    message_text = message_content.text
-                else:
-                    message_text = one_message.content
-                prepared_messages.append(YandexGPTMessage(role=one_message.role, text=message_text))
+            prepared_messages = [_prepare_one_message(one_message) for one_message in messages]
 
         return YandexGPTRequest(
-            modelUri=f"gpt://{self.config.folder_id}/{self.config.model_name}/{self.config.model_version}",
+            modelUri=self._model_uri,
             completionOptions=YandexGPTCompletionOptions(
                 stream=stream,
                 temperature=self.config._resolve_request_temperature(temperature),  # noqa: SLF001
@@ -149,53 +274,89 @@ class YandexGPTClient(LLMClient):
             ),
             messages=prepared_messages,
             **self.config.request_extra | (extra or {}),
+        )
+
+    def _prepare_payload(
+        self,
+        *,
+        messages: str | list[Message],
+        temperature: float,
+        stream: bool,
+        extra: dict[str, typing.Any] | None,
+    ) -> dict[str, typing.Any]:
+        return self._prepare_request_body(
+            messages=messages, temperature=temperature, stream=stream, extra=extra
         ).model_dump(mode="json", by_alias=True)
 
+    def _estimate_tokens(self, request_body: YandexGPTRequest) -> int:
+        if not self.rate_limiter or self.rate_limiter.tokens_per_minute is None:
+            return 0
+        return self.rate_limiter.estimate_tokens(
+            request_body.model_dump(mode="json", by_alias=True), max_output_tokens=self.config.max_tokens
+        )
+
+    def _record_usage(self, *, estimated_tokens: int, usage: YandexGPTUsage | None) -> None:
+        if self.rate_limiter and usage:
+            self.rate_limiter.record_usage(estimated_tokens=estimated_tokens, used_tokens=usage.total_tokens)
+
     async def request_llm_message(
         self,
         messages: str | list[Message],
         *,
         temperature: float = LLMConfigValue(attr="temperature"),
         extra: dict[str, typing.Any] | None = None,
+        timeout: float | None = None,
     ) -> LLMResponse:
-        payload: typing.Final = self._prepare_payload(
+        deadline: typing.Final = RequestDeadline.from_timeout(timeout)
+        request_body: typing.Final = self._prepare_request_body(
             messages=messages,
             temperature=temperature,
             stream=False,
             extra=extra,
         )
+        # Encoded once and sent as is by each attempt
+        request_content: typing.Final = request_body.model_dump_json(by_alias=True).encode()
+        estimated_tokens: typing.Final = self._estimate_tokens(request_body)
 
         try:
             response: typing.Final = await make_http_request(
                 httpx_client=self.httpx_client,
                 request_retry=self.request_retry,
-                build_request=lambda: self._build_request(payload),
+                load_balancer=self.load_balancer,
+                build_request=functools.partial(
+                    self._request_template.build_request, self.httpx_client, request_content
+                ),
+                rate_limiter=self.rate_limiter,
+                circuit_breaker=self.circuit_breaker,
+                concurrency_limiter=self.concurrency_limiter,
+                estimated_tokens=estimated_tokens,
+                deadline=deadline,
             )
         except httpx.HTTPStatusError as exception:
             _handle_status_error(status_code=exception.response.status_code, content=exception.response.content)
 
-        try:
-            validated_response: typing.Final = YandexGPTResponse.model_validate_json(response.content)
-        except pydantic.ValidationError as validation_error:
-            raise LLMResponseValidationError(
-                response_content=response.content, original_error=validation_error
-            ) from validation_error
-
+        validated_response: typing.Final = _validate_response(response.content)
+        self._record_usage(estimated_tokens=estimated_tokens, usage=validated_response.result.usage)
         return LLMResponse(content=validated_response.result.alternatives[0].message.text)
 
-    async def _iter_response_chunks(self, response: httpx.Response) -> typing.AsyncIterable[LLMResponse]:
-        previous_cursor = 0
-        async for one_line in response.aiter_lines():
-            try:
-                validated_response = YandexGPTResponse.model_validate_json(one_line)
-            except pydantic.ValidationError as validation_error:
-                raise LLMResponseValidationError(
-                    response_content=one_line.encode(), original_error=validation_error
-                ) from validation_error
-
-            response_text = validated_response.result.alternatives[0].message.text
-            yield LLMResponse(content=response_text[previous_cursor:])
-            previous_cursor = len(response_text)
+    async def _iter_response_chunks(
+        self, byte_chunks: typing.AsyncIterable[bytes], *, estimated_tokens: int, deadline: RequestDeadline | None
+    ) -> typing.AsyncIterable[LLMResponse]:
+        text_decoder: typing.Final = _CumulativeTextDecoder()
+        last_line: bytes | None = None
+        async for one_line in iter_with_chunk_timeouts(
+            iter_byte_lines(byte_chunks),
+            first_chunk_timeout=self.config.first_chunk_timeout,
+            chunk_idle_timeout=self.config.chunk_idle_timeout,
+            deadline=deadline,
+        ):
+            if one_line:
+                yield LLMResponse(content=text_decoder.decode_new_text(one_line))
+                last_line = one_line
+
+        # Usage is reported in the last line
+        usage: typing.Final = _validate_response(last_line).result.usage if self.rate_limiter and last_line else None
+        self._record_usage(estimated_tokens=estimated_tokens, usage=usage)
 
     @contextlib.asynccontextmanager
     async def stream_llm_message_chunks(
@@ -204,21 +365,35 @@ class YandexGPTClient(LLMClient):
         *,
         temperature: float = LLMConfigValue(attr="temperature"),
         extra: dict[str, typing.Any] | None = None,
+        timeout: float | None = None,
     ) -> typing.AsyncIterator[typing.AsyncIterable[LLMResponse]]:
-        payload: typing.Final = self._prepare_payload(
+        deadline: typing.Final = RequestDeadline.from_timeout(timeout)
+        request_body: typing.Final = self._prepare_request_body(
             messages=messages,
             temperature=temperature,
             stream=True,
             extra=extra,
         )
+        # Encoded once and sent as is by each attempt
+        request_content: typing.Final = request_body.model_dump_json(by_alias=True).encode()
+        estimated_tokens: typing.Final = self._estimate_tokens(request_body)
 
         try:
             async with make_streaming_http_request(
                 httpx_client=self.httpx_client,
                 request_retry=self.request_retry,
-                build_request=lambda: self._build_request(payload),
-            ) as response:
-                yield self._iter_response_chunks(response)
+                load_balancer=self.load_balancer,
+                build_request=functools.partial(
+                    self._request_template.build_request, self.httpx_client, request_content
+                ),
+                rate_limiter=self.rate_limiter,
+                circuit_breaker=self.circuit_breaker,
+                concurrency_limiter=self.concurrency_limiter,
+                estimated_tokens=estimated_tokens,
+                deadline=deadline,
+                first_chunk_timeout=self.config.first_chunk_timeout,
+            ) as byte_chunks:
+                yield self._iter_response_chunks(byte_chunks, estimated_tokens=estimated_tokens, deadline=deadline)
         except httpx.HTTPStatusError as exception:
             content: typing.Final = await exception.response.aread()
             await exception.response.aclose()
@@ -226,6 +401,9 @@ class YandexGPTClient(LLMClient):
 
     async def __aenter__(self) -> typing_extensions.Self:
         await self.httpx_client.__aenter__()
+        self.connections_warm_up.start(
+            self.httpx_client, [one_replica.url for one_replica in self.load_balancer.replicas]
+        )
         return self
 
     async def __aexit__(
@@ -234,4 +412,5 @@ class YandexGPTClient(LLMClient):
         exc_value: BaseException | None,
         traceback: types.TracebackType | None,
     ) -> None:
+        await self.connections_warm_up.stop()
         await self.httpx_client.__aexit__(exc_type=exc_type, exc_value=exc_value, traceback=traceback)
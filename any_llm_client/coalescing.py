@@ -0,0 +1,185 @@
+import asyncio
+import contextlib
+import dataclasses
+import types
+import typing
+
+import typing_extensions
+
+from any_llm_client.cache import make_request_cache_key
+from any_llm_client.core import LLMClient, LLMConfigValue, LLMResponse, Message
+
+
+@dataclasses.dataclass(slots=True)
+class _InFlightRequest:
+    task: asyncio.Task[LLMResponse]
+    waiters_count: int = 0
+
+
+@dataclasses.dataclass(slots=True)
+class _InFlightStream:
+    chunks: list[LLMResponse] = dataclasses.field(default_factory=list)
+    opened: asyncio.Event = dataclasses.field(default_factory=asyncio.Event)
+    changed: asyncio.Event = dataclasses.field(default_factory=asyncio.Event)
+    is_open: bool = False
+    is_finished: bool = False
+    error: BaseException | None = None
+    subscribers_count: int = 0
+    task: asyncio.Task[None] | None = None
+
+    def notify(self) -> None:
+        changed_event: typing.Final = self.changed
+        self.changed = asyncio.Event()
+        changed_event.set()
+
+    async def iter_chunks(self) -> typing.AsyncIterable[LLMResponse]:
+        chunk_index = 0
+        while True:
+            while chunk_index < len(self.chunks):
+                yield self.chunks[chunk_index]
+                chunk_index += 1
+            if self.is_finished:
+                if self.error is not None:
+                    raise self.error
+                return
+            await self.changed.wait()
+
+
+@dataclasses.dataclass(slots=True)
+class CoalescingLLMClient(LLMClient):
+    """Sends one request for concurrent calls with identical provider payload, and shares its result between them.
+
+    Late joiners of a stream receive chunks that were already received, and then the rest of the stream.
+    The request is cancelled when all callers that wait for it are cancelled. The shared request uses `timeout` of the
+    caller that started it.
+    """
+
+    client: LLMClient
+    _in_flight_requests: dict[str, _InFlightRequest] = dataclasses.field(default_factory=dict, init=False, repr=False)
+    _in_flight_streams: dict[str, _InFlightStream] = dataclasses.field(default_factory=dict, init=False, repr=False)
+
+    @property
+    def _prepare_payload(self) -> typing.Callable[..., dict[str, typing.Any]] | None:
+        return getattr(self.client, "_prepare_payload", None)
+
+    def _forget_in_flight_request(self, request_key: str, in_flight_request: _InFlightRequest) -> None:
+        if self._in_flight_requests.get(request_key) is in_flight_request:
+            del self._in_flight_requests[request_key]
+
+    def _forget_in_flight_stream(self, request_key: str, in_flight_stream: _InFlightStream) -> None:
+        if self._in_flight_streams.get(request_key) is in_flight_stream:
+            del self._in_flight_streams[request_key]
+
+    async def request_llm_message(
+        self,
+        messages: str | list[Message],
+        *,
+        temperature: float = LLMConfigValue(attr="temperature"),
+        extra: dict[str, typing.Any] | None = None,
+        timeout: float | None = None,
+    ) -> LLMResponse:
+        request_key: typing.Final = make_request_cache_key(self.client, messages, temperature=temperature, extra=extra)
+        if request_key is None:
+            return await self.client.request_llm_message(
+                messages, temperature=temperature, extra=extra, timeout=timeout
+            )
+
+        in_flight_request = self._in_flight_requests.get(request_key)
+        if in_flight_request is None:
+            new_in_flight_request: typing.Final = _InFlightRequest(
+                task=asyncio.create_task(
+                    self.client.request_llm_message(messages, temperature=temperature, extra=extra, timeout=timeout)
+                ),
+            )
+            new_in_flight_request.task.add_done_callback(
+                lambda _: self._forget_in_flight_request(request_key, new_in_flight_request)
+            )
+            self._in_flight_requests[request_key] = in_flight_request = new_in_flight_request
+
+        in_flight_request.waiters_count += 1
+        try:
+            return await asyncio.shield(in_flight_request.task)
+        finally:
+            in_flight_request.waiters_count -= 1
+            if not in_flight_request.waiters_count:
+                self._forget_in_flight_request(request_key, in_flight_request)
+                in_flight_request.task.cancel()
+
+    async def _stream_to_subscribers(
+        self,
+        request_key: str,
+        in_flight_stream: _InFlightStream,
+        response_chunks_context: contextlib.AbstractAsyncContextManager[typing.AsyncIterable[LLMResponse]],
+    ) -> None:
+        try:
+            async with response_chunks_context as response_chunks:
+                in_flight_stream.is_open = True
+                in_flight_stream.opened.set()
+                async for one_chunk in response_chunks:
+                    in_flight_stream.chunks.append(one_chunk)
+                    in_flight_stream.notify()
+        except Exception as exception:  # noqa: BLE001
+            in_flight_stream.error = exception
+        except asyncio.CancelledError as exception:
+            in_flight_stream.error = exception
+            raise
+        finally:
+            self._forget_in_flight_stream(request_key, in_flight_stream)
+            in_flight_stream.is_finished = True
+            in_flight_stream.opened.set()
+            in_flight_stream.notify()
+
+    @contextlib.asynccontextmanager
+    async def stream_llm_message_chunks(
+        self,
+        messages: str | list[Message],
+        *,
+        temperature: float = LLMConfigValue(attr="temperature"),
+        extra: dict[str, typing.Any] | None = None,
+        timeout: float | None = None,
+    ) -> typing.AsyncIterator[typing.AsyncIterable[LLMResponse]]:
+        request_key: typing.Final = make_request_cache_key(self.client, messages, temperature=temperature, extra=extra)
+        if request_key is None:
+            async with self.client.stream_llm_message_chunks(
+                messages, temperature=temperature, extra=extra, timeout=timeout
+            ) as response_chunks:
+                yield response_chunks
+            return
+
+        in_flight_stream = self._in_flight_streams.get(request_key)
+        if in_flight_stream is None:
+            in_flight_stream = _InFlightStream()
+            self._in_flight_streams[request_key] = in_flight_stream
+            in_flight_stream.task = asyncio.create_task(
+                self._stream_to_subscribers(
+                    request_key,
+                    in_flight_stream,
+                    self.client.stream_llm_message_chunks(
+                        messages, temperature=temperature, extra=extra, timeout=timeout
+                    ),
+                )
+            )
+
+        in_flight_stream.subscribers_count += 1
+        try:
+            await in_flight_stream.opened.wait()
+            if not in_flight_stream.is_open and in_flight_stream.error is not None:
+                raise in_flight_stream.error
+            yield in_flight_stream.iter_chunks()
+        finally:
+            in_flight_stream.subscribers_count -= 1
+            if not in_flight_stream.subscribers_count and in_flight_stream.task:
+                self._forget_in_flight_stream(request_key, in_flight_stream)
+                in_flight_stream.task.cancel()
+
+    async def __aenter__(self) -> typing_extensions.Self:
+        await self.client.__aenter__()
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: types.TracebackType | None,
+    ) -> None:
+        await self.client.__aexit__(exc_type, exc_value, traceback)
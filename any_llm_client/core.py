@@ -1,6 +1,7 @@
 import contextlib
 import dataclasses
 import enum
+import time
 import types
 import typing
 
@@ -74,6 +75,37 @@ else:
         return Message(role=MessageRole.assistant, content=content)
 
 
+_EncodedMessageT = typing.TypeVar("_EncodedMessageT")
+
+
+class Conversation(list[Message]):
+    """List of messages that keeps them encoded for each client, so that the next turn only encodes new messages.
+
+    Pass it wherever a list of messages is accepted, and append messages of each turn to it. Messages are matched to
+    their encodings by identity: replace a message instead of changing it in place.
+    """
+
+    __slots__ = ("_encodings",)
+
+    def __init__(self, messages: typing.Iterable[Message] = ()) -> None:
+        super().__init__(messages)
+        self._encodings: dict[typing.Callable[[Message], typing.Any], tuple[list[Message], list[typing.Any]]] = {}
+
+    def encode(self, encode_message: typing.Callable[[Message], _EncodedMessageT]) -> list[_EncodedMessageT]:
+        source_messages, encoded_messages = self._encodings.get(encode_message, ([], []))
+        reused_count = 0
+        for source_message, current_message in zip(source_messages, self, strict=False):
+            if source_message is not current_message:
+                break
+            reused_count += 1
+
+        new_encoded_messages: typing.Final = encoded_messages[:reused_count] + [
+            encode_message(one_message) for one_message in self[reused_count:]
+        ]
+        self._encodings[encode_message] = (list(self), new_encoded_messages)
+        return new_encoded_messages
+
+
 class LLMConfig(pydantic.BaseModel):
     model_config = pydantic.ConfigDict(protected_namespaces=())
     api_type: str
@@ -101,6 +133,11 @@ else:
         attr: str
 
 
+def get_remaining_timeout(timeout: float | None, *, started_at: float) -> float | None:
+    """Part of request `timeout` that is left since `started_at` (`time.monotonic()` value), for wrapping clients."""
+    return None if timeout is None else timeout - (time.monotonic() - started_at)
+
+
 @dataclasses.dataclass(slots=True, init=False)
 class LLMClient(typing.Protocol):
     async def request_llm_message(
@@ -109,7 +146,8 @@ class LLMClient(typing.Protocol):
         *,
         temperature: float = LLMConfigValue(attr="temperature"),
         extra: dict[str, typing.Any] | None = None,
-    ) -> LLMResponse: ...  # raises LLMError, LLMRequestValidationError
+        timeout: float | None = None,
+    ) -> LLMResponse: ...  # raises LLMError, LLMRequestValidationError, LLMRequestTimeoutError
 
     @contextlib.asynccontextmanager
     def stream_llm_message_chunks(
@@ -118,8 +156,48 @@ class LLMClient(typing.Protocol):
         *,
         temperature: float = LLMConfigValue(attr="temperature"),
         extra: dict[str, typing.Any] | None = None,
+        timeout: float | None = None,
     ) -> typing.AsyncIterator[typing.AsyncIterable[LLMResponse]]: ...  # raises LLMError, LLMRequestValidationError
 
+    async def request_llm_messages_many(  # noqa: PLR0913
+        self,
+        messages_list: typing.Sequence[str | list[Message]],
+        *,
+        temperature: float = LLMConfigValue(attr="temperature"),
+        extra: dict[str, typing.Any] | None = None,
+        max_concurrency: int = 8,
+        on_progress: typing.Callable[[int, int], None] | None = None,
+        timeout: float | None = None,
+    ) -> list[LLMResponse | Exception]:
+        """Request LLM message for each item of `messages_list`, running at most `max_concurrency` requests at once.
+
+        Results are returned in the input order. A failed request doesn't cancel the batch, its exception is returned
+        in place of the response. `on_progress` is called with numbers of finished and all requests after each request.
+        `timeout` limits each request. Raises `ValueError` when `max_concurrency` is less than one.
+        """
+        from any_llm_client.pipeline import map_llm_messages  # noqa: PLC0415
+
+        results: typing.Final[list[LLMResponse | Exception | None]] = [None] * len(messages_list)
+        finished_count = 0
+        async with contextlib.aclosing(
+            map_llm_messages(
+                self,
+                range(len(messages_list)),
+                get_messages=messages_list.__getitem__,
+                temperature=temperature,
+                extra=extra,
+                max_concurrency=max_concurrency,
+                ordered=False,
+                timeout=timeout,
+            )
+        ) as indexed_results:
+            async for one_index, one_result in indexed_results:
+                results[one_index] = one_result
+                finished_count += 1
+                if on_progress:
+                    on_progress(finished_count, len(messages_list))
+        return typing.cast("list[LLMResponse | Exception]", results)
+
     async def __aenter__(self) -> typing_extensions.Self: ...
     async def __aexit__(
         self,
@@ -144,6 +222,15 @@ class LLMError(AnyLLMClientError):
 class OutOfTokensOrSymbolsError(LLMError): ...
 
 
+@dataclasses.dataclass
+class LLMCircuitOpenError(LLMError):
+    """Request was rejected without sending, since the circuit breaker of the URL is open."""
+
+    url: str = ""
+    retry_after: float = 0.0
+    "Seconds until the circuit becomes half-open."
+
+
 @dataclasses.dataclass
 class LLMRequestValidationError(AnyLLMClientError):
     message: str
@@ -153,3 +240,24 @@ class LLMRequestValidationError(AnyLLMClientError):
 class LLMResponseValidationError(AnyLLMClientError):
     response_content: bytes
     original_error: pydantic.ValidationError
+
+
+@dataclasses.dataclass
+class LLMQueueTimeoutError(AnyLLMClientError):
+    queue_timeout: float
+
+
+@dataclasses.dataclass
+class LLMRequestTimeoutError(AnyLLMClientError):
+    """Request (including retries and reading the stream) didn't complete within `timeout` seconds."""
+
+    timeout: float
+
+
+@dataclasses.dataclass
+class LLMStreamTimeoutError(AnyLLMClientError):
+    """Streaming response didn't produce the next chunk in time."""
+
+    timeout: float
+    chunks_count: int
+    "Number of chunks that were received before the timeout, zero when the first chunk timed out."
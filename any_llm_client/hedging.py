@@ -0,0 +1,235 @@
+import asyncio
+import collections
+import contextlib
+import dataclasses
+import time
+import types
+import typing
+
+import typing_extensions
+
+from any_llm_client.core import LLMClient, LLMConfigValue, LLMResponse, Message, get_remaining_timeout
+
+
+_AttemptResultT = typing.TypeVar("_AttemptResultT")
+_QUANTILE_UPDATE_INTERVAL: typing.Final = 10
+
+
+@dataclasses.dataclass(slots=True)
+class HedgingStats:
+    requests_count: int = 0
+    hedged_requests_count: int = 0
+    hedge_wins_count: int = 0
+
+
+@dataclasses.dataclass(kw_only=True, slots=True)
+class _LatencyWindow:
+    size: int
+    samples: collections.deque[float] = dataclasses.field(init=False)
+    cached_quantile: float | None = None
+    new_samples_count: int = 0
+
+    def __post_init__(self) -> None:
+        self.samples = collections.deque(maxlen=self.size)
+
+    def record(self, latency: float) -> None:
+        self.samples.append(latency)
+        self.new_samples_count += 1
+
+    def get_quantile(self, quantile: float) -> float:
+        # Sorting the window on each request is too slow for high request rates
+        if self.cached_quantile is None or self.new_samples_count >= _QUANTILE_UPDATE_INTERVAL:
+            sorted_samples: typing.Final = sorted(self.samples)
+            self.cached_quantile = sorted_samples[min(int(len(sorted_samples) * quantile), len(sorted_samples) - 1)]
+            self.new_samples_count = 0
+        return self.cached_quantile
+
+
+@dataclasses.dataclass(slots=True)
+class _OpenedStream:
+    exit_stack: contextlib.AsyncExitStack
+    chunks_iterator: typing.AsyncIterator[LLMResponse]
+    first_chunk: LLMResponse | None
+
+    async def iter_chunks(self) -> typing.AsyncIterable[LLMResponse]:
+        if self.first_chunk is None:
+            return
+        yield self.first_chunk
+        async for one_chunk in self.chunks_iterator:
+            yield one_chunk
+
+
+def _find_successful_attempt(
+    attempts: typing.Sequence[tuple[asyncio.Future[_AttemptResultT], float]],
+    done_tasks: typing.AbstractSet[asyncio.Future[_AttemptResultT]],
+) -> int | None:
+    return next(
+        (
+            attempt_index
+            for attempt_index, (one_task, _) in enumerate(attempts)
+            if one_task in done_tasks and one_task.exception() is None
+        ),
+        None,
+    )
+
+
+async def _close_opened_stream(opened_stream: _OpenedStream) -> None:
+    await opened_stream.exit_stack.aclose()
+
+
+@dataclasses.dataclass(slots=True)
+class HedgedLLMClient(LLMClient):
+    """Sends a second (hedged) request when the first one takes too long, and uses the response that comes first.
+
+    A request is hedged when there's no response (or, for streams, no first chunk) after `hedge_delay`, which is by
+    default the `latency_quantile` of recent latencies. The slower request is cancelled, and its stream is closed.
+    A failed request is not hedged, use retries for that.
+    """
+
+    client: LLMClient
+    hedge_client: LLMClient | None = None
+    "Client for hedged requests, for example, with another provider. By default hedged requests are sent with `client`, which routes them to a less loaded replica."  # noqa: E501
+    hedge_delay: float | None = None
+    "Fixed delay before the hedged request, instead of the `latency_quantile` of recent latencies."
+    latency_quantile: float = 0.95
+    initial_hedge_delay: float = 2.0
+    "Delay that is used until `min_latency_samples` latencies are observed."
+    min_latency_samples: int = 20
+    latency_window_size: int = 1000
+    stats: HedgingStats = dataclasses.field(default_factory=HedgingStats)
+    _response_latencies: _LatencyWindow = dataclasses.field(init=False, repr=False)
+    _first_chunk_latencies: _LatencyWindow = dataclasses.field(init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        self._response_latencies = _LatencyWindow(size=self.latency_window_size)
+        self._first_chunk_latencies = _LatencyWindow(size=self.latency_window_size)
+
+    @property
+    def _prepare_payload(self) -> typing.Callable[..., dict[str, typing.Any]] | None:
+        return getattr(self.client, "_prepare_payload", None)
+
+    def _get_hedge_delay(self, latencies: _LatencyWindow) -> float:
+        if self.hedge_delay is not None:
+            return self.hedge_delay
+        # Quantile of an empty window is undefined, with `min_latency_samples=0` too
+        if not latencies.samples or len(latencies.samples) < self.min_latency_samples:
+            return self.initial_hedge_delay
+        return latencies.get_quantile(self.latency_quantile)
+
+    async def _run_hedged(
+        self,
+        make_attempt: typing.Callable[[LLMClient], typing.Awaitable[_AttemptResultT]],
+        *,
+        latencies: _LatencyWindow,
+        close_loser: typing.Callable[[_AttemptResultT], typing.Awaitable[None]] | None = None,
+    ) -> _AttemptResultT:
+        self.stats.requests_count += 1
+        attempts: typing.Final = [(asyncio.ensure_future(make_attempt(self.client)), time.monotonic())]
+        winner_task: asyncio.Future[_AttemptResultT] | None = None
+        try:
+            done_tasks, pending_tasks = await asyncio.wait([attempts[0][0]], timeout=self._get_hedge_delay(latencies))
+            if pending_tasks:
+                self.stats.hedged_requests_count += 1
+                hedge_task = asyncio.ensure_future(make_attempt(self.hedge_client or self.client))
+                attempts.append((hedge_task, time.monotonic()))
+                pending_tasks.add(hedge_task)
+
+            while (winner_index := _find_successful_attempt(attempts, done_tasks)) is None and pending_tasks:
+                done_tasks, pending_tasks = await asyncio.wait(pending_tasks, return_when=asyncio.FIRST_COMPLETED)
+            if winner_index is None:
+                return attempts[0][0].result()
+
+            winner_task, started_at = attempts[winner_index]
+            latencies.record(time.monotonic() - started_at)
+            if winner_index:
+                self.stats.hedge_wins_count += 1
+            return winner_task.result()
+        finally:
+            loser_tasks: typing.Final = [one_task for one_task, _ in attempts if one_task is not winner_task]
+            for one_task in loser_tasks:
+                one_task.cancel()
+            loser_results: typing.Final = await asyncio.gather(*loser_tasks, return_exceptions=True)
+            if close_loser:
+                for one_result in loser_results:
+                    if not isinstance(one_result, BaseException):
+                        await close_loser(one_result)
+
+    async def request_llm_message(
+        self,
+        messages: str | list[Message],
+        *,
+        temperature: float = LLMConfigValue(attr="temperature"),
+        extra: dict[str, typing.Any] | None = None,
+        timeout: float | None = None,
+    ) -> LLMResponse:
+        started_at: typing.Final = time.monotonic()
+        return await self._run_hedged(
+            lambda client: client.request_llm_message(
+                messages,
+                temperature=temperature,
+                extra=extra,
+                timeout=get_remaining_timeout(timeout, started_at=started_at),
+            ),
+            latencies=self._response_latencies,
+        )
+
+    @staticmethod
+    async def _open_stream(
+        client: LLMClient,
+        messages: str | list[Message],
+        *,
+        temperature: float,
+        extra: dict[str, typing.Any] | None,
+        timeout: float | None,
+    ) -> _OpenedStream:
+        exit_stack: typing.Final = contextlib.AsyncExitStack()
+        try:
+            chunks: typing.Final = await exit_stack.enter_async_context(
+                client.stream_llm_message_chunks(messages, temperature=temperature, extra=extra, timeout=timeout)
+            )
+            chunks_iterator: typing.Final = aiter(chunks)
+            first_chunk: typing.Final = await anext(chunks_iterator, None)
+        except BaseException:
+            await exit_stack.aclose()
+            raise
+        return _OpenedStream(exit_stack=exit_stack, chunks_iterator=chunks_iterator, first_chunk=first_chunk)
+
+    @contextlib.asynccontextmanager
+    async def stream_llm_message_chunks(
+        self,
+        messages: str | list[Message],
+        *,
+        temperature: float = LLMConfigValue(attr="temperature"),
+        extra: dict[str, typing.Any] | None = None,
+        timeout: float | None = None,
+    ) -> typing.AsyncIterator[typing.AsyncIterable[LLMResponse]]:
+        started_at: typing.Final = time.monotonic()
+        opened_stream: typing.Final = await self._run_hedged(
+            lambda client: self._open_stream(
+                client,
+                messages,
+                temperature=temperature,
+                extra=extra,
+                timeout=get_remaining_timeout(timeout, started_at=started_at),
+            ),
+            latencies=self._first_chunk_latencies,
+            close_loser=_close_opened_stream,
+        )
+        async with opened_stream.exit_stack:
+            yield opened_stream.iter_chunks()
+
+    async def __aenter__(self) -> typing_extensions.Self:
+        await self.client.__aenter__()
+        if self.hedge_client is not None and self.hedge_client is not self.client:
+            await self.hedge_client.__aenter__()
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: types.TracebackType | None,
+    ) -> None:
+        if self.hedge_client is not None and self.hedge_client is not self.client:
+            await self.hedge_client.__aexit__(exc_type, exc_value, traceback)
+        await self.client.__aexit__(exc_type, exc_value, traceback)
@@ -1,52 +1,370 @@
+import asyncio
 import contextlib
 import dataclasses
+import datetime
+import re
+import time
 import typing
+from http import HTTPStatus
 
 import httpx
 import stamina
 
+from any_llm_client.balancer import LoadBalancer, Replica
+from any_llm_client.circuit_breaker import CircuitBreaker
+from any_llm_client.core import AnyLLMClientError, LLMRequestTimeoutError, LLMStreamTimeoutError
+from any_llm_client.limiter import AdaptiveConcurrencyLimiter
+from any_llm_client.rate_limit import RateLimiter
 from any_llm_client.retry import RequestRetryConfig
+from any_llm_client.transport_pool import SharedTransportPool
 
 
 DEFAULT_HTTP_TIMEOUT: typing.Final = httpx.Timeout(None, connect=5.0)
+_ResponseT = typing.TypeVar("_ResponseT")
+_SendRequest = typing.Callable[[], typing.Awaitable[_ResponseT]]
+_ChunkT = typing.TypeVar("_ChunkT")
+_LINE_END_PATTERN: typing.Final = re.compile(rb"\r\n|\r|\n")
 
 
-def get_http_client_from_kwargs(kwargs: dict[str, typing.Any]) -> httpx.AsyncClient:
+@dataclasses.dataclass(frozen=True, kw_only=True, slots=True)
+class RequestDeadline:
+    timeout: float
+    expires_at: float
+
+    @classmethod
+    def from_timeout(cls, timeout: float | None) -> "RequestDeadline | None":
+        return None if timeout is None else cls(timeout=timeout, expires_at=time.monotonic() + timeout)
+
+    def is_expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    def get_remaining_time(self) -> float:
+        """Seconds until the deadline. Raises `LLMRequestTimeoutError` when it has passed."""
+        remaining_time: typing.Final = self.expires_at - time.monotonic()
+        if remaining_time <= 0:
+            raise LLMRequestTimeoutError(timeout=self.timeout)
+        return remaining_time
+
+
+@dataclasses.dataclass(frozen=True, kw_only=True, slots=True)
+class RequestTemplate:
+    """Parts of requests that are the same for all requests of a client, prepared once when the client is created."""
+
+    urls: typing.Mapping[str, httpx.URL]
+    "Parsed replica URLs."
+    headers: httpx.Headers
+
+    @classmethod
+    def from_replicas(cls, load_balancer: LoadBalancer, *, headers: dict[str, str]) -> "RequestTemplate":
+        return cls(
+            urls={one_replica.url: httpx.URL(one_replica.url) for one_replica in load_balancer.replicas},
+            headers=httpx.Headers({"Content-Type": "application/json", **headers}),
+        )
+
+    def build_request(self, httpx_client: httpx.AsyncClient, content: bytes, url: str) -> httpx.Request:
+        return httpx_client.build_request(method="POST", url=self.urls[url], content=content, headers=self.headers)
+
+
+_TRANSPORT_KWARGS: typing.Final = ("transport", "verify", "cert", "http1", "http2", "limits", "proxy")
+
+
+def get_http_client_from_kwargs(
+    kwargs: dict[str, typing.Any], *, transport_pool: SharedTransportPool | None = None, urls: typing.Iterable[str] = ()
+) -> httpx.AsyncClient:
     kwargs_with_defaults: typing.Final = kwargs.copy()
     kwargs_with_defaults.setdefault("timeout", DEFAULT_HTTP_TIMEOUT)
+    if transport_pool:
+        # They configure client's own transport, which is not used for requests to shared origins
+        if conflicting_kwargs := [one_name for one_name in _TRANSPORT_KWARGS if one_name in kwargs]:
+            raise ValueError(
+                f"{', '.join(conflicting_kwargs)} can't be passed with `transport_pool`,"
+                " pass transports for origins in `mounts` instead"
+            )
+        kwargs_with_defaults["mounts"] = transport_pool.make_mounts(urls) | kwargs.get("mounts", {})
     return httpx.AsyncClient(**kwargs_with_defaults)
 
 
-async def make_http_request(
+async def _send_to_replica(  # noqa: PLR0913
+    *,
+    httpx_client: httpx.AsyncClient,
+    load_balancer: LoadBalancer,
+    replica: Replica,
+    build_request: typing.Callable[[str], httpx.Request],
+    circuit_breaker: CircuitBreaker | None,
+    concurrency_limiter: AdaptiveConcurrencyLimiter | None,
+    deadline: RequestDeadline | None,
+    stream: bool,
+) -> httpx.Response:
+    request: typing.Final = build_request(replica.url)
+    if deadline:
+        _limit_request_timeout(request, deadline.get_remaining_time())
+    with circuit_breaker.guard(replica.url) if circuit_breaker else contextlib.nullcontext():
+        started_at: typing.Final = time.monotonic()
+        try:
+            response: typing.Final = await httpx_client.send(request, stream=stream)
+        except httpx.TransportError as exception:
+            is_timeout: typing.Final = isinstance(exception, httpx.TimeoutException)
+            if is_timeout and deadline and deadline.is_expired():
+                # Caller's deadline is not a failure of the server
+                raise LLMRequestTimeoutError(timeout=deadline.timeout) from exception
+            load_balancer.record_failure(replica)
+            if circuit_breaker:
+                circuit_breaker.record_failure(replica.url, is_timeout=is_timeout)
+            if concurrency_limiter and is_timeout:
+                concurrency_limiter.record_overload(replica.url)
+            raise
+        if concurrency_limiter:
+            concurrency_limiter.record_response(
+                replica.url, status_code=response.status_code, latency=time.monotonic() - started_at
+            )
+        if response.status_code >= HTTPStatus.INTERNAL_SERVER_ERROR:
+            load_balancer.record_failure(replica)
+            if circuit_breaker:
+                circuit_breaker.record_failure(replica.url)
+        else:
+            load_balancer.record_success(replica)
+            if circuit_breaker:
+                circuit_breaker.record_success(replica.url)
+        return response
+
+
+@contextlib.asynccontextmanager
+async def _hold_concurrency_slot(
+    concurrency_limiter: AdaptiveConcurrencyLimiter | None, url: str
+) -> typing.AsyncIterator[None]:
+    if concurrency_limiter is None:
+        yield
+        return
+    await concurrency_limiter.acquire(url)
+    try:
+        yield
+    finally:
+        concurrency_limiter.release(url)
+
+
+def _limit_request_timeout(request: httpx.Request, max_timeout: float) -> None:
+    request.extensions["timeout"] = {
+        timeout_name: max_timeout if timeout_value is None else min(timeout_value, max_timeout)
+        for timeout_name, timeout_value in request.extensions["timeout"].items()
+    }
+
+
+def _retry_request(
+    request_retry: RequestRetryConfig, deadline: RequestDeadline | None
+) -> typing.Callable[[_SendRequest[_ResponseT]], _SendRequest[_ResponseT]]:
+    retry_timeout = (
+        request_retry.timeout.total_seconds()
+        if isinstance(request_retry.timeout, datetime.timedelta)
+        else request_retry.timeout
+    )
+    if deadline:
+        remaining_time: typing.Final = deadline.get_remaining_time()
+        retry_timeout = remaining_time if retry_timeout is None else min(retry_timeout, remaining_time)
+    return stamina.retry(
+        on=request_retry.get_backoff,
+        attempts=request_retry.attempts,
+        timeout=retry_timeout,
+        wait_initial=request_retry.wait_initial,
+        wait_max=request_retry.wait_max,
+        wait_jitter=request_retry.wait_jitter,
+        wait_exp_base=request_retry.wait_exp_base,
+    )
+
+
+async def _run_until_deadline(send_request: _SendRequest[_ResponseT], deadline: RequestDeadline | None) -> _ResponseT:
+    """Bound all attempts and backoff between them by the deadline."""
+    if deadline is None:
+        return await send_request()
+    remaining_time: typing.Final = deadline.get_remaining_time()
+    try:
+        return await asyncio.wait_for(send_request(), timeout=remaining_time)
+    except asyncio.TimeoutError as exception:
+        raise LLMRequestTimeoutError(timeout=deadline.timeout) from exception
+
+
+async def make_http_request(  # noqa: PLR0913
     *,
     httpx_client: httpx.AsyncClient,
     request_retry: RequestRetryConfig,
-    build_request: typing.Callable[[], httpx.Request],
+    load_balancer: LoadBalancer,
+    build_request: typing.Callable[[str], httpx.Request],
+    rate_limiter: RateLimiter | None = None,
+    circuit_breaker: CircuitBreaker | None = None,
+    concurrency_limiter: AdaptiveConcurrencyLimiter | None = None,
+    estimated_tokens: int = 0,
+    affinity_key: bytes | None = None,
+    deadline: RequestDeadline | None = None,
 ) -> httpx.Response:
-    @stamina.retry(on=httpx.HTTPError, **dataclasses.asdict(request_retry))
+    attempts_count = 0
+
+    @_retry_request(request_retry, deadline)
     async def make_request_with_retries() -> httpx.Response:
-        response: typing.Final = await httpx_client.send(build_request())
+        nonlocal attempts_count
+        attempts_count += 1
+        if request_retry.budget is not None:
+            request_retry.budget.record_attempt(is_retry=attempts_count > 1)
+        if rate_limiter:
+            await rate_limiter.acquire(estimated_tokens)
+        with load_balancer.choose_replica(
+            affinity_key, accepts_requests=circuit_breaker.accepts_requests if circuit_breaker else None
+        ) as replica:
+            async with _hold_concurrency_slot(concurrency_limiter, replica.url):
+                response: typing.Final = await _send_to_replica(
+                    httpx_client=httpx_client,
+                    load_balancer=load_balancer,
+                    replica=replica,
+                    build_request=build_request,
+                    circuit_breaker=circuit_breaker,
+                    concurrency_limiter=concurrency_limiter,
+                    deadline=deadline,
+                    stream=False,
+                )
+        if rate_limiter:
+            rate_limiter.observe_response(response)
         response.raise_for_status()
         return response
 
-    return await make_request_with_retries()
+    return await _run_until_deadline(make_request_with_retries, deadline)
 
 
 @contextlib.asynccontextmanager
-async def make_streaming_http_request(
+async def make_streaming_http_request(  # noqa: PLR0913
     *,
     httpx_client: httpx.AsyncClient,
     request_retry: RequestRetryConfig,
-    build_request: typing.Callable[[], httpx.Request],
-) -> typing.AsyncIterator[httpx.Response]:
-    @stamina.retry(on=httpx.HTTPError, **dataclasses.asdict(request_retry))
-    async def make_request_with_retries() -> httpx.Response:
-        response: typing.Final = await httpx_client.send(build_request(), stream=True)
-        response.raise_for_status()
-        return response
+    load_balancer: LoadBalancer,
+    build_request: typing.Callable[[str], httpx.Request],
+    rate_limiter: RateLimiter | None = None,
+    circuit_breaker: CircuitBreaker | None = None,
+    concurrency_limiter: AdaptiveConcurrencyLimiter | None = None,
+    estimated_tokens: int = 0,
+    affinity_key: bytes | None = None,
+    deadline: RequestDeadline | None = None,
+    first_chunk_timeout: float = 0,
+) -> typing.AsyncIterator[typing.AsyncIterable[bytes]]:
+    """Open streaming response and yield its byte chunks.
+
+    With `first_chunk_timeout`, the request is retried with `LLMStreamTimeoutError` when the first chunk doesn't
+    arrive in time. Later chunks are not awaited here, since they can't be retried after the caller got first ones.
+    """
+    attempts_count = 0
+
+    @_retry_request(request_retry, deadline)
+    async def make_request_with_retries() -> tuple[typing.AsyncIterable[bytes], contextlib.AsyncExitStack]:
+        nonlocal attempts_count
+        attempts_count += 1
+        if request_retry.budget is not None:
+            request_retry.budget.record_attempt(is_retry=attempts_count > 1)
+        if rate_limiter:
+            await rate_limiter.acquire(estimated_tokens)
+        async with contextlib.AsyncExitStack() as replica_stack:
+            # Streamed response stays in-flight on the replica until it's closed
+            replica: typing.Final = replica_stack.enter_context(
+                load_balancer.choose_replica(
+                    affinity_key, accepts_requests=circuit_breaker.accepts_requests if circuit_breaker else None
+                )
+            )
+            await replica_stack.enter_async_context(_hold_concurrency_slot(concurrency_limiter, replica.url))
+            response: typing.Final = await _send_to_replica(
+                httpx_client=httpx_client,
+                load_balancer=load_balancer,
+                replica=replica,
+                build_request=build_request,
+                circuit_breaker=circuit_breaker,
+                concurrency_limiter=concurrency_limiter,
+                deadline=deadline,
+                stream=True,
+            )
+            if rate_limiter:
+                rate_limiter.observe_response(response)
+            response.raise_for_status()
+            replica_stack.push_async_callback(response.aclose)
+            byte_chunks: typing.Final = (
+                await _wait_for_first_chunk(response.aiter_bytes(), first_chunk_timeout)
+                if first_chunk_timeout
+                else response.aiter_bytes()
+            )
+            return byte_chunks, replica_stack.pop_all()
+
+    byte_chunks, replica_stack = await _run_until_deadline(make_request_with_retries, deadline)
+    async with replica_stack:
+        yield byte_chunks
 
-    response: typing.Final = await make_request_with_retries()
+
+async def _wait_for_first_chunk(
+    byte_chunks: typing.AsyncIterator[bytes], first_chunk_timeout: float
+) -> typing.AsyncIterable[bytes]:
     try:
-        yield response
-    finally:
-        await response.aclose()
+        first_chunk: typing.Final = await asyncio.wait_for(anext(byte_chunks, b""), timeout=first_chunk_timeout)
+    except asyncio.TimeoutError as exception:
+        raise LLMStreamTimeoutError(timeout=first_chunk_timeout, chunks_count=0) from exception
+    return _prepend_chunk(first_chunk, byte_chunks)
+
+
+async def _prepend_chunk(first_chunk: bytes, byte_chunks: typing.AsyncIterator[bytes]) -> typing.AsyncIterable[bytes]:
+    if first_chunk:
+        yield first_chunk
+    async for one_chunk in byte_chunks:
+        yield one_chunk
+
+
+async def iter_byte_lines(byte_chunks: typing.AsyncIterable[bytes]) -> typing.AsyncIterable[bytes]:
+    r"""Split response bytes into lines, without decoding them to text. Lines end with `\\r\\n`, `\\n` or `\\r`.
+
+    Parts of a line are joined once, when its end is found, so a long line that arrives in many chunks is not copied
+    over and over. Empty lines are yielded too.
+    """
+    line_parts: list[bytes] = []
+    skip_line_feed = False
+    async for one_chunk in byte_chunks:
+        if not one_chunk:
+            continue
+        # "\r" at the end of previous chunk was a line end, don't count "\n" of "\r\n" as another one
+        line_start = 1 if skip_line_feed and one_chunk.startswith(b"\n") else 0
+        skip_line_feed = one_chunk.endswith(b"\r")
+        for line_end_match in _LINE_END_PATTERN.finditer(one_chunk, line_start):
+            line_parts.append(one_chunk[line_start : line_end_match.start()])
+            yield line_parts[0] if len(line_parts) == 1 else b"".join(line_parts)
+            line_parts = []
+            line_start = line_end_match.end()
+        if line_start < len(one_chunk):
+            line_parts.append(one_chunk[line_start:])
+    if line_parts:
+        yield b"".join(line_parts)
+
+
+async def iter_with_chunk_timeouts(
+    chunks: typing.AsyncIterable[_ChunkT],
+    *,
+    first_chunk_timeout: float,
+    chunk_idle_timeout: float,
+    deadline: RequestDeadline | None = None,
+) -> typing.AsyncIterable[_ChunkT]:
+    """Raise `LLMStreamTimeoutError` when the first chunk or any of the next chunks takes too long to arrive.
+
+    Zero timeout disables the check. Only waiting for chunks is timed, not the time the caller spends between them.
+    `LLMRequestTimeoutError` is raised when the stream is not read to the end before the deadline.
+    """
+    if not first_chunk_timeout and not chunk_idle_timeout and deadline is None:
+        async for one_chunk in chunks:
+            yield one_chunk
+        return
+
+    chunks_iterator: typing.Final = aiter(chunks)
+    chunks_count = 0
+    while True:
+        timeout = first_chunk_timeout if chunks_count == 0 else chunk_idle_timeout
+        timeout_error: AnyLLMClientError = LLMStreamTimeoutError(timeout=timeout, chunks_count=chunks_count)
+        if deadline:
+            remaining_time = deadline.get_remaining_time()
+            if not timeout or remaining_time < timeout:
+                timeout = remaining_time
+                timeout_error = LLMRequestTimeoutError(timeout=deadline.timeout)
+        try:
+            one_chunk = await asyncio.wait_for(anext(chunks_iterator), timeout=timeout or None)
+        except StopAsyncIteration:
+            return
+        except asyncio.TimeoutError as exception:
+            raise timeout_error from exception
+        yield one_chunk
+        chunks_count += 1
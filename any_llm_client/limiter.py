@@ -0,0 +1,282 @@
+import asyncio
+import collections
+import contextlib
+import dataclasses
+import datetime
+import enum
+import heapq
+import itertools
+import math
+import time
+import types
+import typing
+from http import HTTPStatus
+
+import typing_extensions
+
+from any_llm_client.core import (
+    LLMClient,
+    LLMConfigValue,
+    LLMQueueTimeoutError,
+    LLMResponse,
+    Message,
+    get_remaining_timeout,
+)
+
+
+OVERLOAD_STATUS_CODES: typing.Final = frozenset({HTTPStatus.TOO_MANY_REQUESTS, HTTPStatus.SERVICE_UNAVAILABLE})
+
+
+class RequestPriority(enum.IntEnum):
+    interactive = 0
+    batch = 1
+
+
+@dataclasses.dataclass(slots=True)
+class ConcurrencyLimiterStats:
+    in_flight: int = 0
+    queue_depth: int = 0
+    max_queue_depth: int = 0
+    acquired_count: int = 0
+    timed_out_count: int = 0
+    total_wait_time: float = 0.0
+    max_wait_time: float = 0.0
+
+
+@dataclasses.dataclass(kw_only=True, slots=True)
+class ConcurrencyLimiter:
+    """Limits number of concurrent requests. Excess requests wait in a queue ordered by priority, then by arrival.
+
+    One limiter can be shared by several clients, for example, with different priorities.
+    """
+
+    max_in_flight: int
+    queue_timeout: float | datetime.timedelta | None = None
+    "Maximum time to wait in queue, `LLMQueueTimeoutError` is raised after it."
+    stats: ConcurrencyLimiterStats = dataclasses.field(default_factory=ConcurrencyLimiterStats)
+    _queue: list[tuple[int, int, asyncio.Future[None]]] = dataclasses.field(
+        default_factory=list, init=False, repr=False
+    )
+    _queue_counter: typing.Iterator[int] = dataclasses.field(default_factory=itertools.count, init=False, repr=False)
+
+    def _wake_up_waiters(self) -> None:
+        while self._queue and self.stats.in_flight < self.max_in_flight:
+            _, _, waiter = heapq.heappop(self._queue)
+            if waiter.done():
+                continue
+            self.stats.in_flight += 1
+            waiter.set_result(None)
+
+    def _release(self) -> None:
+        self.stats.in_flight -= 1
+        self._wake_up_waiters()
+
+    async def _wait_in_queue(self, priority: RequestPriority) -> None:
+        waiter: typing.Final = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, next(self._queue_counter), waiter))
+        self.stats.queue_depth += 1
+        self.stats.max_queue_depth = max(self.stats.max_queue_depth, self.stats.queue_depth)
+        queue_timeout: typing.Final = (
+            self.queue_timeout.total_seconds()
+            if isinstance(self.queue_timeout, datetime.timedelta)
+            else self.queue_timeout
+        )
+        try:
+            await asyncio.wait_for(waiter, timeout=queue_timeout)
+        except asyncio.TimeoutError as exception:
+            if waiter.done() and not waiter.cancelled():  # Woken up right before the timeout
+                self._release()
+            self.stats.timed_out_count += 1
+            raise LLMQueueTimeoutError(queue_timeout=typing.cast("float", queue_timeout)) from exception
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self._release()
+            raise
+        finally:
+            self.stats.queue_depth -= 1
+
+    @contextlib.asynccontextmanager
+    async def acquire(self, priority: RequestPriority = RequestPriority.interactive) -> typing.AsyncIterator[None]:
+        started_at: typing.Final = time.monotonic()
+        if self.stats.in_flight < self.max_in_flight and not self.stats.queue_depth:
+            self.stats.in_flight += 1
+        else:
+            await self._wait_in_queue(priority)
+
+        wait_time: typing.Final = time.monotonic() - started_at
+        self.stats.acquired_count += 1
+        self.stats.total_wait_time += wait_time
+        self.stats.max_wait_time = max(self.stats.max_wait_time, wait_time)
+        try:
+            yield
+        finally:
+            self._release()
+
+
+@dataclasses.dataclass(kw_only=True, slots=True)
+class _BackendLimit:
+    limit: float
+    in_flight_count: int = 0
+    long_latency: float | None = None
+    "Exponential moving average of latencies."
+    waiters: collections.deque[asyncio.Future[None]] = dataclasses.field(default_factory=collections.deque)
+
+
+@dataclasses.dataclass(kw_only=True, slots=True)
+class AdaptiveConcurrencyLimiter:
+    """Finds the number of concurrent requests that each backend URL handles without queueing, and keeps to it.
+
+    The limit follows the gradient between long-term average latency and latency of the request that has just
+    completed: it grows by about `sqrt(limit)` while latency stays flat, and shrinks when latency rises above
+    `tolerance` times the average. On 429 or 503 statuses and timeouts the limit is multiplied by `backoff_ratio`.
+    Excess requests wait for a free slot in arrival order. This is Gradient2 and AIMD algorithms of Netflix's
+    concurrency-limits library.
+    """
+
+    initial_limit: int = 8
+    min_limit: int = 1
+    max_limit: int = 256
+    tolerance: float = 1.5
+    "Latency that is that many times higher than the average doesn't decrease the limit yet."
+    smoothing: float = 0.2
+    "Share of the new limit estimate that is applied on each sample."
+    backoff_ratio: float = 0.9
+    long_latency_window: int = 600
+    "Number of samples that the average latency is computed over."
+    _backends: dict[str, _BackendLimit] = dataclasses.field(default_factory=dict, init=False, repr=False)
+
+    def _get_backend(self, url: str) -> _BackendLimit:
+        backend = self._backends.get(url)
+        if backend is None:
+            backend = self._backends[url] = _BackendLimit(limit=self.initial_limit)
+        return backend
+
+    def get_limit(self, url: str) -> int:
+        return int(self._get_backend(url).limit)
+
+    def _wake_up_waiters(self, backend: _BackendLimit) -> None:
+        while backend.waiters and backend.in_flight_count < int(backend.limit):
+            waiter = backend.waiters.popleft()
+            if waiter.done():
+                continue
+            backend.in_flight_count += 1
+            waiter.set_result(None)
+
+    async def acquire(self, url: str) -> None:
+        """Wait for a free slot of the backend. Each acquired slot must be released with `release()`."""
+        backend: typing.Final = self._get_backend(url)
+        if backend.in_flight_count < int(backend.limit) and not backend.waiters:
+            backend.in_flight_count += 1
+            return
+
+        waiter: typing.Final = asyncio.get_running_loop().create_future()
+        backend.waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():  # Woken up right before cancellation
+                self.release(url)
+            raise
+
+    def release(self, url: str) -> None:
+        backend: typing.Final = self._get_backend(url)
+        backend.in_flight_count -= 1
+        self._wake_up_waiters(backend)
+
+    def record_latency(self, url: str, latency: float) -> None:
+        backend: typing.Final = self._get_backend(url)
+        if backend.long_latency is None:
+            backend.long_latency = latency
+            return
+        backend.long_latency += (latency - backend.long_latency) * 2 / (self.long_latency_window + 1)
+        if backend.long_latency > latency * 2:
+            # Let the average recover quickly after a period of high latency
+            backend.long_latency *= 0.95
+
+        # Request rate is too low to tell anything about the limit
+        if backend.in_flight_count < backend.limit / 2:
+            return
+
+        gradient: typing.Final = max(0.5, min(1.0, self.tolerance * backend.long_latency / latency))
+        new_limit: typing.Final = backend.limit * gradient + math.sqrt(backend.limit)
+        self._set_limit(backend, backend.limit * (1 - self.smoothing) + new_limit * self.smoothing)
+
+    def record_response(self, url: str, *, status_code: int, latency: float) -> None:
+        if status_code in OVERLOAD_STATUS_CODES:
+            self.record_overload(url)
+        elif status_code < HTTPStatus.INTERNAL_SERVER_ERROR:
+            self.record_latency(url, latency)
+
+    def record_overload(self, url: str) -> None:
+        backend: typing.Final = self._get_backend(url)
+        self._set_limit(backend, backend.limit * self.backoff_ratio)
+
+    def _set_limit(self, backend: _BackendLimit, limit: float) -> None:
+        backend.limit = min(max(limit, self.min_limit), self.max_limit)
+        self._wake_up_waiters(backend)
+
+
+@dataclasses.dataclass(slots=True)
+class ConcurrencyLimitedLLMClient(LLMClient):
+    """Acquires a slot from the limiter for each request. Streaming requests hold the slot until the stream is closed.
+
+    Raises `LLMQueueTimeoutError` when the request waited in queue for longer than `limiter.queue_timeout`.
+    """
+
+    client: LLMClient
+    limiter: ConcurrencyLimiter
+    priority: RequestPriority = RequestPriority.interactive
+
+    @property
+    def _prepare_payload(self) -> typing.Callable[..., dict[str, typing.Any]] | None:
+        return getattr(self.client, "_prepare_payload", None)
+
+    async def request_llm_message(
+        self,
+        messages: str | list[Message],
+        *,
+        temperature: float = LLMConfigValue(attr="temperature"),
+        extra: dict[str, typing.Any] | None = None,
+        timeout: float | None = None,
+    ) -> LLMResponse:
+        started_at: typing.Final = time.monotonic()
+        async with self.limiter.acquire(self.priority):
+            return await self.client.request_llm_message(
+                messages,
+                temperature=temperature,
+                extra=extra,
+                timeout=get_remaining_timeout(timeout, started_at=started_at),
+            )
+
+    @contextlib.asynccontextmanager
+    async def stream_llm_message_chunks(
+        self,
+        messages: str | list[Message],
+        *,
+        temperature: float = LLMConfigValue(attr="temperature"),
+        extra: dict[str, typing.Any] | None = None,
+        timeout: float | None = None,
+    ) -> typing.AsyncIterator[typing.AsyncIterable[LLMResponse]]:
+        started_at: typing.Final = time.monotonic()
+        async with (
+            self.limiter.acquire(self.priority),
+            self.client.stream_llm_message_chunks(
+                messages,
+                temperature=temperature,
+                extra=extra,
+                timeout=get_remaining_timeout(timeout, started_at=started_at),
+            ) as response_chunks,
+        ):
+            yield response_chunks
+
+    async def __aenter__(self) -> typing_extensions.Self:
+        await self.client.__aenter__()
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: types.TracebackType | None,
+    ) -> None:
+        await self.client.__aexit__(exc_type, exc_value, traceback)
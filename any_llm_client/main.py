@@ -3,11 +3,15 @@ import typing
 
 import pydantic
 
+from any_llm_client.circuit_breaker import CircuitBreaker
 from any_llm_client.clients.mock import MockLLMClient, MockLLMConfig
 from any_llm_client.clients.openai import OpenAIClient, OpenAIConfig
 from any_llm_client.clients.yandexgpt import YandexGPTClient, YandexGPTConfig
 from any_llm_client.core import LLMClient
+from any_llm_client.limiter import AdaptiveConcurrencyLimiter
+from any_llm_client.rate_limit import RateLimiter
 from any_llm_client.retry import RequestRetryConfig
+from any_llm_client.transport_pool import SharedTransportPool
 
 
 AnyLLMConfig = typing.Annotated[YandexGPTConfig | OpenAIConfig | MockLLMConfig, pydantic.Discriminator("api_type")]
@@ -15,46 +19,82 @@ AnyLLMConfig = typing.Annotated[YandexGPTConfig | OpenAIConfig | MockLLMConfig,
 
 if typing.TYPE_CHECKING:
 
-    def get_client(
+    def get_client(  # noqa: PLR0913
         config: AnyLLMConfig,
         *,
         request_retry: RequestRetryConfig | None = None,
+        rate_limiter: RateLimiter | None = None,
+        circuit_breaker: CircuitBreaker | None = None,
+        concurrency_limiter: AdaptiveConcurrencyLimiter | None = None,
+        transport_pool: SharedTransportPool | None = None,
         **httpx_kwargs: typing.Any,  # noqa: ANN401
     ) -> LLMClient: ...
 else:
 
     @functools.singledispatch
-    def get_client(
+    def get_client(  # noqa: PLR0913
         config: typing.Any,  # noqa: ANN401, ARG001
         *,
         request_retry: RequestRetryConfig | None = None,  # noqa: ARG001
+        rate_limiter: RateLimiter | None = None,  # noqa: ARG001
+        circuit_breaker: CircuitBreaker | None = None,  # noqa: ARG001
+        concurrency_limiter: AdaptiveConcurrencyLimiter | None = None,  # noqa: ARG001
+        transport_pool: SharedTransportPool | None = None,  # noqa: ARG001
         **httpx_kwargs: typing.Any,  # noqa: ANN401, ARG001
     ) -> LLMClient:
         raise AssertionError("unknown LLM config type")
 
     @get_client.register
-    def _(
+    def _(  # noqa: PLR0913
         config: YandexGPTConfig,
         *,
         request_retry: RequestRetryConfig | None = None,
+        rate_limiter: RateLimiter | None = None,
+        circuit_breaker: CircuitBreaker | None = None,
+        concurrency_limiter: AdaptiveConcurrencyLimiter | None = None,
+        transport_pool: SharedTransportPool | None = None,
         **httpx_kwargs: typing.Any,  # noqa: ANN401
     ) -> LLMClient:
-        return YandexGPTClient(config=config, request_retry=request_retry, **httpx_kwargs)
+        return YandexGPTClient(
+            config=config,
+            request_retry=request_retry,
+            rate_limiter=rate_limiter,
+            circuit_breaker=circuit_breaker,
+            concurrency_limiter=concurrency_limiter,
+            transport_pool=transport_pool,
+            **httpx_kwargs,
+        )
 
     @get_client.register
-    def _(
+    def _(  # noqa: PLR0913
         config: OpenAIConfig,
         *,
         request_retry: RequestRetryConfig | None = None,
+        rate_limiter: RateLimiter | None = None,
+        circuit_breaker: CircuitBreaker | None = None,
+        concurrency_limiter: AdaptiveConcurrencyLimiter | None = None,
+        transport_pool: SharedTransportPool | None = None,
         **httpx_kwargs: typing.Any,  # noqa: ANN401
     ) -> LLMClient:
-        return OpenAIClient(config=config, request_retry=request_retry, **httpx_kwargs)
+        return OpenAIClient(
+            config=config,
+            request_retry=request_retry,
+            rate_limiter=rate_limiter,
+            circuit_breaker=circuit_breaker,
+            concurrency_limiter=concurrency_limiter,
+            transport_pool=transport_pool,
+            **httpx_kwargs,
+        )
 
     @get_client.register
-    def _(
+    def _(  # noqa: PLR0913
         config: MockLLMConfig,
         *,
         request_retry: RequestRetryConfig | None = None,  # noqa: ARG001
+        rate_limiter: RateLimiter | None = None,  # noqa: ARG001
+        circuit_breaker: CircuitBreaker | None = None,  # noqa: ARG001
+        concurrency_limiter: AdaptiveConcurrencyLimiter | None = None,  # noqa: ARG001
+        transport_pool: SharedTransportPool | None = None,  # noqa: ARG001
         **httpx_kwargs: typing.Any,  # noqa: ANN401, ARG001
     ) -> LLMClient:
         return MockLLMClient(config=config)
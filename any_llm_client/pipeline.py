@@ -0,0 +1,99 @@
+import asyncio
+import typing
+
+from any_llm_client.core import LLMClient, LLMConfigValue, LLMResponse, Message
+
+
+ItemT = typing.TypeVar("ItemT")
+_InFlightRequests = dict[asyncio.Task[LLMResponse | Exception], ItemT]
+"Items by their request tasks, in the order the requests were started."
+
+
+async def _iter_as_async(items: typing.Iterable[ItemT]) -> typing.AsyncIterator[ItemT]:
+    for one_item in items:
+        yield one_item
+
+
+async def _request_llm_message_or_error(
+    client: LLMClient,
+    messages: str | list[Message],
+    *,
+    temperature: float,
+    extra: dict[str, typing.Any] | None,
+    timeout: float | None,
+) -> LLMResponse | Exception:
+    try:
+        return await client.request_llm_message(messages, temperature=temperature, extra=extra, timeout=timeout)
+    except Exception as exception:  # noqa: BLE001
+        return exception
+
+
+def _pop_finished_requests(
+    in_flight: _InFlightRequests[ItemT], *, ordered: bool
+) -> list[tuple[ItemT, LLMResponse | Exception]]:
+    finished_tasks: typing.Final = []
+    if ordered:
+        for one_task in in_flight:
+            if not one_task.done():
+                break
+            finished_tasks.append(one_task)
+    else:
+        finished_tasks.extend(one_task for one_task in in_flight if one_task.done())
+    return [(in_flight.pop(one_task), one_task.result()) for one_task in finished_tasks]
+
+
+async def map_llm_messages(  # noqa: PLR0913
+    client: LLMClient,
+    items: typing.AsyncIterable[ItemT] | typing.Iterable[ItemT],
+    *,
+    get_messages: typing.Callable[[ItemT], str | list[Message]] | None = None,
+    temperature: float = LLMConfigValue(attr="temperature"),
+    extra: dict[str, typing.Any] | None = None,
+    max_concurrency: int = 8,
+    ordered: bool = True,
+    timeout: float | None = None,
+) -> typing.AsyncGenerator[tuple[ItemT, LLMResponse | Exception], None]:
+    """Request LLM message for each item of a (possibly unbounded) iterable, and yield items with results.
+
+    Keeps at most `max_concurrency` requests in flight, and takes the next item from the source only when there's
+    a free slot, so that slow requests apply backpressure to the source. Items are passed through `get_messages`, or
+    used as messages as is. A failed request doesn't stop the pipeline, its exception is yielded in place of the
+    response. Results are yielded in the input order, or in completion order with `ordered=False`. `timeout` limits
+    each request.
+
+    When the loop is stopped early, close the generator (for example, with `contextlib.aclosing()`) to cancel
+    requests in flight. Raises `ValueError` when `max_concurrency` is less than one.
+    """
+    if max_concurrency < 1:
+        raise ValueError(f"`max_concurrency` must be at least 1, got {max_concurrency}")
+
+    items_iterator: typing.Final = aiter(items) if isinstance(items, typing.AsyncIterable) else _iter_as_async(items)
+    in_flight: typing.Final[_InFlightRequests[ItemT]] = {}
+    is_source_exhausted = False
+    try:
+        while True:
+            while not is_source_exhausted and len(in_flight) < max_concurrency:
+                try:
+                    one_item = await anext(items_iterator)
+                except StopAsyncIteration:  # noqa: PERF203
+                    is_source_exhausted = True
+                else:
+                    messages = get_messages(one_item) if get_messages else typing.cast("str | list[Message]", one_item)
+                    request_task = asyncio.create_task(
+                        _request_llm_message_or_error(
+                            client, messages, temperature=temperature, extra=extra, timeout=timeout
+                        )
+                    )
+                    in_flight[request_task] = one_item
+            if not in_flight:
+                return
+
+            await asyncio.wait(
+                [next(iter(in_flight))] if ordered else in_flight.keys(), return_when=asyncio.FIRST_COMPLETED
+            )
+            for one_finished_request in _pop_finished_requests(in_flight, ordered=ordered):
+                yield one_finished_request
+    finally:
+        for one_task in in_flight:
+            one_task.cancel()
+        await asyncio.gather(*in_flight, return_exceptions=True)
@@ -0,0 +1,199 @@
+import asyncio
+import dataclasses
+import datetime
+import email.utils
+import re
+import time
+import typing
+from http import HTTPStatus
+
+import httpx
+
+
+CHARACTERS_PER_TOKEN: typing.Final = 4
+TOKENS_PER_IMAGE: typing.Final = 765
+_WAIT_TIME_EPSILON: typing.Final = 1e-6
+_DURATION_PART_PATTERN: typing.Final = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNIT_SECONDS: typing.Final = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_retry_after(response: httpx.Response) -> float | None:
+    """Seconds to wait according to `Retry-After` header, which contains either seconds or HTTP date."""
+    header_value: typing.Final = response.headers.get("Retry-After")
+    if header_value is None:
+        return None
+    try:
+        return max(float(header_value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(header_value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=datetime.timezone.utc)
+    return max((retry_at - datetime.datetime.now(tz=datetime.timezone.utc)).total_seconds(), 0.0)
+
+
+def _parse_rate_limit_reset(header_value: str | None) -> float | None:
+    """Parse `x-ratelimit-reset-*` header value, for example `1s`, `6m0s` or `20ms`."""
+    if not header_value:
+        return None
+    try:
+        return float(header_value)
+    except ValueError:
+        pass
+    duration_parts: typing.Final = _DURATION_PART_PATTERN.findall(header_value)
+    if not duration_parts:
+        return None
+    return sum(float(one_value) * _DURATION_UNIT_SECONDS[one_unit] for one_value, one_unit in duration_parts)
+
+
+def _count_text_characters_and_images(value: object) -> tuple[int, int]:
+    if isinstance(value, str):
+        return len(value), 0
+    if isinstance(value, dict):
+        if "image_url" in value:
+            return 0, 1
+        child_values: typing.Iterable[object] = value.values()
+    elif isinstance(value, list):
+        child_values = value
+    else:
+        return 0, 0
+
+    characters_count = images_count = 0
+    for one_child_value in child_values:
+        child_characters_count, child_images_count = _count_text_characters_and_images(one_child_value)
+        characters_count += child_characters_count
+        images_count += child_images_count
+    return characters_count, images_count
+
+
+def _parse_int_header(header_value: str | None) -> int | None:
+    if header_value is None:
+        return None
+    try:
+        return int(header_value)
+    except ValueError:
+        return None
+
+
+@dataclasses.dataclass(slots=True)
+class _TokenBucket:
+    capacity: float
+    refill_per_second: float
+    tokens: float
+    updated_at: float
+
+    @classmethod
+    def from_per_minute_limit(cls, per_minute_limit: float) -> "_TokenBucket":
+        return cls(
+            capacity=per_minute_limit,
+            refill_per_second=per_minute_limit / 60,
+            tokens=per_minute_limit,
+            updated_at=time.monotonic(),
+        )
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.refill_per_second)
+        self.updated_at = now
+
+    def get_wait_time(self, amount: float) -> float:
+        return max(min(amount, self.capacity) - self.tokens, 0) / self.refill_per_second
+
+
+@dataclasses.dataclass(kw_only=True, slots=True)
+class RateLimiter:
+    """Client-side token bucket rate limiter for requests-per-minute and tokens-per-minute quotas.
+
+    Waits before each request attempt until both quotas allow it. Tokens are estimated from the request text, number
+    of images and maximum number of output tokens, and corrected with actual usage when the response reports it.
+    Synchronizes with `Retry-After` and `x-ratelimit-*` headers of API responses.
+    One limiter can be shared by several clients that use the same quota.
+    """
+
+    requests_per_minute: float | None = None
+    tokens_per_minute: float | None = None
+    _requests_bucket: _TokenBucket | None = dataclasses.field(default=None, init=False, repr=False)
+    _tokens_bucket: _TokenBucket | None = dataclasses.field(default=None, init=False, repr=False)
+    _blocked_until: float = dataclasses.field(default=0.0, init=False, repr=False)
+    _lock: asyncio.Lock = dataclasses.field(default_factory=asyncio.Lock, init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        if self.requests_per_minute is not None:
+            self._requests_bucket = _TokenBucket.from_per_minute_limit(self.requests_per_minute)
+        if self.tokens_per_minute is not None:
+            self._tokens_bucket = _TokenBucket.from_per_minute_limit(self.tokens_per_minute)
+
+    def estimate_tokens(self, payload: dict[str, typing.Any], *, max_output_tokens: int | None) -> int:
+        if self._tokens_bucket is None:
+            return 0
+        characters_count, images_count = _count_text_characters_and_images(payload.get("messages"))
+        return characters_count // CHARACTERS_PER_TOKEN + images_count * TOKENS_PER_IMAGE + (max_output_tokens or 0)
+
+    def record_usage(self, *, estimated_tokens: int, used_tokens: int | None) -> None:
+        """Return to the quota tokens that were estimated, but not used by the request."""
+        if self._tokens_bucket is None or used_tokens is None:
+            return
+        self._tokens_bucket.refill(time.monotonic())
+        self._tokens_bucket.tokens = min(
+            self._tokens_bucket.capacity,
+            self._tokens_bucket.tokens + min(estimated_tokens, self._tokens_bucket.capacity) - used_tokens,
+        )
+
+    def _get_wait_time(self, estimated_tokens: int, now: float) -> float:
+        wait_time = self._blocked_until - now
+        if self._requests_bucket is not None:
+            self._requests_bucket.refill(now)
+            wait_time = max(wait_time, self._requests_bucket.get_wait_time(1))
+        if self._tokens_bucket is not None:
+            self._tokens_bucket.refill(now)
+            wait_time = max(wait_time, self._tokens_bucket.get_wait_time(estimated_tokens))
+        return wait_time
+
+    async def acquire(self, estimated_tokens: int = 0) -> None:
+        async with self._lock:
+            while True:
+                wait_time = self._get_wait_time(estimated_tokens, time.monotonic())
+                if wait_time <= _WAIT_TIME_EPSILON:
+                    break
+                await asyncio.sleep(wait_time)
+            if self._requests_bucket is not None:
+                self._requests_bucket.tokens -= 1
+            if self._tokens_bucket is not None:
+                self._tokens_bucket.tokens -= min(estimated_tokens, self._tokens_bucket.capacity)
+
+    def _block_for(self, seconds: float) -> None:
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+    def _sync_bucket(self, bucket: _TokenBucket | None, *, remaining: int | None, reset_after: float | None) -> None:
+        if remaining is None:
+            return
+        if bucket is not None:
+            bucket.refill(time.monotonic())
+            bucket.tokens = min(bucket.tokens, remaining)
+        if remaining <= 0 and reset_after is not None:
+            self._block_for(reset_after)
+
+    def observe_response(self, response: httpx.Response) -> None:
+        headers: typing.Final = response.headers
+        self._sync_bucket(
+            self._requests_bucket,
+            remaining=_parse_int_header(headers.get("x-ratelimit-remaining-requests")),
+            reset_after=_parse_rate_limit_reset(headers.get("x-ratelimit-reset-requests")),
+        )
+        self._sync_bucket(
+            self._tokens_bucket,
+            remaining=_parse_int_header(headers.get("x-ratelimit-remaining-tokens")),
+            reset_after=_parse_rate_limit_reset(headers.get("x-ratelimit-reset-tokens")),
+        )
+        if response.status_code == HTTPStatus.TOO_MANY_REQUESTS:
+            retry_after: typing.Final = parse_retry_after(response)
+            if retry_after is not None:
+                self._block_for(retry_after)
+            elif self._blocked_until <= time.monotonic():
+                self._block_for(
+                    _parse_rate_limit_reset(headers.get("x-ratelimit-reset-requests"))
+                    or _parse_rate_limit_reset(headers.get("x-ratelimit-reset-tokens"))
+                    or 1.0
+                )
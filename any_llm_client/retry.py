@@ -1,10 +1,71 @@
 import dataclasses
 import datetime
+import typing
+from http import HTTPStatus
+
+import httpx
+
+from any_llm_client.core import LLMStreamTimeoutError
+from any_llm_client.rate_limit import parse_retry_after
+
+
+DEFAULT_RETRY_STATUS_CODES: typing.Final = frozenset(
+    {
+        HTTPStatus.REQUEST_TIMEOUT,
+        HTTPStatus.CONFLICT,
+        HTTPStatus.TOO_EARLY,
+        HTTPStatus.TOO_MANY_REQUESTS,
+    }
+)
+
+
+@dataclasses.dataclass(slots=True)
+class RetryBudgetStats:
+    requests_count: int = 0
+    retries_count: int = 0
+    rejected_retries_count: int = 0
+
+
+@dataclasses.dataclass(kw_only=True, slots=True)
+class RetryBudget:
+    """Limits retries across all requests to a share of recent requests.
+
+    Prevents retry storms, when retries multiply load on an already overloaded server. Works as a token bucket: each
+    request adds `retry_ratio` tokens up to `max_balance`, and each retry takes one. Retries are rejected when less
+    than one token is left, and the last error is raised immediately.
+    """
+
+    retry_ratio: float = 0.1
+    "Number of retries earned by each request."
+    max_balance: float = 10.0
+    "Maximum number of retries that can be made in a burst, also the initial balance."
+    balance: float = dataclasses.field(init=False)
+    stats: RetryBudgetStats = dataclasses.field(default_factory=RetryBudgetStats)
+
+    def __post_init__(self) -> None:
+        self.balance = self.max_balance
+
+    def allows_retry(self) -> bool:
+        if self.balance < 1:
+            self.stats.rejected_retries_count += 1
+            return False
+        return True
+
+    def record_attempt(self, *, is_retry: bool) -> None:
+        if is_retry:
+            self.stats.retries_count += 1
+            self.balance -= 1
+        else:
+            self.stats.requests_count += 1
+            self.balance = min(self.max_balance, self.balance + self.retry_ratio)
 
 
 @dataclasses.dataclass(frozen=True, kw_only=True, slots=True)
 class RequestRetryConfig:
-    """Request retry configuration that is passed to `stamina.retry`. Applies to httpx.HTTPError.
+    """Request retry configuration that is passed to `stamina.retry`.
+
+    Retries transport errors (connection errors, timeouts), server errors and a few transient client errors. Other
+    client errors, for example, 400 on too long prompt, can't succeed on retry and are raised immediately.
 
     Uses defaults from `stamina.retry` except for attempts: by default 3 instead of 10.
     See more at https://stamina.hynek.me/en/stable/api.html#stamina.retry
@@ -22,3 +83,45 @@ class RequestRetryConfig:
     "Maximum *jitter* that is added to retry back-off delays (the actual jitter added is a random number between 0 and *wait_jitter*)"  # noqa: E501
     wait_exp_base: float = 2.0
     "The exponential base used to compute the retry backoff."
+    retry_status_codes: frozenset[int] = DEFAULT_RETRY_STATUS_CODES
+    "Client error HTTP statuses that are retried."
+    retry_server_errors: bool = True
+    "Whether to retry server error (5xx) HTTP statuses."
+    respect_retry_after: bool = True
+    "Wait for the time from `Retry-After` response header instead of the exponential backoff."
+    max_retry_after: float | datetime.timedelta = 60.0
+    "Requests are not retried when `Retry-After` asks to wait longer than that."
+    retry_if: typing.Callable[[Exception], bool] | None = None
+    "Custom predicate that decides whether the exception is retried. Replaces the status rules above when passed."
+    budget: RetryBudget | None = None
+    "Retry budget shared by all requests that use this config."
+
+    def is_retryable(self, exception: Exception) -> bool:
+        if self.retry_if is not None:
+            return self.retry_if(exception)
+        if isinstance(exception, httpx.HTTPStatusError):
+            status_code: typing.Final = exception.response.status_code
+            return status_code in self.retry_status_codes or (
+                self.retry_server_errors and status_code >= HTTPStatus.INTERNAL_SERVER_ERROR
+            )
+        return isinstance(exception, (httpx.TransportError, LLMStreamTimeoutError))
+
+    def get_backoff(self, exception: Exception) -> bool | float:
+        """Backoff hook for `stamina.retry`: whether to retry, or how many seconds to wait before retry."""
+        if not self.is_retryable(exception):
+            return False
+        retry_after: typing.Final = (
+            parse_retry_after(exception.response)
+            if self.respect_retry_after and isinstance(exception, httpx.HTTPStatusError)
+            else None
+        )
+        max_retry_after: typing.Final = (
+            self.max_retry_after.total_seconds()
+            if isinstance(self.max_retry_after, datetime.timedelta)
+            else self.max_retry_after
+        )
+        if retry_after is not None and retry_after > max_retry_after:
+            return False
+        if self.budget is not None and not self.budget.allows_retry():
+            return False
+        return True if retry_after is None else retry_after
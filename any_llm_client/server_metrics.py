@@ -0,0 +1,88 @@
+import asyncio
+import contextlib
+import dataclasses
+import time
+import typing
+
+import httpx
+
+
+if typing.TYPE_CHECKING:
+    from any_llm_client.balancer import LoadBalancer, Replica
+
+
+WAITING_REQUESTS_METRIC_NAMES: typing.Final = frozenset({"vllm:num_requests_waiting"})
+KV_CACHE_USAGE_METRIC_NAMES: typing.Final = frozenset({"vllm:gpu_cache_usage_perc", "vllm:kv_cache_usage_perc"})
+
+
+@dataclasses.dataclass(frozen=True, kw_only=True, slots=True)
+class ServerMetrics:
+    waiting_requests_count: float
+    kv_cache_usage: float
+    "Share of KV cache that is in use, from 0 to 1."
+    scraped_at: float
+
+
+def get_metrics_url(url: str) -> str:
+    """Return URL of Prometheus metrics endpoint of the server, which vLLM exposes at `/metrics`."""
+    return str(httpx.URL(url).copy_with(path="/metrics", query=None, fragment=None))
+
+
+def _parse_sample(line: str) -> tuple[str, float] | None:
+    """Return name and value of the sample, or None when the line is malformed."""
+    try:
+        if "{" in line:
+            name = line[: line.index("{")]
+            value_part = line[line.rindex("}") + 1 :]
+        else:
+            name, value_part = line.split(maxsplit=1)
+        return name, float(value_part.split()[0])
+    except (ValueError, IndexError):
+        return None
+
+
+def parse_server_metrics(text: str, *, scraped_at: float) -> ServerMetrics | None:
+    """Parse vLLM metrics in Prometheus text format. Values are summed across models, KV cache usage is maxed.
+
+    Malformed lines are skipped.
+    """
+    waiting_requests_count: float | None = None
+    kv_cache_usage = 0.0
+    for one_line in text.splitlines():
+        if not one_line or one_line.startswith("#"):
+            continue
+        # One malformed line doesn't spoil metrics of the server
+        if (sample := _parse_sample(one_line)) is None:
+            continue
+        name, value = sample
+        if name in WAITING_REQUESTS_METRIC_NAMES:
+            waiting_requests_count = (waiting_requests_count or 0.0) + value
+        elif name in KV_CACHE_USAGE_METRIC_NAMES:
+            kv_cache_usage = max(kv_cache_usage, value)
+    if waiting_requests_count is None:
+        return None
+    return ServerMetrics(
+        waiting_requests_count=waiting_requests_count, kv_cache_usage=kv_cache_usage, scraped_at=scraped_at
+    )
+
+
+async def _scrape_replica(httpx_client: httpx.AsyncClient, replica: "Replica", *, timeout: float) -> None:
+    with contextlib.suppress(httpx.HTTPError, ValueError):
+        response: typing.Final = await httpx_client.get(get_metrics_url(replica.url), timeout=timeout)
+        response.raise_for_status()
+        replica.server_metrics = parse_server_metrics(response.text, scraped_at=time.monotonic())
+
+
+async def scrape_server_metrics_periodically(
+    httpx_client: httpx.AsyncClient, load_balancer: "LoadBalancer", *, interval: float
+) -> None:
+    """Scrape metrics of all replicas every `interval` seconds, until cancelled.
+
+    Runs in background: requests are routed by the last scraped metrics and never wait for scraping. Metrics that
+    failed to scrape become stale and are ignored by the load balancer.
+    """
+    while True:
+        await asyncio.gather(
+            *(_scrape_replica(httpx_client, one_replica, timeout=interval) for one_replica in load_balancer.replicas)
+        )
+        await asyncio.sleep(interval)
@@ -0,0 +1,19 @@
+import typing
+
+from any_llm_client.http import iter_byte_lines
+
+
+async def iter_sse_data(byte_chunks: typing.AsyncIterable[bytes]) -> typing.AsyncIterator[bytes]:
+    """Parse `data` of server-sent events right from response bytes, without decoding them to text.
+
+    Lines of an event's `data` fields are joined with line feeds. Other fields and comments are skipped, and an
+    incomplete event at the end of the stream is dropped, as the SSE specification says.
+    """
+    data_lines: list[bytes] = []
+    async for one_line in iter_byte_lines(byte_chunks):
+        if not one_line:
+            if data_lines:
+                yield data_lines[0] if len(data_lines) == 1 else b"\n".join(data_lines)
+                data_lines = []
+        elif one_line.startswith(b"data:"):
+            data_lines.append(one_line[6:] if one_line.startswith(b"data: ") else one_line[5:])
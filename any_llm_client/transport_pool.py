@@ -0,0 +1,79 @@
+import asyncio
+import dataclasses
+import typing
+
+import httpx
+
+
+_TransportKey = tuple[asyncio.AbstractEventLoop, str]
+
+
+def get_origin(url: str) -> str:
+    parsed_url: typing.Final = httpx.URL(url)
+    return f"{parsed_url.scheme}://{parsed_url.netloc.decode('ascii')}"
+
+
+@dataclasses.dataclass(kw_only=True, slots=True)
+class _SharedTransport:
+    transport: httpx.AsyncBaseTransport
+    references_count: int = 0
+
+
+@dataclasses.dataclass(kw_only=True, slots=True)
+class SharedTransportPool:
+    """Shares connections to the same origin between clients, instead of opening a connection pool for each client.
+
+    One transport is created for each origin (scheme, host and port) and event loop on first request, and is closed
+    when the last client that used it is closed. Create one pool per process and pass it to all clients.
+    """
+
+    limits: httpx.Limits = dataclasses.field(
+        default_factory=lambda: httpx.Limits(max_connections=100, max_keepalive_connections=20)
+    )
+    "Limits of each origin's transport."
+    http2: bool = False
+    "Multiplex requests over HTTP/2 connections, requires `httpx[http2]`."
+    _transports: dict[_TransportKey, _SharedTransport] = dataclasses.field(default_factory=dict, init=False, repr=False)
+
+    def _acquire(self, origin: str) -> tuple[_TransportKey, httpx.AsyncBaseTransport]:
+        key: typing.Final = (asyncio.get_running_loop(), origin)
+        shared_transport = self._transports.get(key)
+        if shared_transport is None:
+            shared_transport = self._transports[key] = _SharedTransport(
+                transport=httpx.AsyncHTTPTransport(limits=self.limits, http2=self.http2)
+            )
+        shared_transport.references_count += 1
+        return key, shared_transport.transport
+
+    async def _release(self, key: _TransportKey) -> None:
+        shared_transport: typing.Final = self._transports[key]
+        shared_transport.references_count -= 1
+        if not shared_transport.references_count:
+            del self._transports[key]
+            await shared_transport.transport.aclose()
+
+    def make_mounts(self, urls: typing.Iterable[str]) -> dict[str, httpx.AsyncBaseTransport]:
+        """Transports for `mounts` argument of `httpx.AsyncClient`, that route requests to `urls` to shared ones."""
+        return {
+            origin: _BorrowedTransport(pool=self, origin=origin) for origin in {get_origin(one_url) for one_url in urls}
+        }
+
+
+@dataclasses.dataclass(kw_only=True, slots=True)
+class _BorrowedTransport(httpx.AsyncBaseTransport):
+    pool: SharedTransportPool
+    origin: str
+    _key: _TransportKey | None = None
+    _transport: httpx.AsyncBaseTransport | None = None
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        # Event loop is only known when the first request is sent
+        if self._transport is None:
+            self._key, self._transport = self.pool._acquire(self.origin)  # noqa: SLF001
+        return await self._transport.handle_async_request(request)
+
+    async def aclose(self) -> None:
+        if self._key is not None:
+            key: typing.Final = self._key
+            self._key = self._transport = None
+            await self.pool._release(key)  # noqa: SLF001
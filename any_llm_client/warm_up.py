@@ -0,0 +1,83 @@
+import asyncio
+import contextlib
+import dataclasses
+import enum
+import typing
+
+import httpx
+
+
+WARM_UP_TIMEOUT: typing.Final = httpx.Timeout(10.0)
+
+
+class WarmUpState(str, enum.Enum):
+    disabled = "disabled"
+    cold = "cold"
+    warming_up = "warming_up"
+    warm = "warm"
+    failed = "failed"
+
+
+@dataclasses.dataclass(kw_only=True, slots=True)
+class ConnectionsWarmUp:
+    """Opens connections to replicas before the first request, so that it doesn't wait for DNS, TCP and TLS.
+
+    Each of `connections_count` connections is opened with a concurrent `HEAD` request to the replica URL, response
+    status doesn't matter. With `keep_alive_interval`, the requests are repeated, so that idle connections are not
+    closed: the interval has to be shorter than `keepalive_expiry` of HTTPX limits (5 seconds by default) and idle
+    timeout of the server. State becomes `warm` when all requests succeed and `failed` otherwise, and is updated on
+    each round.
+    """
+
+    connections_count: int
+    keep_alive_interval: float = 0.0
+    state: WarmUpState = dataclasses.field(init=False)
+    _done_event: asyncio.Event = dataclasses.field(default_factory=asyncio.Event, init=False, repr=False)
+    _task: asyncio.Task[None] | None = dataclasses.field(default=None, init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        self.state = WarmUpState.cold if self.connections_count else WarmUpState.disabled
+
+    def start(self, httpx_client: httpx.AsyncClient, urls: typing.Sequence[str]) -> None:
+        if not self.connections_count:
+            return
+        self.state = WarmUpState.warming_up
+        self._done_event.clear()
+        self._task = asyncio.create_task(self._warm_up_periodically(httpx_client, urls))
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+            self.state = WarmUpState.cold
+
+    async def wait(self) -> WarmUpState:
+        """Wait until the first round of warm-up is done, for example, in a readiness probe.
+
+        Returns right away when warm-up was not started, since the client is not entered or warm-up is disabled.
+        """
+        if self._task is not None:
+            await self._done_event.wait()
+        return self.state
+
+    async def _warm_up_periodically(self, httpx_client: httpx.AsyncClient, urls: typing.Sequence[str]) -> None:
+        while True:
+            results = await asyncio.gather(
+                *(
+                    httpx_client.head(one_url, timeout=WARM_UP_TIMEOUT)
+                    for one_url in urls
+                    for _ in range(self.connections_count)
+                ),
+                return_exceptions=True,
+            )
+            self.state = (
+                WarmUpState.failed
+                if any(isinstance(one_result, Exception) for one_result in results)
+                else WarmUpState.warm
+            )
+            self._done_event.set()
+            if not self.keep_alive_interval:
+                return
+            await asyncio.sleep(self.keep_alive_interval)
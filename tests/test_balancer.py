@@ -0,0 +1,291 @@
+import asyncio
+import contextlib
+import json
+import typing
+
+import httpx
+import pytest
+import stamina
+from polyfactory.factories.pydantic_factory import ModelFactory
+
+import any_llm_client
+from any_llm_client.balancer import LoadBalancer, Replica
+from any_llm_client.clients.openai import (
+    ChatCompletionsNotStreamingResponse,
+    OneNotStreamingChoice,
+    OneNotStreamingChoiceMessage,
+)
+from tests.conftest import consume_llm_message_chunks
+
+
+class OpenAIConfigFactory(ModelFactory[any_llm_client.OpenAIConfig]): ...
+
+
+REPLICA_URLS: typing.Final = [f"http://replica-{one_index}/v1/chat/completions" for one_index in range(3)]
+
+
+def make_response() -> httpx.Response:
+    return httpx.Response(
+        200,
+        json=ChatCompletionsNotStreamingResponse(
+            choices=[
+                OneNotStreamingChoice(
+                    message=OneNotStreamingChoiceMessage(role=any_llm_client.MessageRole.assistant, content="Hi!")
+                )
+            ],
+        ).model_dump(mode="json"),
+    )
+
+
+class ReplicasTransport(httpx.AsyncBaseTransport):
+    def __init__(self, *, failing_hosts: set[str] | None = None) -> None:
+        self.failing_hosts = failing_hosts or set()
+        self.requested_hosts: list[str] = []
+        self.unblock_event = asyncio.Event()
+        self.unblock_event.set()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.requested_hosts.append(request.url.host)
+        await self.unblock_event.wait()
+        if request.url.host in self.failing_hosts:
+            return httpx.Response(503)
+        if json.loads(request.content)["stream"]:
+            return httpx.Response(200, headers={"Content-Type": "text/event-stream"}, content=b"data: [DONE]\n\n")
+        return make_response()
+
+
+def make_client(url: typing.Any, transport: httpx.AsyncBaseTransport) -> any_llm_client.OpenAIClient:  # noqa: ANN401
+    return any_llm_client.OpenAIClient(
+        OpenAIConfigFactory.build(url=url, server_metrics_scrape_interval=0, prefix_affinity_messages_count=0),
+        transport=transport,
+    )
+
+
+def test_config_accepts_replicas() -> None:
+    client: typing.Final = make_client(
+        [REPLICA_URLS[0], {"url": REPLICA_URLS[1], "weight": 2}], transport=ReplicasTransport()
+    )
+
+    assert client.load_balancer.replicas == [
+        Replica(url=REPLICA_URLS[0], weight=1.0),
+        Replica(url=REPLICA_URLS[1], weight=2.0),
+    ]
+
+
+def test_idle_replicas_are_chosen_in_turn() -> None:
+    load_balancer: typing.Final = LoadBalancer(replicas=[Replica(url=one_url) for one_url in REPLICA_URLS])
+    chosen_urls: typing.Final = []
+    for _ in range(6):
+        with load_balancer.choose_replica() as replica:
+            chosen_urls.append(replica.url)
+
+    assert chosen_urls == REPLICA_URLS * 2
+
+
+def test_replica_with_fewest_in_flight_requests_is_chosen() -> None:
+    load_balancer: typing.Final = LoadBalancer(
+        replicas=[Replica(url=REPLICA_URLS[0], weight=3), Replica(url=REPLICA_URLS[1])]
+    )
+    with contextlib.ExitStack() as exit_stack:
+        chosen_urls: typing.Final = [exit_stack.enter_context(load_balancer.choose_replica()).url for _ in range(8)]
+
+    assert chosen_urls.count(REPLICA_URLS[0]) == 6  # noqa: PLR2004
+    assert chosen_urls.count(REPLICA_URLS[1]) == 2  # noqa: PLR2004
+    assert [one_replica.in_flight_count for one_replica in load_balancer.replicas] == [0, 0]
+
+
+def test_failing_replica_is_ejected_and_readmitted(monkeypatch: pytest.MonkeyPatch) -> None:
+    now = 100.0
+    monkeypatch.setattr("any_llm_client.balancer.time.monotonic", lambda: now)
+    load_balancer: typing.Final = LoadBalancer(
+        replicas=[Replica(url=REPLICA_URLS[0]), Replica(url=REPLICA_URLS[1])],
+        max_consecutive_failures=2,
+        base_ejection_time=10,
+        max_ejection_time=15,
+    )
+    failing_replica: typing.Final = load_balancer.replicas[0]
+
+    load_balancer.record_failure(failing_replica)
+    load_balancer.record_success(failing_replica)
+    load_balancer.record_failure(failing_replica)
+    assert failing_replica.is_available(now)
+
+    load_balancer.record_failure(failing_replica)
+    assert failing_replica.ejected_until == 110  # noqa: PLR2004
+    for _ in range(3):
+        with load_balancer.choose_replica() as replica:
+            assert replica.url == REPLICA_URLS[1]
+
+    now = 110.0
+    load_balancer.record_failure(failing_replica)
+    assert failing_replica.ejected_until == 125  # noqa: PLR2004
+
+    now = 125.0
+    load_balancer.record_success(failing_replica)
+    load_balancer.record_failure(failing_replica)
+    assert failing_replica.is_available(now)
+
+
+def test_replica_that_is_readmitted_first_is_chosen_when_all_are_ejected() -> None:
+    load_balancer: typing.Final = LoadBalancer(
+        replicas=[Replica(url=REPLICA_URLS[0], ejected_until=1e10), Replica(url=REPLICA_URLS[1], ejected_until=1e9)]
+    )
+
+    with load_balancer.choose_replica() as replica:
+        assert replica.url == REPLICA_URLS[1]
+
+
+async def test_concurrent_requests_are_spread_across_replicas() -> None:
+    transport: typing.Final = ReplicasTransport()
+    transport.unblock_event.clear()
+    client: typing.Final = make_client(REPLICA_URLS, transport=transport)
+
+    requests_task: typing.Final = asyncio.gather(*(client.request_llm_message("Hi") for _ in range(6)))
+    await asyncio.sleep(0)
+    assert [one_replica.in_flight_count for one_replica in client.load_balancer.replicas] == [2, 2, 2]
+    transport.unblock_event.set()
+    await requests_task
+
+    assert [one_replica.in_flight_count for one_replica in client.load_balancer.replicas] == [0, 0, 0]
+
+
+async def test_streaming_request_is_in_flight_until_closed() -> None:
+    transport: typing.Final = ReplicasTransport()
+    client: typing.Final = make_client(REPLICA_URLS[:1], transport=transport)
+
+    async with client.stream_llm_message_chunks("Hi"):
+        assert client.load_balancer.replicas[0].in_flight_count == 1
+    assert client.load_balancer.replicas[0].in_flight_count == 0
+
+
+@pytest.mark.parametrize("stream", [True, False])
+async def test_retries_avoid_ejected_replica(stream: bool) -> None:
+    transport: typing.Final = ReplicasTransport(failing_hosts={"replica-0"})
+    client: typing.Final = make_client(REPLICA_URLS[:2], transport=transport)
+    client.load_balancer.max_consecutive_failures = 1
+
+    stamina.set_active(True)
+    try:
+        with stamina.set_testing(True, attempts=3):
+            for _ in range(3):
+                if stream:
+                    await consume_llm_message_chunks(client.stream_llm_message_chunks("Hi"))
+                else:
+                    await client.request_llm_message("Hi")
+    finally:
+        stamina.set_active(False)
+
+    assert transport.requested_hosts == ["replica-0", "replica-1", "replica-1", "replica-1"]
+
+
+async def test_transport_error_is_recorded_as_failure() -> None:
+    def fail_request(request: httpx.Request) -> httpx.Response:
+        raise httpx.ConnectError("", request=request)
+
+    client: typing.Final = make_client(REPLICA_URLS[0], transport=httpx.MockTransport(fail_request))
+
+    with pytest.raises(httpx.ConnectError):
+        await client.request_llm_message("Hi")
+    assert client.load_balancer.replicas[0].consecutive_failures_count == 1
+
+
+def choose_replica_url(load_balancer: LoadBalancer, affinity_key: bytes) -> str:
+    with load_balancer.choose_replica(affinity_key) as replica:
+        return replica.url
+
+
+def test_requests_with_same_affinity_key_go_to_same_replica() -> None:
+    load_balancer: typing.Final = LoadBalancer(replicas=[Replica(url=one_url) for one_url in REPLICA_URLS])
+    affinity_keys: typing.Final = [str(one_index).encode() for one_index in range(30)]
+
+    chosen_urls: typing.Final = [choose_replica_url(load_balancer, one_key) for one_key in affinity_keys]
+
+    assert [choose_replica_url(load_balancer, one_key) for one_key in affinity_keys] == chosen_urls
+    assert set(chosen_urls) == set(REPLICA_URLS)
+
+    load_balancer.replicas[0].ejected_until = 1e10
+    for one_key, one_url in zip(affinity_keys, chosen_urls, strict=True):
+        new_url = choose_replica_url(load_balancer, one_key)
+        assert new_url != REPLICA_URLS[0]
+        if one_url != REPLICA_URLS[0]:
+            assert new_url == one_url
+
+
+def test_overloaded_affine_replica_is_skipped() -> None:
+    load_balancer: typing.Final = LoadBalancer(replicas=[Replica(url=one_url) for one_url in REPLICA_URLS])
+    affine_url: typing.Final = choose_replica_url(load_balancer, b"prefix")
+
+    with contextlib.ExitStack() as exit_stack:
+        chosen_urls: typing.Final = [
+            exit_stack.enter_context(load_balancer.choose_replica(b"prefix")).url for _ in range(4)
+        ]
+
+    # Load of 2nd request on the affine replica would be 2 with average 4/3 and max load 5/3
+    assert chosen_urls[0] == affine_url
+    assert chosen_urls[1] != affine_url
+    assert choose_replica_url(load_balancer, b"prefix") == affine_url
+
+
+def test_least_loaded_replica_is_chosen_when_all_are_above_max_load() -> None:
+    load_balancer: typing.Final = LoadBalancer(
+        replicas=[Replica(url=REPLICA_URLS[0], in_flight_count=3), Replica(url=REPLICA_URLS[1], in_flight_count=1)],
+        max_affinity_load_factor=0.5,
+    )
+
+    assert choose_replica_url(load_balancer, b"prefix") == REPLICA_URLS[1]
+
+
+async def test_client_routes_requests_with_same_prefix_to_same_replica() -> None:
+    transport: typing.Final = ReplicasTransport()
+    client: typing.Final = any_llm_client.OpenAIClient(
+        OpenAIConfigFactory.build(
+            url=REPLICA_URLS,
+            server_metrics_scrape_interval=0,
+            prefix_affinity_messages_count=1,
+            force_user_assistant_message_alternation=False,
+        ),
+        transport=transport,
+    )
+
+    for one_index in range(10):
+        await client.request_llm_message(
+            [any_llm_client.SystemMessage("Long system prompt"), any_llm_client.UserMessage(str(one_index))]
+        )
+        async with client.stream_llm_message_chunks(
+            [any_llm_client.SystemMessage("Long system prompt"), any_llm_client.UserMessage(str(one_index))]
+        ):
+            pass
+
+    assert len(set(transport.requested_hosts)) == 1
+
+
+@pytest.mark.parametrize("prefix_affinity_messages_count", [0, 1, 3])
+async def test_body_with_prefix_affinity_is_the_same(prefix_affinity_messages_count: int) -> None:
+    sent_contents: typing.Final[list[bytes]] = []
+
+    def handle_request(request: httpx.Request) -> httpx.Response:
+        sent_contents.append(request.content)
+        return make_response()
+
+    client: typing.Final = any_llm_client.OpenAIClient(
+        OpenAIConfigFactory.build(
+            url=REPLICA_URLS[0],
+            server_metrics_scrape_interval=0,
+            prefix_affinity_messages_count=prefix_affinity_messages_count,
+            force_user_assistant_message_alternation=False,
+            request_extra={"max_tokens": 10},
+        ),
+        transport=httpx.MockTransport(handle_request),
+    )
+    messages: typing.Final = [
+        any_llm_client.SystemMessage("Long system prompt"),
+        any_llm_client.UserMessage(
+            [any_llm_client.TextContentItem("Hi"), any_llm_client.ImageContentItem("https://example.com/image.jpg")]
+        ),
+    ]
+
+    await client.request_llm_message(messages, temperature=0, extra={"top_p": 0.5})
+
+    assert json.loads(sent_contents[0]) == client._prepare_payload(  # noqa: SLF001
+        messages=messages, temperature=0, stream=False, extra={"top_p": 0.5}
+    )
@@ -0,0 +1,184 @@
+import asyncio
+import json
+import pathlib
+import signal
+import typing
+
+import httpx
+import pytest
+from polyfactory.factories.pydantic_factory import ModelFactory
+
+import any_llm_client
+from any_llm_client.batch import BatchStats, _run_until_terminated, main, run_batch
+from any_llm_client.clients.openai import (
+    ChatCompletionsNotStreamingResponse,
+    OneNotStreamingChoice,
+    OneNotStreamingChoiceMessage,
+)
+
+
+class OpenAIConfigFactory(ModelFactory[any_llm_client.OpenAIConfig]): ...
+
+
+def make_echo_client(requested_prompts: list[str]) -> any_llm_client.LLMClient:
+    def handle_request(request: httpx.Request) -> httpx.Response:
+        prompt: typing.Final = json.loads(request.content)["messages"][-1]["content"]
+        requested_prompts.append(prompt)
+        if prompt == "fail":
+            return httpx.Response(400)
+        return httpx.Response(
+            200,
+            json=ChatCompletionsNotStreamingResponse(
+                choices=[
+                    OneNotStreamingChoice(
+                        message=OneNotStreamingChoiceMessage(
+                            role=any_llm_client.MessageRole.assistant, content=prompt.upper()
+                        )
+                    ),
+                ],
+            ).model_dump(mode="json"),
+        )
+
+    return any_llm_client.OpenAIClient(OpenAIConfigFactory.build(), transport=httpx.MockTransport(handle_request))
+
+
+def write_jsonl(path: pathlib.Path, rows: list[dict[str, typing.Any]]) -> None:
+    path.write_text("".join(json.dumps(one_row) + "\n" for one_row in rows))
+
+
+def read_jsonl(path: pathlib.Path) -> list[dict[str, typing.Any]]:
+    return [json.loads(one_line) for one_line in path.read_text().splitlines()]
+
+
+async def test_run_batch_writes_responses_and_resumes(tmp_path: pathlib.Path) -> None:
+    input_path: typing.Final = tmp_path / "input.jsonl"
+    output_path: typing.Final = tmp_path / "output.jsonl"
+    write_jsonl(
+        input_path,
+        [
+            {"id": "a", "prompt": "one"},
+            {"messages": [{"role": "user", "content": "two"}]},
+            {"prompt": "fail"},
+            {"prompt": "four"},
+        ],
+    )
+    requested_prompts: typing.Final[list[str]] = []
+
+    first_stats: typing.Final = await run_batch(make_echo_client(requested_prompts), input_path, output_path)
+
+    assert first_stats == BatchStats(completed_count=3, skipped_count=0, failed_count=1)
+    assert sorted(read_jsonl(output_path), key=lambda one_row: one_row["line"]) == [
+        {"line": 1, "id": "a", "content": "ONE", "reasoning_content": None},
+        {"line": 2, "id": None, "content": "TWO", "reasoning_content": None},
+        {"line": 4, "id": None, "content": "FOUR", "reasoning_content": None},
+    ]
+
+    requested_prompts.clear()
+    second_stats: typing.Final = await run_batch(make_echo_client(requested_prompts), input_path, output_path)
+
+    assert second_stats == BatchStats(completed_count=0, skipped_count=3, failed_count=1)
+    assert requested_prompts == ["fail"]
+
+
+async def test_run_batch_truncates_torn_output_line(tmp_path: pathlib.Path) -> None:
+    input_path: typing.Final = tmp_path / "input.jsonl"
+    output_path: typing.Final = tmp_path / "output.jsonl"
+    write_jsonl(input_path, [{"prompt": "one"}, {"prompt": "two"}])
+    output_path.write_text('{"line": 1, "content": "ONE"}\n{"line": 2, "cont')
+    requested_prompts: typing.Final[list[str]] = []
+
+    stats: typing.Final = await run_batch(make_echo_client(requested_prompts), input_path, output_path)
+
+    assert stats == BatchStats(completed_count=1, skipped_count=1, failed_count=0)
+    assert requested_prompts == ["two"]
+    assert read_jsonl(output_path) == [
+        {"line": 1, "content": "ONE"},
+        {"line": 2, "id": None, "content": "TWO", "reasoning_content": None},
+    ]
+
+
+async def test_run_batch_reruns_invalid_output_lines(
+    tmp_path: pathlib.Path, capsys: pytest.CaptureFixture[str]
+) -> None:
+    input_path: typing.Final = tmp_path / "input.jsonl"
+    output_path: typing.Final = tmp_path / "output.jsonl"
+    write_jsonl(input_path, [{"prompt": "one"}, {"prompt": "two"}])
+    output_path.write_text('{"line": 1, "content": "ONE"}\n{"content": "TWO"}\n')
+    requested_prompts: typing.Final[list[str]] = []
+
+    stats: typing.Final = await run_batch(make_echo_client(requested_prompts), input_path, output_path)
+
+    assert stats == BatchStats(completed_count=1, skipped_count=1, failed_count=0)
+    assert requested_prompts == ["two"]
+    assert read_jsonl(output_path)[-1] == {"line": 2, "id": None, "content": "TWO", "reasoning_content": None}
+    assert "Output line 2 is invalid" in capsys.readouterr().err
+
+
+async def test_run_batch_reports_invalid_input_lines(
+    tmp_path: pathlib.Path, capsys: pytest.CaptureFixture[str]
+) -> None:
+    input_path: typing.Final = tmp_path / "input.jsonl"
+    output_path: typing.Final = tmp_path / "output.jsonl"
+    input_path.write_text('{"prompt": "one"}\n\n{"id": 1}\nnot json\n')
+
+    stats: typing.Final = await run_batch(make_echo_client([]), input_path, output_path)
+
+    assert stats == BatchStats(completed_count=1, skipped_count=0, failed_count=2)
+    assert "Line 3 failed" in capsys.readouterr().err
+
+
+async def test_sigterm_cancels_batch() -> None:
+    batch_task: typing.Final = asyncio.create_task(_run_until_terminated(asyncio.sleep(10, BatchStats())))
+    await asyncio.sleep(0)
+    signal.raise_signal(signal.SIGTERM)
+
+    with pytest.raises(asyncio.CancelledError):
+        await batch_task
+
+
+def test_main(tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch, capsys: pytest.CaptureFixture[str]) -> None:
+    input_path: typing.Final = tmp_path / "input.jsonl"
+    output_path: typing.Final = tmp_path / "output.jsonl"
+    write_jsonl(input_path, [{"prompt": "one"}, {"prompt": "two"}])
+    monkeypatch.setenv(
+        "LLM_MODEL", json.dumps({"api_type": "mock", "response_message": {"content": "Hi!", "reasoning_content": None}})
+    )
+
+    assert main([str(input_path), str(output_path), "--max-concurrency", "1", "--extra", "{}"]) == 0
+    assert read_jsonl(output_path) == [
+        {"line": 1, "id": None, "content": "Hi!", "reasoning_content": None},
+        {"line": 2, "id": None, "content": "Hi!", "reasoning_content": None},
+    ]
+    assert "Completed: 2, skipped: 0, failed: 0" in capsys.readouterr().err
+
+
+def test_main_with_config_file_exits_with_error_on_failures(tmp_path: pathlib.Path) -> None:
+    input_path: typing.Final = tmp_path / "input.jsonl"
+    config_path: typing.Final = tmp_path / "config.json"
+    input_path.write_text("not json\n")
+    config_path.write_text(json.dumps({"api_type": "mock"}))
+
+    assert main([str(input_path), str(tmp_path / "output.jsonl"), "--config", str(config_path)]) == 1
+
+
+def test_main_without_config(tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.delenv("LLM_MODEL", raising=False)
+
+    with pytest.raises(SystemExit, match="LLM_MODEL"):
+        main([str(tmp_path / "input.jsonl"), str(tmp_path / "output.jsonl")])
+
+
+def test_main_rejects_zero_concurrency(tmp_path: pathlib.Path, capsys: pytest.CaptureFixture[str]) -> None:
+    with pytest.raises(SystemExit):
+        main([str(tmp_path / "input.jsonl"), str(tmp_path / "output.jsonl"), "--max-concurrency", "0"])
+    assert "--max-concurrency must be at least 1" in capsys.readouterr().err
+
+
+def test_main_interrupted(tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    async def interrupt_batch(*_args: object, **_kwargs: object) -> BatchStats:
+        raise asyncio.CancelledError
+
+    monkeypatch.setenv("LLM_MODEL", json.dumps({"api_type": "mock"}))
+    monkeypatch.setattr("any_llm_client.batch.run_batch", interrupt_batch)
+
+    assert main([str(tmp_path / "input.jsonl"), str(tmp_path / "output.jsonl")]) == 1
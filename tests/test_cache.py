@@ -0,0 +1,348 @@
+import asyncio
+import contextlib
+import pathlib
+import sqlite3
+import typing
+
+import httpx
+import pytest
+from polyfactory.factories.pydantic_factory import ModelFactory
+
+import any_llm_client
+from any_llm_client.cache import make_request_cache_key
+from any_llm_client.clients.openai import (
+    ChatCompletionsNotStreamingResponse,
+    ChatCompletionsStreamingEvent,
+    OneNotStreamingChoice,
+    OneNotStreamingChoiceMessage,
+    OneStreamingChoice,
+    OneStreamingChoiceDelta,
+)
+from tests.conftest import LLMFuncRequestFactory, consume_llm_message_chunks
+
+
+class OpenAIConfigFactory(ModelFactory[any_llm_client.OpenAIConfig]): ...
+
+
+class YandexGPTConfigFactory(ModelFactory[any_llm_client.YandexGPTConfig]): ...
+
+
+class MockLLMConfigFactory(ModelFactory[any_llm_client.MockLLMConfig]): ...
+
+
+def make_counting_openai_client(
+    config: any_llm_client.OpenAIConfig, *, stream: bool
+) -> tuple[any_llm_client.OpenAIClient, list[httpx.Request]]:
+    sent_requests: typing.Final[list[httpx.Request]] = []
+
+    def handle_request(request: httpx.Request) -> httpx.Response:
+        sent_requests.append(request)
+        if stream:
+            return httpx.Response(
+                200,
+                headers={"Content-Type": "text/event-stream"},
+                content="\n\n".join(
+                    "data: "
+                    + ChatCompletionsStreamingEvent(choices=[OneStreamingChoice(delta=one_delta)]).model_dump_json()
+                    for one_delta in (
+                        OneStreamingChoiceDelta(reasoning_content="Hmm"),
+                        OneStreamingChoiceDelta(content="Hi"),
+                        OneStreamingChoiceDelta(content=" there"),
+                    )
+                )
+                + "\n\ndata: [DONE]\n\n",
+            )
+        return httpx.Response(
+            200,
+            json=ChatCompletionsNotStreamingResponse(
+                choices=[
+                    OneNotStreamingChoice(
+                        message=OneNotStreamingChoiceMessage(
+                            role=any_llm_client.MessageRole.assistant, content="Hi there"
+                        ),
+                    ),
+                ],
+            ).model_dump(mode="json"),
+        )
+
+    return any_llm_client.OpenAIClient(config, transport=httpx.MockTransport(handle_request)), sent_requests
+
+
+class TestCachedLLMClient:
+    async def test_request_llm_message_is_cached(self) -> None:
+        openai_client, sent_requests = make_counting_openai_client(OpenAIConfigFactory.build(), stream=False)
+        cache: typing.Final = any_llm_client.InMemoryResponseCache()
+        client: typing.Final = any_llm_client.CachedLLMClient(openai_client, cache=cache)
+
+        first_response: typing.Final = await client.request_llm_message("Hi", temperature=0)
+        second_response: typing.Final = await client.request_llm_message("Hi", temperature=0)
+        await client.request_llm_message("Hi", temperature=1)
+
+        assert first_response == second_response == any_llm_client.LLMResponse(content="Hi there")
+        assert len(sent_requests) == 2  # noqa: PLR2004
+        assert cache.stats == any_llm_client.ResponseCacheStats(hits=1, misses=1)
+
+    async def test_sampled_responses_are_not_cached_by_default(self) -> None:
+        openai_client, sent_requests = make_counting_openai_client(
+            OpenAIConfigFactory.build(temperature=0.7), stream=False
+        )
+        cache: typing.Final = any_llm_client.InMemoryResponseCache()
+        client: typing.Final = any_llm_client.CachedLLMClient(openai_client, cache=cache)
+
+        for _ in range(2):
+            await client.request_llm_message("Hi")
+        await client.request_llm_message("Hi", temperature=0)
+
+        assert len(sent_requests) == 3  # noqa: PLR2004
+        assert len(cache) == 1
+
+    async def test_sampled_responses_are_cached_with_opt_in(self) -> None:
+        openai_client, sent_requests = make_counting_openai_client(
+            OpenAIConfigFactory.build(temperature=0.7), stream=False
+        )
+        client: typing.Final = any_llm_client.CachedLLMClient(openai_client, cache_sampled_responses=True)
+
+        for _ in range(2):
+            await client.request_llm_message("Hi")
+
+        assert len(sent_requests) == 1
+
+    async def test_yandexgpt_temperature_is_resolved(self) -> None:
+        cache: typing.Final = any_llm_client.InMemoryResponseCache()
+        client: typing.Final = any_llm_client.CachedLLMClient(
+            any_llm_client.YandexGPTClient(YandexGPTConfigFactory.build(temperature=0)), cache=cache
+        )
+
+        assert client._make_cache_key("Hi", temperature=0, extra=None) is not None  # noqa: SLF001
+        assert client._make_cache_key("Hi", temperature=0.5, extra=None) is None  # noqa: SLF001
+
+    async def test_streamed_response_is_cached_and_replayed(self) -> None:
+        openai_client, sent_requests = make_counting_openai_client(
+            OpenAIConfigFactory.build(temperature=0), stream=True
+        )
+        client: typing.Final = any_llm_client.CachedLLMClient(openai_client)
+
+        first_chunks: typing.Final = await consume_llm_message_chunks(client.stream_llm_message_chunks("Hi"))
+        second_chunks: typing.Final = await consume_llm_message_chunks(client.stream_llm_message_chunks("Hi"))
+        response: typing.Final = await client.request_llm_message("Hi")
+
+        assert first_chunks == [
+            any_llm_client.LLMResponse(reasoning_content="Hmm"),
+            any_llm_client.LLMResponse(content="Hi"),
+            any_llm_client.LLMResponse(content=" there"),
+        ]
+        assert second_chunks == [response] == [any_llm_client.LLMResponse(content="Hi there", reasoning_content="Hmm")]
+        assert len(sent_requests) == 1
+
+    @pytest.mark.parametrize("stream", [True, False])
+    async def test_client_without_payload_is_not_cached(self, stream: bool) -> None:
+        config: typing.Final = MockLLMConfigFactory.build()
+        cache: typing.Final = any_llm_client.InMemoryResponseCache()
+        client: typing.Final = any_llm_client.CachedLLMClient(any_llm_client.get_client(config), cache=cache)
+
+        async with client:
+            for _ in range(2):
+                if stream:
+                    assert (
+                        await consume_llm_message_chunks(
+                            client.stream_llm_message_chunks(**LLMFuncRequestFactory.build())
+                        )
+                        == config.stream_messages
+                    )
+                else:
+                    assert await client.request_llm_message(**LLMFuncRequestFactory.build()) == config.response_message
+
+        assert len(cache) == 0
+        assert cache.stats == any_llm_client.ResponseCacheStats()
+
+    def test_cache_key_depends_on_payload(self) -> None:
+        openai_client: typing.Final = any_llm_client.OpenAIClient(OpenAIConfigFactory.build())
+
+        assert make_request_cache_key(openai_client, "Hi", temperature=0, extra=None) == make_request_cache_key(
+            any_llm_client.CachedLLMClient(openai_client), "Hi", temperature=0, extra={}
+        )
+        assert make_request_cache_key(openai_client, "Hi", temperature=0, extra=None) != make_request_cache_key(
+            openai_client, "Hi", temperature=0, extra={"best_of": 3}
+        )
+
+
+class TestInMemoryResponseCache:
+    async def test_evicts_least_recently_used(self) -> None:
+        cache: typing.Final = any_llm_client.InMemoryResponseCache(max_entries=2)
+        await cache.set("a", any_llm_client.LLMResponse(content="a"))
+        await cache.set("b", any_llm_client.LLMResponse(content="b"))
+        await cache.get("a")
+        await cache.set("c", any_llm_client.LLMResponse(content="c"))
+
+        assert await cache.get("b") is None
+        assert await cache.get("a") == any_llm_client.LLMResponse(content="a")
+        assert await cache.get("c") == any_llm_client.LLMResponse(content="c")
+        assert cache.stats.evictions == 1
+
+    async def test_evicts_by_size(self) -> None:
+        cache: typing.Final = any_llm_client.InMemoryResponseCache(max_entries=None, max_bytes=10)
+        await cache.set("a", any_llm_client.LLMResponse(content="1234"))
+        await cache.set("b", any_llm_client.LLMResponse(content="1234"))
+        await cache.set("c", any_llm_client.LLMResponse(content="1234"))
+        await cache.set("d", any_llm_client.LLMResponse(content="too large to be cached"))
+
+        assert len(cache) == 2  # noqa: PLR2004
+        assert cache.total_bytes == 10  # noqa: PLR2004
+        assert await cache.get("a") is None
+        assert await cache.get("d") is None
+
+    async def test_expires_by_ttl(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        current_time = 100.0
+        monkeypatch.setattr("time.monotonic", lambda: current_time)
+        cache: typing.Final = any_llm_client.InMemoryResponseCache(ttl=10)
+        await cache.set("a", any_llm_client.LLMResponse(content="a"))
+
+        current_time = 109.0
+        assert await cache.get("a") == any_llm_client.LLMResponse(content="a")
+        current_time = 110.0
+        assert await cache.get("a") is None
+        assert len(cache) == 0
+
+    async def test_overwrite_and_clear(self) -> None:
+        cache: typing.Final = any_llm_client.InMemoryResponseCache()
+        await cache.set("a", any_llm_client.LLMResponse(content="a"))
+        await cache.set("a", any_llm_client.LLMResponse(content="b", reasoning_content="c"))
+
+        assert await cache.get("a") == any_llm_client.LLMResponse(content="b", reasoning_content="c")
+        assert cache.total_bytes == 3  # noqa: PLR2004
+
+        cache.clear()
+        assert len(cache) == 0
+        assert cache.total_bytes == 0
+
+
+class TestSQLiteResponseCache:
+    async def test_is_shared_and_persistent(self, tmp_path: pathlib.Path) -> None:
+        path: typing.Final = tmp_path / "cache.sqlite3"
+        response: typing.Final = any_llm_client.LLMResponse(content="Hi", reasoning_content="Hmm")
+
+        async with (
+            any_llm_client.SQLiteResponseCache(path=path) as first_cache,
+            any_llm_client.SQLiteResponseCache(path=path) as second_cache,
+        ):
+            await first_cache.set("a", response)
+            assert await second_cache.get("a") == response
+            assert await second_cache.get("b") is None
+            assert second_cache.stats == any_llm_client.ResponseCacheStats(hits=1, misses=1)
+
+        async with any_llm_client.SQLiteResponseCache(path=path) as reopened_cache:
+            assert await reopened_cache.get("a") == response
+
+    async def test_expires_by_ttl(self, tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        current_time = 100.0
+        monkeypatch.setattr("time.time", lambda: current_time)
+        cache: typing.Final = any_llm_client.SQLiteResponseCache(path=tmp_path / "cache.sqlite3", ttl=10)
+        await cache.set("a", any_llm_client.LLMResponse(content="a"))
+
+        current_time = 109.0
+        assert await cache.get("a") == any_llm_client.LLMResponse(content="a")
+        current_time = 110.0
+        assert await cache.get("a") is None
+
+        await cache.compact()
+        assert cache.stats.evictions == 1
+        cache.close()
+
+    async def test_compaction_enforces_limits(self, tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        current_time = 100.0
+        monkeypatch.setattr("time.time", lambda: current_time)
+        cache: typing.Final = any_llm_client.SQLiteResponseCache(
+            path=tmp_path / "cache.sqlite3", max_entries=3, max_bytes=10, access_time_update_interval=0
+        )
+        for one_key in "abcd":
+            current_time += 1
+            await cache.set(one_key, any_llm_client.LLMResponse(content="1234"))
+        current_time += 1
+        await cache.get("a")
+
+        await cache.compact()
+
+        assert cache.stats.evictions == 2  # noqa: PLR2004
+        assert [await cache.get(one_key) is not None for one_key in "abcd"] == [True, False, False, True]
+        cache.close()
+
+    async def test_compacts_in_background(self, tmp_path: pathlib.Path) -> None:
+        async with any_llm_client.SQLiteResponseCache(
+            path=tmp_path / "cache.sqlite3", max_entries=0, compaction_interval=0
+        ) as cache:
+            await cache.set("a", any_llm_client.LLMResponse(content="a"))
+            await asyncio.sleep(0.2)
+
+            assert cache.stats.evictions
+            assert await cache.get("a") is None
+
+    async def test_enters_when_database_is_locked(self, tmp_path: pathlib.Path) -> None:
+        path: typing.Final = tmp_path / "cache.sqlite3"
+        async with any_llm_client.SQLiteResponseCache(path=path):
+            pass
+        locking_connection: typing.Final = sqlite3.connect(path, isolation_level=None)
+        locking_connection.execute("BEGIN EXCLUSIVE")
+
+        cache: typing.Final = any_llm_client.SQLiteResponseCache(path=path, busy_timeout=0)
+        try:
+            await asyncio.create_task(cache.__aenter__())
+        finally:
+            locking_connection.close()
+        await cache.__aexit__(None, None, None)
+
+        assert cache.stats.evictions == 0
+
+    async def test_locked_database_does_not_fail_requests(self, tmp_path: pathlib.Path) -> None:
+        path: typing.Final = tmp_path / "cache.sqlite3"
+        writing_cache: typing.Final = any_llm_client.SQLiteResponseCache(path=path, busy_timeout=0)
+        await writing_cache.set("a", any_llm_client.LLMResponse(content="a"))
+        reading_cache: typing.Final = any_llm_client.SQLiteResponseCache(path=path, busy_timeout=0)
+        locking_connection: typing.Final = sqlite3.connect(path, isolation_level=None)
+        locking_connection.execute("BEGIN EXCLUSIVE")
+
+        try:
+            missed_response: typing.Final = await asyncio.create_task(reading_cache.get("a"))
+            await asyncio.create_task(writing_cache.set("b", any_llm_client.LLMResponse(content="b")))
+        finally:
+            locking_connection.close()
+
+        assert missed_response is None
+        assert await reading_cache.get("a") == any_llm_client.LLMResponse(content="a")
+        assert await reading_cache.get("b") is None
+        assert reading_cache.stats == any_llm_client.ResponseCacheStats(hits=1, misses=2)
+        writing_cache.close()
+        reading_cache.close()
+
+    async def test_access_time_is_updated_periodically(
+        self, tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        current_time = 100.0
+        monkeypatch.setattr("time.time", lambda: current_time)
+        path: typing.Final = tmp_path / "cache.sqlite3"
+        cache: typing.Final = any_llm_client.SQLiteResponseCache(
+            path=path, access_time_update_interval=10, busy_timeout=0
+        )
+        await cache.set("a", any_llm_client.LLMResponse(content="a"))
+
+        def get_accessed_at() -> float:
+            with contextlib.closing(sqlite3.connect(path)) as connection:
+                return typing.cast("float", connection.execute("SELECT accessed_at FROM responses").fetchone()[0])
+
+        current_time = 109.0
+        await cache.get("a")
+        assert get_accessed_at() == 100  # noqa: PLR2004
+
+        current_time = 110.0
+        await cache.get("a")
+        assert get_accessed_at() == 110  # noqa: PLR2004
+
+        # Access time is not updated while another process holds the lock, but the response is served
+        current_time = 120.0
+        locking_connection: typing.Final = sqlite3.connect(path, isolation_level=None)
+        locking_connection.execute("BEGIN IMMEDIATE")
+        try:
+            assert await cache.get("a") == any_llm_client.LLMResponse(content="a")
+        finally:
+            locking_connection.close()
+        assert get_accessed_at() == 110  # noqa: PLR2004
+        cache.close()
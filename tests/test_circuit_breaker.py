@@ -0,0 +1,204 @@
+import asyncio
+import contextlib
+import typing
+
+import httpx
+import pytest
+import stamina
+from polyfactory.factories.pydantic_factory import ModelFactory
+
+import any_llm_client
+from tests.conftest import consume_llm_message_chunks
+from tests.test_balancer import REPLICA_URLS, ReplicasTransport, make_client
+
+
+class YandexGPTConfigFactory(ModelFactory[any_llm_client.YandexGPTConfig]): ...
+
+
+URL: typing.Final = "http://llm/completion"
+
+
+@pytest.fixture
+def now(monkeypatch: pytest.MonkeyPatch) -> list[float]:
+    current_time: typing.Final = [0.0]
+    monkeypatch.setattr("any_llm_client.circuit_breaker.time.monotonic", lambda: current_time[0])
+    return current_time
+
+
+def test_circuit_opens_on_error_rate(now: list[float]) -> None:
+    circuit_breaker: typing.Final = any_llm_client.CircuitBreaker(
+        failure_rate_threshold=0.75, window_size=4, min_requests_count=4
+    )
+    for _ in range(2):
+        circuit_breaker.record_failure(URL)
+        circuit_breaker.record_success(URL)
+    circuit_breaker.record_failure(URL)
+    assert circuit_breaker.get_state(URL) == any_llm_client.CircuitState.closed
+
+    circuit_breaker.record_failure(URL)
+    assert circuit_breaker.get_state(URL) == any_llm_client.CircuitState.open
+    assert circuit_breaker.get_state("http://other-llm/completion") == any_llm_client.CircuitState.closed
+
+    now[0] = 10.0
+    with pytest.raises(any_llm_client.LLMCircuitOpenError) as exc_info:
+        contextlib.ExitStack().enter_context(circuit_breaker.guard(URL))
+    assert exc_info.value.url == URL
+    assert exc_info.value.retry_after == 20  # noqa: PLR2004
+
+
+def test_circuit_opens_on_consecutive_timeouts() -> None:
+    circuit_breaker: typing.Final = any_llm_client.CircuitBreaker(max_consecutive_timeouts=2)
+    circuit_breaker.record_failure(URL, is_timeout=True)
+    circuit_breaker.record_success(URL)
+    circuit_breaker.record_failure(URL, is_timeout=True)
+    assert circuit_breaker.get_state(URL) == any_llm_client.CircuitState.closed
+
+    circuit_breaker.record_failure(URL, is_timeout=True)
+    assert circuit_breaker.get_state(URL) == any_llm_client.CircuitState.open
+
+
+@pytest.mark.parametrize("is_probe_successful", [True, False])
+def test_half_open_circuit_lets_probes_through(now: list[float], is_probe_successful: bool) -> None:
+    circuit_breaker: typing.Final = any_llm_client.CircuitBreaker(max_consecutive_timeouts=1, open_time=5)
+    circuit_breaker.record_failure(URL, is_timeout=True)
+    now[0] = 5.0
+    assert circuit_breaker.get_state(URL) == any_llm_client.CircuitState.half_open
+
+    with circuit_breaker.guard(URL):
+        with pytest.raises(any_llm_client.LLMCircuitOpenError):
+            contextlib.ExitStack().enter_context(circuit_breaker.guard(URL))
+        circuit_breaker.record_failure("http://other-llm/completion")
+        if is_probe_successful:
+            circuit_breaker.record_success(URL)
+        else:
+            circuit_breaker.record_failure(URL)
+
+    assert circuit_breaker.get_state(URL) == (
+        any_llm_client.CircuitState.closed if is_probe_successful else any_llm_client.CircuitState.open
+    )
+
+
+def test_outcomes_are_ignored_while_circuit_is_open() -> None:
+    circuit_breaker: typing.Final = any_llm_client.CircuitBreaker(max_consecutive_timeouts=1)
+    circuit_breaker.record_failure(URL, is_timeout=True)
+
+    # Requests that were sent before the circuit opened may complete later
+    circuit_breaker.record_success(URL)
+    circuit_breaker.record_failure(URL)
+    assert circuit_breaker.get_state(URL) == any_llm_client.CircuitState.open
+
+
+def test_accepts_requests(now: list[float]) -> None:
+    circuit_breaker: typing.Final = any_llm_client.CircuitBreaker(max_consecutive_timeouts=1, open_time=5)
+    assert circuit_breaker.accepts_requests(URL)
+
+    circuit_breaker.record_failure(URL, is_timeout=True)
+    assert not circuit_breaker.accepts_requests(URL)
+
+    now[0] = 5.0
+    assert circuit_breaker.accepts_requests(URL)
+    with circuit_breaker.guard(URL):
+        assert not circuit_breaker.accepts_requests(URL)
+        circuit_breaker.record_success(URL)
+    assert circuit_breaker.accepts_requests(URL)
+
+
+def test_cancelled_probe_frees_its_slot(now: list[float]) -> None:
+    circuit_breaker: typing.Final = any_llm_client.CircuitBreaker(max_consecutive_timeouts=1, open_time=5)
+    circuit_breaker.record_failure(URL, is_timeout=True)
+    now[0] = 5.0
+
+    with pytest.raises(asyncio.CancelledError), circuit_breaker.guard(URL):
+        raise asyncio.CancelledError
+    with circuit_breaker.guard(URL):
+        circuit_breaker.record_success(URL)
+    assert circuit_breaker.get_state(URL) == any_llm_client.CircuitState.closed
+
+
+@pytest.fixture
+def _activate_retries() -> typing.Iterator[None]:
+    stamina.set_active(True)
+    with stamina.set_testing(True, attempts=3):
+        yield
+    stamina.set_active(False)
+
+
+@pytest.mark.usefixtures("_activate_retries")
+@pytest.mark.parametrize("stream", [True, False])
+async def test_client_fails_fast_while_circuit_is_open(stream: bool) -> None:
+    requests_count = 0
+
+    def handle_request(request: httpx.Request) -> httpx.Response:
+        nonlocal requests_count
+        requests_count += 1
+        raise httpx.ConnectTimeout("timed out", request=request)
+
+    circuit_breaker: typing.Final = any_llm_client.CircuitBreaker(max_consecutive_timeouts=2)
+    client: typing.Final = any_llm_client.YandexGPTClient(
+        YandexGPTConfigFactory.build(),
+        circuit_breaker=circuit_breaker,
+        transport=httpx.MockTransport(handle_request),
+    )
+
+    with pytest.raises(any_llm_client.LLMCircuitOpenError):
+        await (
+            consume_llm_message_chunks(client.stream_llm_message_chunks("Hi"))
+            if stream
+            else client.request_llm_message("Hi")
+        )
+    assert requests_count == 2  # noqa: PLR2004
+    assert circuit_breaker.get_state(client.load_balancer.replicas[0].url) == any_llm_client.CircuitState.open
+
+
+async def test_server_errors_open_circuit() -> None:
+    status_codes: typing.Final = iter([400, 503, 503])
+    circuit_breaker: typing.Final = any_llm_client.CircuitBreaker(
+        failure_rate_threshold=1, window_size=2, min_requests_count=2
+    )
+    client: typing.Final = any_llm_client.get_client(
+        YandexGPTConfigFactory.build(),
+        circuit_breaker=circuit_breaker,
+        transport=httpx.MockTransport(lambda _: httpx.Response(next(status_codes))),
+    )
+
+    # Client errors are not failures of the server
+    for _ in range(3):
+        with pytest.raises(any_llm_client.LLMError) as exc_info:
+            await client.request_llm_message("Hi")
+        assert not isinstance(exc_info.value, any_llm_client.LLMCircuitOpenError)
+    with pytest.raises(any_llm_client.LLMCircuitOpenError):
+        await client.request_llm_message("Hi")
+
+
+@pytest.mark.usefixtures("_activate_retries")
+@pytest.mark.parametrize("stream", [True, False])
+async def test_requests_go_to_replicas_with_closed_circuit(stream: bool) -> None:
+    transport: typing.Final = ReplicasTransport(failing_hosts={"replica-0"})
+    circuit_breaker: typing.Final = any_llm_client.CircuitBreaker(
+        failure_rate_threshold=1, window_size=2, min_requests_count=2
+    )
+    client: typing.Final = make_client(REPLICA_URLS[:2], transport)
+    client.circuit_breaker = circuit_breaker
+    # Only circuit breaker keeps requests away from the failing replica
+    client.load_balancer.max_consecutive_failures = 100
+
+    for _ in range(10):
+        await (
+            consume_llm_message_chunks(client.stream_llm_message_chunks("Hi"))
+            if stream
+            else client.request_llm_message("Hi")
+        )
+
+    assert circuit_breaker.get_state(REPLICA_URLS[0]) == any_llm_client.CircuitState.open
+    assert transport.requested_hosts.count("replica-0") == 2  # noqa: PLR2004
+
+
+async def test_circuit_open_error_is_raised_when_all_circuits_are_open() -> None:
+    circuit_breaker: typing.Final = any_llm_client.CircuitBreaker(max_consecutive_timeouts=1)
+    client: typing.Final = make_client(REPLICA_URLS[:2], ReplicasTransport())
+    client.circuit_breaker = circuit_breaker
+    for one_url in REPLICA_URLS[:2]:
+        circuit_breaker.record_failure(one_url, is_timeout=True)
+
+    with pytest.raises(any_llm_client.LLMCircuitOpenError):
+        await client.request_llm_message("Hi")
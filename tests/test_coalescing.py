@@ -0,0 +1,265 @@
+import asyncio
+import typing
+
+import httpx
+import pytest
+from polyfactory.factories.pydantic_factory import ModelFactory
+
+import any_llm_client
+from any_llm_client.clients.openai import (
+    ChatCompletionsNotStreamingResponse,
+    ChatCompletionsStreamingEvent,
+    OneNotStreamingChoice,
+    OneNotStreamingChoiceMessage,
+    OneStreamingChoice,
+    OneStreamingChoiceDelta,
+)
+from tests.conftest import LLMFuncRequestFactory, consume_llm_message_chunks
+
+
+class OpenAIConfigFactory(ModelFactory[any_llm_client.OpenAIConfig]): ...
+
+
+class MockLLMConfigFactory(ModelFactory[any_llm_client.MockLLMConfig]): ...
+
+
+def make_sse_event(content: str) -> bytes:
+    return (
+        "data: "
+        + ChatCompletionsStreamingEvent(
+            choices=[OneStreamingChoice(delta=OneStreamingChoiceDelta(content=content))]
+        ).model_dump_json()
+        + "\n\n"
+    ).encode()
+
+
+class TestCoalescingRequestLLMMessage:
+    async def test_concurrent_identical_requests_are_sent_once(self) -> None:
+        sent_requests: typing.Final[list[httpx.Request]] = []
+
+        async def handle_request(request: httpx.Request) -> httpx.Response:
+            sent_requests.append(request)
+            await asyncio.sleep(0)
+            return httpx.Response(
+                200,
+                json=ChatCompletionsNotStreamingResponse(
+                    choices=[
+                        OneNotStreamingChoice(
+                            message=OneNotStreamingChoiceMessage(
+                                role=any_llm_client.MessageRole.assistant, content=request.content.decode()
+                            ),
+                        ),
+                    ],
+                ).model_dump(mode="json"),
+            )
+
+        client: typing.Final = any_llm_client.CoalescingLLMClient(
+            any_llm_client.OpenAIClient(OpenAIConfigFactory.build(), transport=httpx.MockTransport(handle_request))
+        )
+
+        responses: typing.Final = await asyncio.gather(
+            client.request_llm_message("Hi"),
+            client.request_llm_message("Hi"),
+            client.request_llm_message("Hello"),
+            client.request_llm_message("Hi"),
+        )
+
+        assert len(sent_requests) == 2  # noqa: PLR2004
+        assert responses[0] == responses[1] == responses[3] != responses[2]
+        assert await client.request_llm_message("Hi") == responses[0]
+        assert len(sent_requests) == 3  # noqa: PLR2004
+
+    async def test_errors_are_shared(self) -> None:
+        client: typing.Final = any_llm_client.CoalescingLLMClient(
+            any_llm_client.OpenAIClient(
+                OpenAIConfigFactory.build(), transport=httpx.MockTransport(lambda _: httpx.Response(500))
+            )
+        )
+
+        results: typing.Final = await asyncio.gather(
+            client.request_llm_message("Hi"), client.request_llm_message("Hi"), return_exceptions=True
+        )
+
+        assert all(isinstance(one_result, any_llm_client.LLMError) for one_result in results)
+
+    async def test_request_is_cancelled_when_all_waiters_are_cancelled(self) -> None:
+        request_started: typing.Final = asyncio.Event()
+        request_cancelled: typing.Final = asyncio.Event()
+
+        async def handle_request(_: httpx.Request) -> httpx.Response:
+            request_started.set()
+            try:
+                await asyncio.Event().wait()
+            finally:
+                request_cancelled.set()
+            raise AssertionError  # pragma: no cover
+
+        client: typing.Final = any_llm_client.CoalescingLLMClient(
+            any_llm_client.OpenAIClient(OpenAIConfigFactory.build(), transport=httpx.MockTransport(handle_request))
+        )
+        waiters: typing.Final = [asyncio.create_task(client.request_llm_message("Hi")) for _ in range(2)]
+        await request_started.wait()
+
+        waiters[0].cancel()
+        await asyncio.sleep(0)
+        assert not request_cancelled.is_set()
+
+        waiters[1].cancel()
+        await asyncio.wait_for(request_cancelled.wait(), timeout=1)
+
+    async def test_request_after_cancellation_is_sent_again(self) -> None:
+        sent_requests: typing.Final[list[httpx.Request]] = []
+
+        async def handle_request(request: httpx.Request) -> httpx.Response:
+            sent_requests.append(request)
+            if len(sent_requests) == 1:
+                await asyncio.Event().wait()
+            return httpx.Response(
+                200,
+                json=ChatCompletionsNotStreamingResponse(
+                    choices=[
+                        OneNotStreamingChoice(
+                            message=OneNotStreamingChoiceMessage(
+                                role=any_llm_client.MessageRole.assistant, content="Hi"
+                            )
+                        ),
+                    ],
+                ).model_dump(mode="json"),
+            )
+
+        client: typing.Final = any_llm_client.CoalescingLLMClient(
+            any_llm_client.OpenAIClient(OpenAIConfigFactory.build(), transport=httpx.MockTransport(handle_request))
+        )
+        cancelled_waiter: typing.Final = asyncio.create_task(client.request_llm_message("Hi"))
+        await asyncio.sleep(0.01)
+        cancelled_waiter.cancel()
+        await asyncio.sleep(0)
+
+        assert await client.request_llm_message("Hi") == any_llm_client.LLMResponse("Hi")
+        assert len(sent_requests) == 2  # noqa: PLR2004
+
+
+class TestCoalescingStreamLLMMessageChunks:
+    async def test_late_joiner_receives_seen_and_live_chunks(self) -> None:
+        sent_requests: typing.Final[list[httpx.Request]] = []
+        first_chunk_sent: typing.Final = asyncio.Event()
+        late_joiner_joined: typing.Final = asyncio.Event()
+
+        async def iter_response_content() -> typing.AsyncIterator[bytes]:
+            yield make_sse_event("Hi")
+            first_chunk_sent.set()
+            await late_joiner_joined.wait()
+            yield make_sse_event(" there")
+            yield b"data: [DONE]\n\n"
+
+        def handle_request(request: httpx.Request) -> httpx.Response:
+            sent_requests.append(request)
+            return httpx.Response(200, headers={"Content-Type": "text/event-stream"}, content=iter_response_content())
+
+        client: typing.Final = any_llm_client.CoalescingLLMClient(
+            any_llm_client.OpenAIClient(OpenAIConfigFactory.build(), transport=httpx.MockTransport(handle_request))
+        )
+
+        async def join_late() -> list[any_llm_client.LLMResponse]:
+            await first_chunk_sent.wait()
+            async with client.stream_llm_message_chunks("Hi") as response_chunks:
+                late_joiner_joined.set()
+                return [one_chunk async for one_chunk in response_chunks]
+
+        results: typing.Final = await asyncio.gather(
+            consume_llm_message_chunks(client.stream_llm_message_chunks("Hi")), join_late()
+        )
+
+        assert results[0] == results[1] == [any_llm_client.LLMResponse("Hi"), any_llm_client.LLMResponse(" there")]
+        assert len(sent_requests) == 1
+
+    async def test_subscriber_fails_when_stream_is_cancelled(self) -> None:
+        async def iter_response_content() -> typing.AsyncIterator[bytes]:
+            yield make_sse_event("Hi")
+            await asyncio.Event().wait()
+            yield b"data: [DONE]\n\n"  # pragma: no cover
+
+        client: typing.Final = any_llm_client.CoalescingLLMClient(
+            any_llm_client.OpenAIClient(
+                OpenAIConfigFactory.build(),
+                transport=httpx.MockTransport(
+                    lambda _: httpx.Response(
+                        200, headers={"Content-Type": "text/event-stream"}, content=iter_response_content()
+                    )
+                ),
+            )
+        )
+
+        async with client.stream_llm_message_chunks("Hi") as response_chunks:
+            response_chunks_iterator: typing.Final = aiter(response_chunks)
+            assert await anext(response_chunks_iterator) == any_llm_client.LLMResponse("Hi")
+            (in_flight_stream,) = client._in_flight_streams.values()  # noqa: SLF001
+            assert in_flight_stream.task
+            in_flight_stream.task.cancel()
+
+            with pytest.raises(asyncio.CancelledError):
+                await anext(response_chunks_iterator)
+            assert not client._in_flight_streams  # noqa: SLF001
+
+    @pytest.mark.parametrize("status_code", [200, 500])
+    async def test_errors_are_shared(self, status_code: int) -> None:
+        client: typing.Final = any_llm_client.CoalescingLLMClient(
+            any_llm_client.OpenAIClient(
+                OpenAIConfigFactory.build(),
+                transport=httpx.MockTransport(
+                    lambda _: httpx.Response(
+                        status_code, headers={"Content-Type": "text/event-stream"}, content=b"data: {}\n\n"
+                    )
+                ),
+            )
+        )
+
+        results: typing.Final = await asyncio.gather(
+            consume_llm_message_chunks(client.stream_llm_message_chunks("Hi")),
+            consume_llm_message_chunks(client.stream_llm_message_chunks("Hi")),
+            return_exceptions=True,
+        )
+
+        assert all(isinstance(one_result, any_llm_client.AnyLLMClientError) for one_result in results)
+
+
+@pytest.mark.parametrize("stream", [True, False])
+async def test_client_without_payload_is_passed_through(stream: bool) -> None:
+    config: typing.Final = MockLLMConfigFactory.build()
+
+    async with any_llm_client.CoalescingLLMClient(any_llm_client.get_client(config)) as client:
+        if stream:
+            assert (
+                await consume_llm_message_chunks(client.stream_llm_message_chunks(**LLMFuncRequestFactory.build()))
+                == config.stream_messages
+            )
+        else:
+            assert await client.request_llm_message(**LLMFuncRequestFactory.build()) == config.response_message
+
+
+async def test_can_be_wrapped_with_cache() -> None:
+    sent_requests: typing.Final[list[httpx.Request]] = []
+
+    def handle_request(request: httpx.Request) -> httpx.Response:
+        sent_requests.append(request)
+        return httpx.Response(
+            200,
+            json=ChatCompletionsNotStreamingResponse(
+                choices=[
+                    OneNotStreamingChoice(
+                        message=OneNotStreamingChoiceMessage(role=any_llm_client.MessageRole.assistant, content="Hi")
+                    ),
+                ],
+            ).model_dump(mode="json"),
+        )
+
+    client: typing.Final = any_llm_client.CachedLLMClient(
+        any_llm_client.CoalescingLLMClient(
+            any_llm_client.OpenAIClient(
+                OpenAIConfigFactory.build(temperature=0), transport=httpx.MockTransport(handle_request)
+            )
+        )
+    )
+
+    assert await client.request_llm_message("Hi") == await client.request_llm_message("Hi")
+    assert len(sent_requests) == 1
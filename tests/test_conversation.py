@@ -0,0 +1,72 @@
+import json
+import typing
+
+import httpx
+import pytest
+from polyfactory.factories.pydantic_factory import ModelFactory
+
+import any_llm_client
+
+
+class OpenAIConfigFactory(ModelFactory[any_llm_client.OpenAIConfig]): ...
+
+
+class YandexGPTConfigFactory(ModelFactory[any_llm_client.YandexGPTConfig]): ...
+
+
+def test_only_new_messages_are_encoded() -> None:
+    encoded_messages: typing.Final[list[any_llm_client.Message]] = []
+
+    def encode_message(message: any_llm_client.Message) -> str:
+        encoded_messages.append(message)
+        return typing.cast("str", message.content).upper()
+
+    conversation: typing.Final = any_llm_client.Conversation(
+        [any_llm_client.SystemMessage("a"), any_llm_client.UserMessage("b")]
+    )
+    assert conversation.encode(encode_message) == ["A", "B"]
+
+    conversation.append(any_llm_client.AssistantMessage("c"))
+    assert conversation.encode(encode_message) == ["A", "B", "C"]
+    assert len(encoded_messages) == 3  # noqa: PLR2004
+
+    # Replaced message and all the following ones are encoded again
+    conversation[1] = any_llm_client.UserMessage("d")
+    assert conversation.encode(encode_message) == ["A", "D", "C"]
+    assert len(encoded_messages) == 5  # noqa: PLR2004
+
+    del conversation[1:]
+    assert conversation.encode(encode_message) == ["A"]
+    assert len(encoded_messages) == 5  # noqa: PLR2004
+
+
+@pytest.mark.parametrize("config_factory", [OpenAIConfigFactory, YandexGPTConfigFactory])
+async def test_conversation_is_sent_like_list(
+    config_factory: type[ModelFactory[any_llm_client.OpenAIConfig | any_llm_client.YandexGPTConfig]],
+) -> None:
+    sent_payloads: typing.Final[list[typing.Any]] = []
+
+    def handle_request(request: httpx.Request) -> httpx.Response:
+        sent_payloads.append(json.loads(request.content))
+        return httpx.Response(400)
+
+    client: typing.Final = any_llm_client.get_client(
+        config_factory.build(), transport=httpx.MockTransport(handle_request)
+    )
+    messages: typing.Final = [any_llm_client.SystemMessage("Be nice"), any_llm_client.UserMessage("Hi")]
+    conversation: typing.Final = any_llm_client.Conversation(messages)
+
+    for one_messages in (messages, conversation, conversation):
+        with pytest.raises(any_llm_client.LLMError):
+            await client.request_llm_message(one_messages, temperature=0)
+    assert sent_payloads[0] == sent_payloads[1] == sent_payloads[2]
+
+
+async def test_yandexgpt_conversation_with_image_is_rejected() -> None:
+    client: typing.Final = any_llm_client.get_client(YandexGPTConfigFactory.build())
+    conversation: typing.Final = any_llm_client.Conversation(
+        [any_llm_client.UserMessage([any_llm_client.ImageContentItem("https://example.com/image.jpg")])]
+    )
+
+    with pytest.raises(any_llm_client.LLMRequestValidationError):
+        await client.request_llm_message(conversation)
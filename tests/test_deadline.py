@@ -0,0 +1,144 @@
+import asyncio
+import time
+import typing
+
+import httpx
+import pytest
+import stamina
+from polyfactory.factories.pydantic_factory import ModelFactory
+
+import any_llm_client
+from tests.conftest import consume_llm_message_chunks
+from tests.test_balancer import make_response
+
+
+class OpenAIConfigFactory(ModelFactory[any_llm_client.OpenAIConfig]): ...
+
+
+CONNECT_TIMEOUT: typing.Final = 0.5
+
+
+def make_client(
+    handle_request: typing.Callable[[httpx.Request], typing.Any],
+    **kwargs: typing.Any,  # noqa: ANN401
+) -> any_llm_client.OpenAIClient:
+    return any_llm_client.OpenAIClient(
+        OpenAIConfigFactory.build(
+            url="http://llm/v1/chat/completions",
+            first_chunk_timeout=0,
+            chunk_idle_timeout=0,
+            server_metrics_scrape_interval=0,
+            force_user_assistant_message_alternation=False,
+        ),
+        transport=httpx.MockTransport(handle_request),
+        **kwargs,
+    )
+
+
+async def wait_forever(_: httpx.Request) -> httpx.Response:
+    never_done_future: typing.Final[asyncio.Future[httpx.Response]] = asyncio.get_running_loop().create_future()
+    return await never_done_future
+
+
+@pytest.mark.parametrize("stream", [True, False])
+async def test_hung_request_is_bounded(stream: bool) -> None:
+    client: typing.Final = make_client(wait_forever)
+
+    with pytest.raises(any_llm_client.LLMRequestTimeoutError) as exc_info:
+        await (
+            consume_llm_message_chunks(client.stream_llm_message_chunks("Hi", timeout=0.05))
+            if stream
+            else client.request_llm_message("Hi", timeout=0.05)
+        )
+    assert exc_info.value == any_llm_client.LLMRequestTimeoutError(timeout=0.05)
+
+
+async def test_retry_backoff_is_bounded() -> None:
+    requests_count = 0
+
+    def handle_request(_: httpx.Request) -> httpx.Response:
+        nonlocal requests_count
+        requests_count += 1
+        return httpx.Response(503)
+
+    client: typing.Final = make_client(
+        handle_request,
+        request_retry=any_llm_client.RequestRetryConfig(attempts=None, timeout=None, wait_initial=10, wait_jitter=0),
+    )
+    started_at: typing.Final = time.monotonic()
+
+    stamina.set_active(True)
+    try:
+        with pytest.raises(any_llm_client.LLMRequestTimeoutError):
+            await client.request_llm_message("Hi", timeout=0.05)
+    finally:
+        stamina.set_active(False)
+    assert time.monotonic() - started_at < 1
+    assert requests_count == 1
+
+
+async def test_attempt_timeouts_are_limited_by_remaining_time() -> None:
+    request_timeouts: typing.Final = []
+
+    def handle_request(request: httpx.Request) -> httpx.Response:
+        request_timeouts.append(request.extensions["timeout"])
+        return make_response()
+
+    client: typing.Final = make_client(handle_request, timeout=httpx.Timeout(None, connect=CONNECT_TIMEOUT))
+    await client.request_llm_message("Hi", timeout=1)
+    await client.request_llm_message("Hi")
+
+    assert request_timeouts[0]["connect"] == CONNECT_TIMEOUT
+    assert all(CONNECT_TIMEOUT < request_timeouts[0][one_name] <= 1 for one_name in ("read", "write", "pool"))
+    assert request_timeouts[1] == {"connect": CONNECT_TIMEOUT, "read": None, "write": None, "pool": None}
+
+
+async def test_timeout_after_deadline_is_not_server_failure() -> None:
+    def handle_request(request: httpx.Request) -> httpx.Response:
+        time.sleep(0.02)
+        raise httpx.ReadTimeout("", request=request)
+
+    client: typing.Final = make_client(handle_request)
+
+    with pytest.raises(any_llm_client.LLMRequestTimeoutError):
+        await client.request_llm_message("Hi", timeout=0.01)
+    assert client.load_balancer.replicas[0].consecutive_failures_count == 0
+
+
+async def test_expired_timeout_fails_without_request() -> None:
+    client: typing.Final = make_client(wait_forever)
+
+    with pytest.raises(any_llm_client.LLMRequestTimeoutError):
+        await client.request_llm_message("Hi", timeout=0)
+
+
+class StalledStream(httpx.AsyncByteStream):
+    async def __aiter__(self) -> typing.AsyncIterator[bytes]:
+        yield b'data: {"choices": [{"delta": {"content": "Hi"}}]}\n\n'
+        await asyncio.Event().wait()
+
+
+async def test_stream_reading_is_bounded() -> None:
+    client: typing.Final = make_client(
+        lambda _: httpx.Response(200, headers={"Content-Type": "text/event-stream"}, stream=StalledStream())
+    )
+    client.config.chunk_idle_timeout = 10
+
+    async with client.stream_llm_message_chunks("Hi", timeout=0.05) as chunks:
+        chunks_iterator: typing.Final = aiter(chunks)
+        assert await anext(chunks_iterator) == any_llm_client.LLMResponse(content="Hi")
+        with pytest.raises(any_llm_client.LLMRequestTimeoutError):
+            await anext(chunks_iterator)
+
+
+async def test_limiter_passes_remaining_timeout() -> None:
+    limiter: typing.Final = any_llm_client.ConcurrencyLimiter(max_in_flight=1)
+    client: typing.Final = any_llm_client.ConcurrencyLimitedLLMClient(make_client(wait_forever), limiter=limiter)
+
+    async with limiter.acquire():
+        request_task: typing.Final = asyncio.create_task(client.request_llm_message("Hi", timeout=0.05))
+        await asyncio.sleep(0.1)
+
+    # Timeout is spent in queue
+    with pytest.raises(any_llm_client.LLMRequestTimeoutError):
+        await request_task
@@ -0,0 +1,234 @@
+import asyncio
+import contextlib
+import dataclasses
+import types
+import typing
+
+import pytest
+import typing_extensions
+
+import any_llm_client
+from any_llm_client.core import LLMConfigValue
+from any_llm_client.hedging import _LatencyWindow
+from tests.conftest import consume_llm_message_chunks
+
+
+@dataclasses.dataclass
+class Attempt:
+    delay: float = 0
+    error: Exception | None = None
+    started: bool = False
+    cancelled: bool = False
+    closed: bool = False
+
+
+@dataclasses.dataclass
+class ScriptedLLMClient(any_llm_client.LLMClient):
+    attempts: list[Attempt]
+    release_event: asyncio.Event | None = None
+    is_stream_empty: bool = False
+    calls_count: int = 0
+    is_entered: bool = False
+
+    async def _run_attempt(self) -> tuple[int, Attempt]:
+        attempt_index: typing.Final = self.calls_count
+        attempt: typing.Final = self.attempts[attempt_index]
+        self.calls_count += 1
+        attempt.started = True
+        if self.release_event and self.calls_count == len(self.attempts):
+            self.release_event.set()
+        try:
+            await asyncio.sleep(attempt.delay)
+            if self.release_event:
+                await self.release_event.wait()
+        except asyncio.CancelledError:
+            attempt.cancelled = True
+            raise
+        if attempt.error:
+            raise attempt.error
+        return attempt_index, attempt
+
+    async def request_llm_message(
+        self,
+        messages: str | list[any_llm_client.Message],  # noqa: ARG002
+        *,
+        temperature: float = LLMConfigValue(attr="temperature"),  # noqa: ARG002
+        extra: dict[str, typing.Any] | None = None,  # noqa: ARG002
+        timeout: float | None = None,  # noqa: ARG002
+    ) -> any_llm_client.LLMResponse:
+        attempt_index, _ = await self._run_attempt()
+        return any_llm_client.LLMResponse(content=str(attempt_index))
+
+    async def _iter_chunks(self, attempt_index: int) -> typing.AsyncIterable[any_llm_client.LLMResponse]:
+        for one_chunk in () if self.is_stream_empty else (str(attempt_index), "a", "b"):
+            yield any_llm_client.LLMResponse(content=one_chunk)
+
+    @contextlib.asynccontextmanager
+    async def stream_llm_message_chunks(
+        self,
+        messages: str | list[any_llm_client.Message],  # noqa: ARG002
+        *,
+        temperature: float = LLMConfigValue(attr="temperature"),  # noqa: ARG002
+        extra: dict[str, typing.Any] | None = None,  # noqa: ARG002
+        timeout: float | None = None,  # noqa: ARG002
+    ) -> typing.AsyncIterator[typing.AsyncIterable[any_llm_client.LLMResponse]]:
+        attempt_index, attempt = await self._run_attempt()
+        try:
+            yield self._iter_chunks(attempt_index)
+        finally:
+            attempt.closed = True
+
+    async def __aenter__(self) -> typing_extensions.Self:
+        self.is_entered = True
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: types.TracebackType | None,
+    ) -> None:
+        self.is_entered = False
+
+
+async def test_fast_request_is_not_hedged() -> None:
+    inner_client: typing.Final = ScriptedLLMClient([Attempt()])
+    client: typing.Final = any_llm_client.HedgedLLMClient(inner_client, hedge_delay=1)
+
+    assert await client.request_llm_message("Hi") == any_llm_client.LLMResponse(content="0")
+    assert client.stats == any_llm_client.HedgingStats(requests_count=1)
+
+
+@pytest.mark.parametrize("stream", [True, False])
+async def test_slow_request_is_hedged_and_cancelled(stream: bool) -> None:
+    attempts: typing.Final = [Attempt(delay=10), Attempt()]
+    client: typing.Final = any_llm_client.HedgedLLMClient(ScriptedLLMClient(attempts), hedge_delay=0.01)
+
+    if stream:
+        assert await consume_llm_message_chunks(client.stream_llm_message_chunks("Hi")) == [
+            any_llm_client.LLMResponse(content=one_chunk) for one_chunk in ("1", "a", "b")
+        ]
+        assert attempts[1].closed
+    else:
+        assert await client.request_llm_message("Hi") == any_llm_client.LLMResponse(content="1")
+    assert attempts[0].cancelled
+    assert client.stats == any_llm_client.HedgingStats(requests_count=1, hedged_requests_count=1, hedge_wins_count=1)
+
+
+async def test_hedged_request_goes_to_hedge_client() -> None:
+    hedge_client: typing.Final = ScriptedLLMClient([Attempt()])
+    client: typing.Final = any_llm_client.HedgedLLMClient(
+        ScriptedLLMClient([Attempt(delay=10)]), hedge_client=hedge_client, hedge_delay=0.01
+    )
+
+    assert await client.request_llm_message("Hi") == any_llm_client.LLMResponse(content="0")
+    assert hedge_client.calls_count == 1
+
+
+async def test_failed_request_is_not_hedged() -> None:
+    inner_client: typing.Final = ScriptedLLMClient([Attempt(error=any_llm_client.LLMError(b""))])
+    client: typing.Final = any_llm_client.HedgedLLMClient(inner_client, hedge_delay=1)
+
+    with pytest.raises(any_llm_client.LLMError):
+        await client.request_llm_message("Hi")
+    assert inner_client.calls_count == 1
+
+
+async def test_hedged_request_waits_for_other_attempt_when_one_fails() -> None:
+    attempts: typing.Final = [Attempt(delay=0.05), Attempt(delay=0.01, error=any_llm_client.LLMError(b""))]
+    client: typing.Final = any_llm_client.HedgedLLMClient(ScriptedLLMClient(attempts), hedge_delay=0.01)
+
+    assert await client.request_llm_message("Hi") == any_llm_client.LLMResponse(content="0")
+    assert client.stats == any_llm_client.HedgingStats(requests_count=1, hedged_requests_count=1)
+
+
+async def test_first_error_is_raised_when_all_attempts_fail() -> None:
+    first_error: typing.Final = any_llm_client.LLMError(b"first")
+    attempts: typing.Final = [Attempt(delay=0.02, error=first_error), Attempt(error=any_llm_client.LLMError(b""))]
+    client: typing.Final = any_llm_client.HedgedLLMClient(ScriptedLLMClient(attempts), hedge_delay=0.01)
+
+    with pytest.raises(any_llm_client.LLMError) as exc_info:
+        await client.request_llm_message("Hi")
+    assert exc_info.value is first_error
+
+
+async def test_loser_stream_that_opened_at_the_same_time_is_closed() -> None:
+    attempts: typing.Final = [Attempt(), Attempt()]
+    inner_client: typing.Final = ScriptedLLMClient(attempts, release_event=asyncio.Event())
+    client: typing.Final = any_llm_client.HedgedLLMClient(inner_client, hedge_delay=0.01)
+
+    async with client.stream_llm_message_chunks("Hi") as chunks:
+        assert [one_chunk.content async for one_chunk in chunks] == ["0", "a", "b"]
+        assert not attempts[0].closed
+        assert attempts[1].closed
+    assert attempts[0].closed
+
+
+async def test_empty_stream() -> None:
+    client: typing.Final = any_llm_client.HedgedLLMClient(
+        ScriptedLLMClient([Attempt()], is_stream_empty=True), hedge_delay=1
+    )
+
+    assert await consume_llm_message_chunks(client.stream_llm_message_chunks("Hi")) == []
+
+
+async def test_cancellation_cancels_all_attempts() -> None:
+    attempts: typing.Final = [Attempt(delay=10), Attempt(delay=10)]
+    client: typing.Final = any_llm_client.HedgedLLMClient(ScriptedLLMClient(attempts), hedge_delay=0.01)
+
+    request_task: typing.Final = asyncio.create_task(client.request_llm_message("Hi"))
+    await asyncio.sleep(0.05)
+    request_task.cancel()
+
+    with pytest.raises(asyncio.CancelledError):
+        await request_task
+    assert all(one_attempt.cancelled for one_attempt in attempts)
+
+
+async def test_hedge_delay_follows_observed_latency() -> None:
+    client: typing.Final = any_llm_client.HedgedLLMClient(
+        ScriptedLLMClient([Attempt(delay=0.001) for _ in range(5)]), initial_hedge_delay=1, min_latency_samples=5
+    )
+    for _ in range(4):
+        await client.request_llm_message("Hi")
+    assert client._get_hedge_delay(client._response_latencies) == 1  # noqa: SLF001
+
+    await client.request_llm_message("Hi")
+    assert 0.001 <= client._get_hedge_delay(client._response_latencies) < 0.5  # noqa: PLR2004, SLF001
+
+
+@pytest.mark.parametrize("latency_window_size", [0, 10])
+async def test_initial_hedge_delay_is_used_without_latency_samples(latency_window_size: int) -> None:
+    client: typing.Final = any_llm_client.HedgedLLMClient(
+        ScriptedLLMClient([Attempt()]),
+        initial_hedge_delay=1,
+        min_latency_samples=0,
+        latency_window_size=latency_window_size,
+    )
+    assert client._get_hedge_delay(client._response_latencies) == 1  # noqa: SLF001
+
+    assert await client.request_llm_message("Hi") == any_llm_client.LLMResponse(content="0")
+
+
+def test_latency_quantile_is_updated_periodically() -> None:
+    latencies: typing.Final = _LatencyWindow(size=100)
+    for one_latency in range(1, 11):
+        latencies.record(one_latency)
+    assert latencies.get_quantile(0.5) == 6  # noqa: PLR2004
+    assert latencies.get_quantile(0.95) == 6  # noqa: PLR2004
+
+    for _ in range(10):
+        latencies.record(100)
+    assert latencies.get_quantile(0.95) == 100  # noqa: PLR2004
+
+
+async def test_lifespan_enters_both_clients() -> None:
+    inner_client: typing.Final = ScriptedLLMClient([])
+    hedge_client: typing.Final = ScriptedLLMClient([])
+
+    async with any_llm_client.HedgedLLMClient(inner_client, hedge_client=hedge_client) as client:
+        assert inner_client.is_entered
+        assert hedge_client.is_entered
+        assert client._prepare_payload is None  # noqa: SLF001
+    assert not inner_client.is_entered
+    assert not hedge_client.is_entered
@@ -2,8 +2,10 @@ import copy
 import typing
 
 import httpx
+import pytest
 
-from any_llm_client.http import DEFAULT_HTTP_TIMEOUT, get_http_client_from_kwargs
+from any_llm_client.balancer import LoadBalancer, Replica
+from any_llm_client.http import DEFAULT_HTTP_TIMEOUT, RequestTemplate, get_http_client_from_kwargs, iter_byte_lines
 
 
 class TestGetHttpClientFromKwargs:
@@ -25,3 +27,37 @@ class TestGetHttpClientFromKwargs:
 
         assert client.timeout == timeout
         assert original_kwargs == passed_kwargs
+
+
+def test_request_template_is_merged_with_client_settings() -> None:
+    template: typing.Final = RequestTemplate.from_replicas(
+        LoadBalancer(replicas=[Replica(url="http://llm/v1/chat/completions")]), headers={"Authorization": "Bearer 1"}
+    )
+    client: typing.Final = get_http_client_from_kwargs({"headers": {"X-Client": "1"}})
+
+    request: typing.Final = template.build_request(client, b"{}", "http://llm/v1/chat/completions")
+
+    assert request.url == template.urls["http://llm/v1/chat/completions"]
+    assert request.content == b"{}"
+    assert request.headers["Authorization"] == "Bearer 1"
+    assert request.headers["Content-Type"] == "application/json"
+    assert request.headers["X-Client"] == "1"
+    assert request.extensions["timeout"] == DEFAULT_HTTP_TIMEOUT.as_dict()
+
+
+BYTE_LINES: typing.Final = b"first\r\n\rsecond line\n\r\nlast"
+
+
+@pytest.mark.parametrize("split_index", range(len(BYTE_LINES) + 1))
+async def test_byte_lines_are_split_whatever_chunk_boundaries(split_index: int) -> None:
+    async def iter_byte_chunks() -> typing.AsyncIterator[bytes]:
+        yield BYTE_LINES[:split_index]
+        yield BYTE_LINES[split_index:]
+
+    assert [one_line async for one_line in iter_byte_lines(iter_byte_chunks())] == [
+        b"first",
+        b"",
+        b"second line",
+        b"",
+        b"last",
+    ]
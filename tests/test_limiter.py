@@ -0,0 +1,269 @@
+import asyncio
+import typing
+
+import httpx
+import pytest
+from polyfactory.factories.pydantic_factory import ModelFactory
+
+import any_llm_client
+from tests.conftest import LLMFuncRequestFactory, consume_llm_message_chunks
+from tests.test_balancer import make_response
+from tests.test_deadline import make_client
+
+
+class MockLLMConfigFactory(ModelFactory[any_llm_client.MockLLMConfig]): ...
+
+
+async def wait_until_queued(limiter: any_llm_client.ConcurrencyLimiter, queue_depth: int) -> None:
+    for _ in range(100):  # pragma: no branch
+        if limiter.stats.queue_depth == queue_depth:
+            return
+        await asyncio.sleep(0)
+    raise AssertionError  # pragma: no cover
+
+
+class TestConcurrencyLimiter:
+    async def test_queued_requests_are_ordered_by_priority(self) -> None:
+        limiter: typing.Final = any_llm_client.ConcurrencyLimiter(max_in_flight=1)
+        acquired_order: typing.Final[list[str]] = []
+
+        async def acquire(name: str, priority: any_llm_client.RequestPriority) -> None:
+            async with limiter.acquire(priority):
+                acquired_order.append(name)
+
+        async with limiter.acquire():
+            tasks: typing.Final = [
+                asyncio.create_task(acquire("batch-1", any_llm_client.RequestPriority.batch)),
+                asyncio.create_task(acquire("interactive-1", any_llm_client.RequestPriority.interactive)),
+                asyncio.create_task(acquire("batch-2", any_llm_client.RequestPriority.batch)),
+                asyncio.create_task(acquire("interactive-2", any_llm_client.RequestPriority.interactive)),
+            ]
+            await wait_until_queued(limiter, 4)
+            assert limiter.stats.in_flight == 1
+
+        await asyncio.gather(*tasks)
+
+        assert acquired_order == ["interactive-1", "interactive-2", "batch-1", "batch-2"]
+        assert limiter.stats.in_flight == 0
+        assert limiter.stats.queue_depth == 0
+        assert limiter.stats.max_queue_depth == 4  # noqa: PLR2004
+        assert limiter.stats.acquired_count == 5  # noqa: PLR2004
+        assert limiter.stats.max_wait_time > 0
+
+    async def test_queue_timeout(self) -> None:
+        limiter: typing.Final = any_llm_client.ConcurrencyLimiter(max_in_flight=1, queue_timeout=0.01)
+
+        async with limiter.acquire():
+            with pytest.raises(any_llm_client.LLMQueueTimeoutError):
+                async with limiter.acquire():
+                    pass  # pragma: no cover
+
+        assert limiter.stats.timed_out_count == 1
+        assert limiter.stats.acquired_count == 1
+        assert limiter.stats.in_flight == limiter.stats.queue_depth == 0
+
+    async def test_waiter_woken_up_on_timeout_releases_slot(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        limiter: typing.Final = any_llm_client.ConcurrencyLimiter(max_in_flight=1, queue_timeout=1)
+        original_wait_for: typing.Final = asyncio.wait_for
+
+        async def wait_for_woken_up_on_timeout(waiter: asyncio.Future[None], timeout: float | None) -> None:
+            await original_wait_for(asyncio.shield(waiter), timeout)
+            raise asyncio.TimeoutError
+
+        monkeypatch.setattr("any_llm_client.limiter.asyncio.wait_for", wait_for_woken_up_on_timeout)
+
+        async def acquire() -> None:
+            async with limiter.acquire():
+                pass  # pragma: no cover
+
+        async with limiter.acquire():
+            task: typing.Final = asyncio.create_task(acquire())
+            await wait_until_queued(limiter, 1)
+
+        with pytest.raises(any_llm_client.LLMQueueTimeoutError):
+            await task
+        assert limiter.stats.in_flight == 0
+        assert limiter.stats.timed_out_count == 1
+
+    async def test_cancelled_waiter_gives_up_its_place(self) -> None:
+        limiter: typing.Final = any_llm_client.ConcurrencyLimiter(max_in_flight=1)
+
+        async def acquire() -> None:
+            async with limiter.acquire():
+                pass
+
+        async with limiter.acquire():
+            cancelled_task: typing.Final = asyncio.create_task(acquire())
+            waiting_task: typing.Final = asyncio.create_task(acquire())
+            await wait_until_queued(limiter, 2)
+            cancelled_task.cancel()
+            await asyncio.sleep(0)
+
+        await waiting_task
+        assert cancelled_task.cancelled()
+        assert limiter.stats.in_flight == 0
+        assert limiter.stats.queue_depth == 0
+
+    async def test_waiter_cancelled_after_wake_up_releases_slot(self) -> None:
+        limiter: typing.Final = any_llm_client.ConcurrencyLimiter(max_in_flight=1)
+
+        async def acquire() -> None:
+            async with limiter.acquire():
+                pass  # pragma: no cover
+
+        async with limiter.acquire():
+            task: typing.Final = asyncio.create_task(acquire())
+            await wait_until_queued(limiter, 1)
+        task.cancel()
+
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert limiter.stats.in_flight == 0
+
+
+class TestConcurrencyLimitedLLMClient:
+    @pytest.mark.parametrize("stream", [True, False])
+    async def test_ok(self, stream: bool) -> None:
+        config: typing.Final = MockLLMConfigFactory.build()
+        limiter: typing.Final = any_llm_client.ConcurrencyLimiter(max_in_flight=1)
+
+        async with any_llm_client.ConcurrencyLimitedLLMClient(
+            any_llm_client.get_client(config), limiter=limiter, priority=any_llm_client.RequestPriority.batch
+        ) as client:
+            assert client._prepare_payload is None  # noqa: SLF001
+            if stream:
+                async with client.stream_llm_message_chunks(**LLMFuncRequestFactory.build()) as response_chunks:
+                    assert limiter.stats.in_flight == 1
+                    assert [one_chunk async for one_chunk in response_chunks] == config.stream_messages
+            else:
+                assert await client.request_llm_message(**LLMFuncRequestFactory.build()) == config.response_message
+
+        assert limiter.stats.in_flight == 0
+        assert limiter.stats.acquired_count == 1
+
+    async def test_limits_concurrency(self) -> None:
+        config: typing.Final = MockLLMConfigFactory.build()
+        limiter: typing.Final = any_llm_client.ConcurrencyLimiter(max_in_flight=2)
+        client: typing.Final = any_llm_client.ConcurrencyLimitedLLMClient(
+            any_llm_client.get_client(config), limiter=limiter
+        )
+
+        await asyncio.gather(
+            *(consume_llm_message_chunks(client.stream_llm_message_chunks("Hi")) for _ in range(5)),
+            *(client.request_llm_message("Hi") for _ in range(5)),
+        )
+
+        assert limiter.stats.acquired_count == 10  # noqa: PLR2004
+        assert limiter.stats.in_flight == 0
+
+
+URL: typing.Final = "http://llm/v1/chat/completions"
+
+
+class TestAdaptiveConcurrencyLimiter:
+    async def test_limit_grows_while_latency_is_flat(self) -> None:
+        limiter: typing.Final = any_llm_client.AdaptiveConcurrencyLimiter(initial_limit=4)
+        for _ in range(4):
+            await limiter.acquire(URL)
+
+        for _ in range(20):
+            limiter.record_latency(URL, 1.0)
+        assert limiter.get_limit(URL) > 4  # noqa: PLR2004
+
+    async def test_limit_does_not_grow_when_not_used(self) -> None:
+        limiter: typing.Final = any_llm_client.AdaptiveConcurrencyLimiter(initial_limit=4)
+        await limiter.acquire(URL)
+
+        for _ in range(20):
+            limiter.record_latency(URL, 1.0)
+        assert limiter.get_limit(URL) == 4  # noqa: PLR2004
+
+    async def test_limit_shrinks_when_latency_rises(self) -> None:
+        limiter: typing.Final = any_llm_client.AdaptiveConcurrencyLimiter(initial_limit=16)
+        for _ in range(16):
+            await limiter.acquire(URL)
+        for _ in range(10):
+            limiter.record_latency(URL, 1.0)
+        limit_with_flat_latency: typing.Final = limiter.get_limit(URL)
+
+        for _ in range(10):
+            limiter.record_latency(URL, 10.0)
+        assert limiter.get_limit(URL) < limit_with_flat_latency
+
+        long_latency: typing.Final = limiter._get_backend(URL).long_latency  # noqa: SLF001
+        limiter.record_latency(URL, 0.1)
+        assert limiter._get_backend(URL).long_latency < long_latency * 0.95  # type: ignore[operator]  # noqa: SLF001
+
+    def test_limit_backs_off_on_overload(self) -> None:
+        limiter: typing.Final = any_llm_client.AdaptiveConcurrencyLimiter(initial_limit=10, min_limit=8)
+        limiter.record_response(URL, status_code=503, latency=1)
+        assert limiter.get_limit(URL) == 9  # noqa: PLR2004
+
+        for _ in range(5):
+            limiter.record_response(URL, status_code=429, latency=1)
+        limiter.record_response(URL, status_code=500, latency=1)
+        assert limiter.get_limit(URL) == 8  # noqa: PLR2004
+        assert limiter.get_limit("http://other-llm/v1/chat/completions") == 10  # noqa: PLR2004
+
+    async def test_excess_requests_wait_for_free_slot(self) -> None:
+        limiter: typing.Final = any_llm_client.AdaptiveConcurrencyLimiter(initial_limit=1)
+        await limiter.acquire(URL)
+        cancelled_task: typing.Final = asyncio.create_task(limiter.acquire(URL))
+        waiting_task: typing.Final = asyncio.create_task(limiter.acquire(URL))
+        await asyncio.sleep(0)
+        cancelled_task.cancel()
+        await asyncio.sleep(0)
+        assert not waiting_task.done()
+
+        limiter.release(URL)
+        await waiting_task
+        # Cancelled after wake-up
+        woken_up_task: typing.Final = asyncio.create_task(limiter.acquire(URL))
+        await asyncio.sleep(0)
+        limiter.release(URL)
+        woken_up_task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await woken_up_task
+        await limiter.acquire(URL)
+
+    async def test_client_reports_latency_and_overload(self) -> None:
+        limiter: typing.Final = any_llm_client.AdaptiveConcurrencyLimiter(initial_limit=2)
+        responses: typing.Final = iter([make_response(), httpx.Response(503)])
+
+        def handle_request(_: httpx.Request) -> httpx.Response:
+            assert limiter._get_backend(URL).in_flight_count == 1  # noqa: SLF001
+            return next(responses)
+
+        client: typing.Final = make_client(handle_request, concurrency_limiter=limiter)
+        await client.request_llm_message("Hi")
+        assert limiter._get_backend(URL).long_latency is not None  # noqa: SLF001
+
+        with pytest.raises(any_llm_client.LLMError):
+            await client.request_llm_message("Hi")
+        assert limiter.get_limit(URL) == 1
+        assert limiter._get_backend(URL).in_flight_count == 0  # noqa: SLF001
+
+    async def test_client_timeout_is_overload(self) -> None:
+        def handle_request(request: httpx.Request) -> httpx.Response:
+            raise httpx.ReadTimeout("timed out", request=request)
+
+        limiter: typing.Final = any_llm_client.AdaptiveConcurrencyLimiter(initial_limit=2)
+        client: typing.Final = make_client(handle_request, concurrency_limiter=limiter)
+
+        with pytest.raises(httpx.ReadTimeout):
+            await client.request_llm_message("Hi")
+        assert limiter.get_limit(URL) == 1
+
+    async def test_stream_holds_slot_until_closed(self) -> None:
+        limiter: typing.Final = any_llm_client.AdaptiveConcurrencyLimiter(initial_limit=1)
+        client: typing.Final = make_client(
+            lambda _: httpx.Response(200, headers={"Content-Type": "text/event-stream"}, content=b"data: [DONE]\n\n"),
+            concurrency_limiter=limiter,
+        )
+
+        async with client.stream_llm_message_chunks("Hi") as chunks:
+            assert [one_chunk async for one_chunk in chunks] == []
+            acquire_task = asyncio.create_task(limiter.acquire(URL))
+            await asyncio.sleep(0)
+            assert not acquire_task.done()
+        await acquire_task
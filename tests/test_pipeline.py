@@ -0,0 +1,159 @@
+import asyncio
+import contextlib
+import json
+import typing
+
+import httpx
+import pytest
+from polyfactory.factories.pydantic_factory import ModelFactory
+
+import any_llm_client
+from any_llm_client.clients.openai import (
+    ChatCompletionsNotStreamingResponse,
+    OneNotStreamingChoice,
+    OneNotStreamingChoiceMessage,
+)
+
+
+class OpenAIConfigFactory(ModelFactory[any_llm_client.OpenAIConfig]): ...
+
+
+class EchoTransport(httpx.AsyncBaseTransport):
+    def __init__(self) -> None:
+        self.unblocked_prompts: dict[str, asyncio.Event] = {}
+        self.in_flight_count = 0
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        prompt: typing.Final = json.loads(request.content)["messages"][0]["content"]
+        self.in_flight_count += 1
+        try:
+            if prompt in self.unblocked_prompts:
+                await self.unblocked_prompts[prompt].wait()
+            await asyncio.sleep(0)
+        finally:
+            self.in_flight_count -= 1
+
+        if prompt == "fail":
+            return httpx.Response(400)
+        return httpx.Response(
+            200,
+            json=ChatCompletionsNotStreamingResponse(
+                choices=[
+                    OneNotStreamingChoice(
+                        message=OneNotStreamingChoiceMessage(role=any_llm_client.MessageRole.assistant, content=prompt)
+                    ),
+                ],
+            ).model_dump(mode="json"),
+        )
+
+
+async def test_ordered_results() -> None:
+    client: typing.Final = any_llm_client.OpenAIClient(OpenAIConfigFactory.build(), transport=EchoTransport())
+    rows: typing.Final = [{"id": one_index, "prompt": str(one_index)} for one_index in range(10)]
+    rows[3]["prompt"] = "fail"
+
+    results: typing.Final = [
+        one_result
+        async for one_result in any_llm_client.map_llm_messages(
+            client, rows, get_messages=lambda row: str(row["prompt"]), max_concurrency=3
+        )
+    ]
+
+    assert [one_row for one_row, _ in results] == rows
+    assert isinstance(results[3][1], any_llm_client.LLMError)
+    assert [one_response for _, one_response in results[4:]] == [
+        any_llm_client.LLMResponse(content=str(one_index)) for one_index in range(4, 10)
+    ]
+
+
+async def test_unordered_results() -> None:
+    transport: typing.Final = EchoTransport()
+    slow_prompt_unblocked: typing.Final = asyncio.Event()
+    transport.unblocked_prompts["slow"] = slow_prompt_unblocked
+    client: typing.Final = any_llm_client.OpenAIClient(OpenAIConfigFactory.build(), transport=transport)
+
+    finished_prompts: typing.Final[list[str]] = []
+    async for one_prompt, _ in any_llm_client.map_llm_messages(client, ["slow", "a", "b"], ordered=False):
+        finished_prompts.append(one_prompt)
+        if len(finished_prompts) == 2:  # noqa: PLR2004
+            slow_prompt_unblocked.set()
+
+    assert finished_prompts == ["a", "b", "slow"]
+
+
+class IncomparablePrompt:
+    def __init__(self, prompt: str) -> None:
+        self.prompt = prompt
+
+    def __eq__(self, other: object) -> bool:
+        raise NotImplementedError
+
+    __hash__ = None  # type: ignore[assignment]
+
+
+async def test_unordered_results_are_found_by_identity() -> None:
+    transport: typing.Final = EchoTransport()
+    transport.unblocked_prompts["slow"] = asyncio.Event()
+    client: typing.Final = any_llm_client.OpenAIClient(OpenAIConfigFactory.build(), transport=transport)
+    items: typing.Final = [IncomparablePrompt("slow"), IncomparablePrompt("a")]
+
+    finished_items: typing.Final[list[IncomparablePrompt]] = []
+    async for one_item, _ in any_llm_client.map_llm_messages(
+        client, items, get_messages=lambda item: item.prompt, ordered=False
+    ):
+        finished_items.append(one_item)
+        transport.unblocked_prompts["slow"].set()
+
+    assert [one_item.prompt for one_item in finished_items] == ["a", "slow"]
+    with pytest.raises(NotImplementedError):
+        assert items[0] != items[1]
+
+
+async def test_source_is_not_read_ahead() -> None:
+    client: typing.Final = any_llm_client.OpenAIClient(OpenAIConfigFactory.build(), transport=EchoTransport())
+    read_count = 0
+
+    async def iter_prompts() -> typing.AsyncIterator[str]:
+        nonlocal read_count
+        for one_index in range(100):
+            read_count += 1
+            yield str(one_index)
+
+    yielded_count = 0
+    async for _ in any_llm_client.map_llm_messages(client, iter_prompts(), max_concurrency=4):
+        yielded_count += 1
+        assert read_count <= yielded_count + 4
+
+    assert yielded_count == 100  # noqa: PLR2004
+
+
+async def test_closing_cancels_requests_in_flight() -> None:
+    transport: typing.Final = EchoTransport()
+    transport.unblocked_prompts = {str(one_index): asyncio.Event() for one_index in range(1, 10)}
+    client: typing.Final = any_llm_client.OpenAIClient(OpenAIConfigFactory.build(), transport=transport)
+
+    async with contextlib.aclosing(
+        any_llm_client.map_llm_messages(client, [str(one_index) for one_index in range(10)], max_concurrency=4)
+    ) as results:
+        async for one_prompt, _ in results:
+            assert one_prompt == "0"
+            assert transport.in_flight_count == 3  # noqa: PLR2004
+            break
+
+    assert transport.in_flight_count == 0
+
+
+@pytest.mark.parametrize("ordered", [True, False])
+async def test_empty_source(ordered: bool) -> None:
+    client: typing.Final = any_llm_client.OpenAIClient(OpenAIConfigFactory.build(), transport=EchoTransport())
+    prompts: typing.Final[list[str]] = []
+
+    assert [one_result async for one_result in any_llm_client.map_llm_messages(client, prompts, ordered=ordered)] == []
+
+
+@pytest.mark.parametrize("max_concurrency", [0, -1])
+async def test_invalid_max_concurrency(max_concurrency: int) -> None:
+    client: typing.Final = any_llm_client.OpenAIClient(OpenAIConfigFactory.build(), transport=EchoTransport())
+
+    with pytest.raises(ValueError, match="`max_concurrency` must be at least 1"):
+        await anext(any_llm_client.map_llm_messages(client, ["a"], max_concurrency=max_concurrency))
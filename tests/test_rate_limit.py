@@ -0,0 +1,253 @@
+import asyncio
+import datetime
+import email.utils
+import typing
+
+import httpx
+import pytest
+from polyfactory.factories.pydantic_factory import ModelFactory
+
+import any_llm_client
+from any_llm_client.clients.openai import (
+    ChatCompletionsNotStreamingResponse,
+    ChatCompletionsUsage,
+    OneNotStreamingChoice,
+    OneNotStreamingChoiceMessage,
+)
+from any_llm_client.clients.yandexgpt import (
+    YandexGPTAlternative,
+    YandexGPTMessage,
+    YandexGPTResponse,
+    YandexGPTResult,
+    YandexGPTUsage,
+)
+from any_llm_client.rate_limit import parse_retry_after
+from tests.conftest import consume_llm_message_chunks
+
+
+class OpenAIConfigFactory(ModelFactory[any_llm_client.OpenAIConfig]): ...
+
+
+class YandexGPTConfigFactory(ModelFactory[any_llm_client.YandexGPTConfig]): ...
+
+
+class FakeClock:
+    def __init__(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        self.now = 1000.0
+        self.sleeps: list[float] = []
+        original_sleep: typing.Final = asyncio.sleep
+
+        async def sleep(seconds: float) -> None:
+            self.sleeps.append(seconds)
+            self.now += seconds
+            await original_sleep(0)
+
+        monkeypatch.setattr("time.monotonic", lambda: self.now)
+        monkeypatch.setattr("any_llm_client.rate_limit.asyncio.sleep", sleep)
+
+
+@pytest.fixture
+def fake_clock(monkeypatch: pytest.MonkeyPatch) -> FakeClock:
+    return FakeClock(monkeypatch)
+
+
+class TestRateLimiter:
+    async def test_requests_per_minute(self, fake_clock: FakeClock) -> None:
+        rate_limiter: typing.Final = any_llm_client.RateLimiter(requests_per_minute=2)
+
+        for _ in range(4):
+            await rate_limiter.acquire()
+
+        assert fake_clock.sleeps == [30.0, 30.0]
+
+    async def test_tokens_per_minute(self, fake_clock: FakeClock) -> None:
+        rate_limiter: typing.Final = any_llm_client.RateLimiter(tokens_per_minute=600)
+
+        await rate_limiter.acquire(500)
+        await rate_limiter.acquire(200)
+        await rate_limiter.acquire(1000)
+
+        assert fake_clock.sleeps == [10.0, 60.0]
+
+    async def test_blocks_after_too_many_requests(self, fake_clock: FakeClock) -> None:
+        rate_limiter: typing.Final = any_llm_client.RateLimiter()
+
+        rate_limiter.observe_response(httpx.Response(429, headers={"Retry-After": "7"}))
+        await rate_limiter.acquire()
+        rate_limiter.observe_response(httpx.Response(429, headers={"x-ratelimit-reset-requests": "1m30s"}))
+        await rate_limiter.acquire()
+        rate_limiter.observe_response(httpx.Response(429))
+        await rate_limiter.acquire()
+
+        assert fake_clock.sleeps == [7.0, 90.0, 1.0]
+
+    async def test_syncs_with_remaining_quota_headers(self, fake_clock: FakeClock) -> None:
+        rate_limiter: typing.Final = any_llm_client.RateLimiter(requests_per_minute=60, tokens_per_minute=6000)
+
+        rate_limiter.observe_response(
+            httpx.Response(
+                200,
+                headers={
+                    "x-ratelimit-remaining-requests": "0",
+                    "x-ratelimit-reset-requests": "20ms",
+                    "x-ratelimit-remaining-tokens": "100",
+                    "x-ratelimit-reset-tokens": "invalid",
+                },
+            )
+        )
+        await rate_limiter.acquire(100)
+        await rate_limiter.acquire(100)
+
+        assert fake_clock.sleeps == [pytest.approx(1.0), pytest.approx(1.0)]
+
+    def test_estimate_tokens(self) -> None:
+        payload: typing.Final = {"messages": [{"role": "user", "content": "a" * 400}]}
+
+        assert any_llm_client.RateLimiter().estimate_tokens(payload, max_output_tokens=100) == 0
+        assert any_llm_client.RateLimiter(tokens_per_minute=1).estimate_tokens(payload, max_output_tokens=100) == 201  # noqa: PLR2004
+
+    def test_estimate_tokens_does_not_count_image_data_as_text(self) -> None:
+        payload: typing.Final = {
+            "messages": [
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "text", "text": "a" * 40},
+                        {"type": "image_url", "image_url": {"url": "data:image/jpeg;base64," + "a" * 100_000}},
+                    ],
+                    "name": None,
+                }
+            ]
+        }
+
+        assert (
+            any_llm_client.RateLimiter(tokens_per_minute=1).estimate_tokens(payload, max_output_tokens=None)
+            == 12 + any_llm_client.rate_limit.TOKENS_PER_IMAGE
+        )
+
+    async def test_record_usage_returns_unused_tokens(self, fake_clock: FakeClock) -> None:
+        rate_limiter: typing.Final = any_llm_client.RateLimiter(tokens_per_minute=1000)
+
+        await rate_limiter.acquire(800)
+        rate_limiter.record_usage(estimated_tokens=800, used_tokens=100)
+        await rate_limiter.acquire(800)
+        rate_limiter.record_usage(estimated_tokens=800, used_tokens=None)
+        await rate_limiter.acquire(800)
+
+        assert fake_clock.sleeps == [pytest.approx(42.0)]
+        any_llm_client.RateLimiter().record_usage(estimated_tokens=0, used_tokens=100)
+
+
+@pytest.mark.parametrize(
+    ("header_value", "expected_result"),
+    [
+        (None, None),
+        ("12", 12.0),
+        ("-1", 0.0),
+        ("invalid", None),
+        (email.utils.format_datetime(datetime.datetime(2000, 1, 1, tzinfo=datetime.timezone.utc)), 0.0),
+        ("Sat, 01 Jan 2000 00:00:00 -0000", 0.0),
+    ],
+)
+def test_parse_retry_after(header_value: str | None, expected_result: float | None) -> None:
+    headers: typing.Final = {} if header_value is None else {"Retry-After": header_value}
+    assert parse_retry_after(httpx.Response(429, headers=headers)) == expected_result
+
+
+async def request_llm_message(client: any_llm_client.LLMClient, *, stream: bool) -> None:
+    if stream:
+        await consume_llm_message_chunks(client.stream_llm_message_chunks("Hi"))
+    else:
+        await client.request_llm_message("Hi")
+
+
+@pytest.mark.parametrize("stream", [True, False])
+@pytest.mark.parametrize("config", [OpenAIConfigFactory.build(), YandexGPTConfigFactory.build()])
+async def test_clients_use_rate_limiter(
+    fake_clock: FakeClock, stream: bool, config: any_llm_client.AnyLLMConfig
+) -> None:
+    response: typing.Final = httpx.Response(
+        429, headers={"Retry-After": "3", "x-ratelimit-remaining-tokens": "x", "x-ratelimit-remaining-requests": "-"}
+    )
+    rate_limiter: typing.Final = any_llm_client.RateLimiter(requests_per_minute=1, tokens_per_minute=100_000)
+    client: typing.Final = any_llm_client.get_client(
+        config, rate_limiter=rate_limiter, transport=httpx.MockTransport(lambda _: response)
+    )
+
+    for _ in range(2):
+        with pytest.raises(any_llm_client.LLMError):
+            await request_llm_message(client, stream=stream)
+
+    assert fake_clock.sleeps == [60.0]
+
+
+async def test_openai_client_estimates_max_output_tokens(fake_clock: FakeClock) -> None:
+    response: typing.Final = httpx.Response(
+        200,
+        json=ChatCompletionsNotStreamingResponse(
+            choices=[
+                OneNotStreamingChoice(
+                    message=OneNotStreamingChoiceMessage(role=any_llm_client.MessageRole.assistant, content="Hi")
+                ),
+            ],
+        ).model_dump(mode="json"),
+    )
+    client: typing.Final = any_llm_client.get_client(
+        OpenAIConfigFactory.build(request_extra={"max_tokens": 600}),
+        rate_limiter=any_llm_client.RateLimiter(tokens_per_minute=1202),
+        transport=httpx.MockTransport(lambda _: response),
+    )
+
+    for _ in range(3):
+        await client.request_llm_message("Hi")
+
+    assert fake_clock.sleeps == [pytest.approx(30.0)]
+
+
+async def test_openai_client_corrects_estimate_with_usage(fake_clock: FakeClock) -> None:
+    response: typing.Final = httpx.Response(
+        200,
+        json=ChatCompletionsNotStreamingResponse(
+            choices=[
+                OneNotStreamingChoice(
+                    message=OneNotStreamingChoiceMessage(role=any_llm_client.MessageRole.assistant, content="Hi")
+                ),
+            ],
+            usage=ChatCompletionsUsage(total_tokens=10),
+        ).model_dump(mode="json"),
+    )
+    client: typing.Final = any_llm_client.get_client(
+        OpenAIConfigFactory.build(request_extra={"max_tokens": 600}),
+        rate_limiter=any_llm_client.RateLimiter(tokens_per_minute=1200),
+        transport=httpx.MockTransport(lambda _: response),
+    )
+
+    for _ in range(5):
+        await client.request_llm_message("Hi")
+
+    assert fake_clock.sleeps == []
+
+
+@pytest.mark.parametrize("stream", [True, False])
+async def test_yandexgpt_client_corrects_estimate_with_usage(fake_clock: FakeClock, stream: bool) -> None:
+    response_content: typing.Final = (
+        YandexGPTResponse(
+            result=YandexGPTResult(
+                alternatives=[
+                    YandexGPTAlternative(message=YandexGPTMessage(role=any_llm_client.MessageRole.assistant, text="Hi"))
+                ],
+                usage=YandexGPTUsage(totalTokens=10),
+            )
+        ).model_dump_json(by_alias=True)
+        + "\n"
+    )
+    client: typing.Final = any_llm_client.get_client(
+        YandexGPTConfigFactory.build(max_tokens=1000),
+        rate_limiter=any_llm_client.RateLimiter(tokens_per_minute=1200),
+        transport=httpx.MockTransport(lambda _: httpx.Response(200, content=response_content)),
+    )
+
+    for _ in range(5):
+        await request_llm_message(client, stream=stream)
+
+    assert fake_clock.sleeps == []
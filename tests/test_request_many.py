@@ -0,0 +1,124 @@
+import asyncio
+import json
+import typing
+
+import httpx
+import pytest
+from polyfactory.factories.pydantic_factory import ModelFactory
+
+import any_llm_client
+from any_llm_client.clients.openai import (
+    ChatCompletionsNotStreamingResponse,
+    OneNotStreamingChoice,
+    OneNotStreamingChoiceMessage,
+)
+
+
+class OpenAIConfigFactory(ModelFactory[any_llm_client.OpenAIConfig]): ...
+
+
+class MockLLMConfigFactory(ModelFactory[any_llm_client.MockLLMConfig]): ...
+
+
+class EchoTransport(httpx.AsyncBaseTransport):
+    def __init__(self, *, block: bool = False) -> None:
+        self.block = block
+        self.in_flight_count = 0
+        self.max_in_flight_count = 0
+        self.cancelled_count = 0
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.in_flight_count += 1
+        self.max_in_flight_count = max(self.max_in_flight_count, self.in_flight_count)
+        try:
+            await asyncio.sleep(0)
+            if self.block:
+                await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            self.cancelled_count += 1
+            raise
+        finally:
+            self.in_flight_count -= 1
+
+        prompt: typing.Final = json.loads(request.content)["messages"][0]["content"]
+        if prompt == "fail":
+            return httpx.Response(400)
+        return httpx.Response(
+            200,
+            json=ChatCompletionsNotStreamingResponse(
+                choices=[
+                    OneNotStreamingChoice(
+                        message=OneNotStreamingChoiceMessage(role=any_llm_client.MessageRole.assistant, content=prompt)
+                    ),
+                ],
+            ).model_dump(mode="json"),
+        )
+
+
+async def test_results_are_ordered_and_errors_are_returned() -> None:
+    transport: typing.Final = EchoTransport()
+    client: typing.Final = any_llm_client.OpenAIClient(OpenAIConfigFactory.build(), transport=transport)
+    progress: typing.Final[list[tuple[int, int]]] = []
+    prompts: typing.Final = [str(one_index) for one_index in range(20)]
+    prompts[7] = "fail"
+
+    results: typing.Final = await client.request_llm_messages_many(
+        prompts, max_concurrency=3, on_progress=lambda *args: progress.append(args)
+    )
+
+    assert results[:7] == [any_llm_client.LLMResponse(content=str(one_index)) for one_index in range(7)]
+    assert isinstance(results[7], any_llm_client.LLMError)
+    assert results[8:] == [any_llm_client.LLMResponse(content=str(one_index)) for one_index in range(8, 20)]
+    assert transport.max_in_flight_count == 3  # noqa: PLR2004
+    assert progress == [(one_finished_count, 20) for one_finished_count in range(1, 21)]
+
+
+async def test_empty_batch() -> None:
+    client: typing.Final = any_llm_client.get_client(MockLLMConfigFactory.build())
+
+    assert await client.request_llm_messages_many([]) == []
+
+
+async def test_cancellation_cancels_in_flight_requests() -> None:
+    transport: typing.Final = EchoTransport(block=True)
+    client: typing.Final = any_llm_client.OpenAIClient(OpenAIConfigFactory.build(), transport=transport)
+
+    batch_task: typing.Final = asyncio.create_task(client.request_llm_messages_many(["Hi"] * 10, max_concurrency=4))
+    await asyncio.sleep(0.01)
+    assert transport.in_flight_count == 4  # noqa: PLR2004
+    batch_task.cancel()
+
+    with pytest.raises(asyncio.CancelledError):
+        await batch_task
+    assert transport.in_flight_count == 0
+    assert transport.cancelled_count == 4  # noqa: PLR2004
+
+
+async def test_progress_callback_error_stops_batch() -> None:
+    transport: typing.Final = EchoTransport()
+    client: typing.Final = any_llm_client.OpenAIClient(OpenAIConfigFactory.build(), transport=transport)
+
+    def fail_on_progress(_finished_count: int, _total_count: int) -> None:
+        raise RuntimeError
+
+    with pytest.raises(RuntimeError):
+        await client.request_llm_messages_many(["Hi"] * 10, max_concurrency=4, on_progress=fail_on_progress)
+    assert transport.in_flight_count == 0
+
+
+@pytest.mark.parametrize("messages_list", [[], ["Hi"]])
+async def test_zero_concurrency_is_rejected(messages_list: list[str]) -> None:
+    client: typing.Final = any_llm_client.get_client(MockLLMConfigFactory.build())
+
+    with pytest.raises(ValueError, match="`max_concurrency` must be at least 1"):
+        await client.request_llm_messages_many(messages_list, max_concurrency=0)
+
+
+async def test_timeout_limits_each_request() -> None:
+    transport: typing.Final = EchoTransport(block=True)
+    client: typing.Final = any_llm_client.OpenAIClient(OpenAIConfigFactory.build(), transport=transport)
+
+    results: typing.Final = await client.request_llm_messages_many(["Hi"] * 3, max_concurrency=2, timeout=0.01)
+
+    assert results == [any_llm_client.LLMRequestTimeoutError(timeout=0.01)] * 3
+    assert transport.cancelled_count == 3  # noqa: PLR2004
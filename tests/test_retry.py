@@ -0,0 +1,180 @@
+import dataclasses
+import datetime
+import json
+import typing
+
+import httpx
+import pytest
+import stamina
+from polyfactory.factories.pydantic_factory import ModelFactory
+
+import any_llm_client
+from tests.conftest import consume_llm_message_chunks
+
+
+class OpenAIConfigFactory(ModelFactory[any_llm_client.OpenAIConfig]): ...
+
+
+class YandexGPTConfigFactory(ModelFactory[any_llm_client.YandexGPTConfig]): ...
+
+
+async def request_llm_message(client: any_llm_client.LLMClient, *, stream: bool) -> None:
+    if stream:
+        await consume_llm_message_chunks(client.stream_llm_message_chunks("Hi"))
+    else:
+        await client.request_llm_message("Hi")
+
+
+def make_status_error(status_code: int, headers: dict[str, str] | None = None) -> httpx.HTTPStatusError:
+    request: typing.Final = httpx.Request("POST", "http://localhost")
+    return httpx.HTTPStatusError(
+        "", request=request, response=httpx.Response(status_code, headers=headers, request=request)
+    )
+
+
+@pytest.fixture
+def _activate_retries() -> typing.Iterator[None]:
+    stamina.set_active(True)
+    with stamina.set_testing(True, attempts=3, cap=True):
+        yield
+    stamina.set_active(False)
+
+
+@pytest.mark.parametrize(
+    ("exception", "expected_result"),
+    [
+        (make_status_error(400), False),
+        (make_status_error(404), False),
+        (make_status_error(408), True),
+        (make_status_error(429), True),
+        (make_status_error(500), True),
+        (make_status_error(503), True),
+        (make_status_error(429, {"Retry-After": "2"}), 2.0),
+        (make_status_error(503, {"Retry-After": "120"}), False),
+        (httpx.ConnectError(""), True),
+        (httpx.ReadTimeout(""), True),
+        (httpx.TooManyRedirects(""), False),
+        (any_llm_client.LLMStreamTimeoutError(timeout=1, chunks_count=0), True),
+        (ValueError(), False),
+    ],
+)
+def test_default_backoff(exception: Exception, expected_result: bool | float) -> None:
+    assert any_llm_client.RequestRetryConfig().get_backoff(exception) == expected_result
+
+
+def test_configured_backoff() -> None:
+    request_retry: typing.Final = any_llm_client.RequestRetryConfig(
+        retry_status_codes=frozenset({409}),
+        retry_server_errors=False,
+        max_retry_after=datetime.timedelta(minutes=5),
+    )
+
+    assert request_retry.get_backoff(make_status_error(409, {"Retry-After": "120"})) == 120.0  # noqa: PLR2004
+    assert request_retry.get_backoff(make_status_error(429)) is False
+    assert request_retry.get_backoff(make_status_error(500)) is False
+    assert (
+        dataclasses.replace(request_retry, respect_retry_after=False).get_backoff(
+            make_status_error(409, {"Retry-After": "120"})
+        )
+        is True
+    )
+
+
+def test_retry_if_replaces_default_rules() -> None:
+    request_retry: typing.Final = any_llm_client.RequestRetryConfig(
+        retry_if=lambda exception: (
+            isinstance(exception, httpx.HTTPStatusError) and b"overloaded" in exception.response.content
+        )
+    )
+    request: typing.Final = httpx.Request("POST", "http://localhost")
+
+    assert request_retry.get_backoff(
+        httpx.HTTPStatusError("", request=request, response=httpx.Response(400, content=b"overloaded"))
+    )
+    assert not request_retry.get_backoff(make_status_error(500))
+
+
+@pytest.mark.usefixtures("_activate_retries")
+@pytest.mark.parametrize(("status_code", "expected_requests_count"), [(400, 1), (500, 3)])
+async def test_client_retries_only_retryable_statuses(status_code: int, expected_requests_count: int) -> None:
+    sent_requests: typing.Final[list[httpx.Request]] = []
+
+    def handle_request(request: httpx.Request) -> httpx.Response:
+        sent_requests.append(request)
+        return httpx.Response(status_code, content=b"Please reduce the length of the messages")
+
+    client: typing.Final = any_llm_client.get_client(
+        OpenAIConfigFactory.build(), transport=httpx.MockTransport(handle_request)
+    )
+
+    with pytest.raises(any_llm_client.LLMError):
+        await client.request_llm_message("Hi")
+
+    assert len(sent_requests) == expected_requests_count
+
+
+@pytest.mark.usefixtures("_activate_retries")
+@pytest.mark.parametrize("stream", [True, False])
+@pytest.mark.parametrize("config_factory", [OpenAIConfigFactory, YandexGPTConfigFactory])
+async def test_retries_send_the_same_encoded_payload(
+    config_factory: type[ModelFactory[any_llm_client.OpenAIConfig | any_llm_client.YandexGPTConfig]], stream: bool
+) -> None:
+    sent_requests: typing.Final[list[httpx.Request]] = []
+
+    def handle_request(request: httpx.Request) -> httpx.Response:
+        sent_requests.append(request)
+        return httpx.Response(500)
+
+    config: typing.Final = config_factory.build()
+    client: typing.Final = any_llm_client.get_client(config, transport=httpx.MockTransport(handle_request))
+
+    with pytest.raises(any_llm_client.LLMError):
+        await request_llm_message(client, stream=stream)
+
+    assert len(sent_requests) == 3  # noqa: PLR2004
+    assert len({one_request.content for one_request in sent_requests}) == 1
+    assert sent_requests[0].headers["Content-Type"] == "application/json"
+    assert json.loads(sent_requests[0].content) == client._prepare_payload(  # type: ignore[attr-defined]  # noqa: SLF001
+        messages="Hi", temperature=config.temperature, stream=stream, extra=None
+    )
+
+
+def test_retry_budget() -> None:
+    budget: typing.Final = any_llm_client.RetryBudget(retry_ratio=0.5, max_balance=1)
+    request_retry: typing.Final = any_llm_client.RequestRetryConfig(budget=budget)
+
+    budget.record_attempt(is_retry=False)
+    assert request_retry.get_backoff(make_status_error(500)) is True
+    budget.record_attempt(is_retry=True)
+    assert request_retry.get_backoff(make_status_error(500)) is False
+    budget.record_attempt(is_retry=False)
+    budget.record_attempt(is_retry=False)
+    assert request_retry.get_backoff(make_status_error(429, {"Retry-After": "1"})) == 1.0
+
+    assert budget.balance == 1
+    assert budget.stats == any_llm_client.RetryBudgetStats(requests_count=3, retries_count=1, rejected_retries_count=1)
+
+
+@pytest.mark.usefixtures("_activate_retries")
+@pytest.mark.parametrize("stream", [True, False])
+async def test_client_fails_fast_when_retry_budget_is_spent(stream: bool) -> None:
+    sent_requests: typing.Final[list[httpx.Request]] = []
+
+    def handle_request(request: httpx.Request) -> httpx.Response:
+        sent_requests.append(request)
+        return httpx.Response(503)
+
+    budget: typing.Final = any_llm_client.RetryBudget(max_balance=2)
+    client: typing.Final = any_llm_client.get_client(
+        OpenAIConfigFactory.build(),
+        request_retry=any_llm_client.RequestRetryConfig(budget=budget),
+        transport=httpx.MockTransport(handle_request),
+    )
+
+    for _ in range(3):
+        with pytest.raises(any_llm_client.LLMError):
+            await request_llm_message(client, stream=stream)
+
+    assert len(sent_requests) == 5  # noqa: PLR2004
+    assert budget.stats.retries_count == 2  # noqa: PLR2004
+    assert budget.stats.rejected_retries_count == 3  # noqa: PLR2004
@@ -0,0 +1,110 @@
+import asyncio
+import typing
+
+import httpx
+import pytest
+from polyfactory.factories.pydantic_factory import ModelFactory
+
+import any_llm_client
+from any_llm_client.balancer import LoadBalancer, Replica
+from any_llm_client.server_metrics import ServerMetrics, get_metrics_url, parse_server_metrics
+from tests.test_balancer import REPLICA_URLS, make_response
+
+
+class OpenAIConfigFactory(ModelFactory[any_llm_client.OpenAIConfig]): ...
+
+
+VLLM_METRICS: typing.Final = """\
+# HELP vllm:num_requests_waiting Number of requests waiting to be processed.
+# TYPE vllm:num_requests_waiting gauge
+vllm:num_requests_waiting{engine="0",model_name="qwen"} 3.0
+vllm:num_requests_waiting{engine="1",model_name="qwen"} 2.0
+vllm:num_requests_running{engine="0",model_name="qwen"} 8.0
+# TYPE vllm:gpu_cache_usage_perc gauge
+vllm:gpu_cache_usage_perc{engine="0",model_name="qwen"} 0.25
+vllm:gpu_cache_usage_perc{engine="1",model_name="qwen"} 0.5 1700000000000
+process_open_fds 42.0
+"""
+
+
+def test_get_metrics_url() -> None:
+    assert get_metrics_url("http://vllm:8000/v1/chat/completions?a=b") == "http://vllm:8000/metrics"
+
+
+@pytest.mark.parametrize(
+    ("text", "expected_metrics"),
+    [
+        (VLLM_METRICS, ServerMetrics(waiting_requests_count=5, kv_cache_usage=0.5, scraped_at=1)),
+        ("vllm:num_requests_waiting 1\n", ServerMetrics(waiting_requests_count=1, kv_cache_usage=0, scraped_at=1)),
+        ('vllm:kv_cache_usage_perc{model_name="qwen"} 0.1\n', None),
+        ("", None),
+        (
+            (
+                'vllm:num_requests_waiting{model_name="qwen"}\nvllm:num_requests_waiting\nvllm:num_requests_waiting{\n'
+                "vllm:num_requests_waiting NaN-ish\nvllm:num_requests_waiting 2\n"
+            ),
+            ServerMetrics(waiting_requests_count=2, kv_cache_usage=0, scraped_at=1),
+        ),
+    ],
+)
+def test_parse_server_metrics(text: str, expected_metrics: ServerMetrics | None) -> None:
+    assert parse_server_metrics(text, scraped_at=1) == expected_metrics
+
+
+def test_replica_with_shorter_server_queue_is_chosen(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr("any_llm_client.balancer.time.monotonic", lambda: 10.0)
+    load_balancer: typing.Final = LoadBalancer(
+        replicas=[
+            Replica(
+                url=REPLICA_URLS[0],
+                server_metrics=ServerMetrics(waiting_requests_count=4, kv_cache_usage=0.9, scraped_at=9),
+            ),
+            Replica(
+                url=REPLICA_URLS[1],
+                server_metrics=ServerMetrics(waiting_requests_count=1, kv_cache_usage=0.9, scraped_at=9),
+            ),
+            Replica(
+                url=REPLICA_URLS[2],
+                server_metrics=ServerMetrics(waiting_requests_count=1, kv_cache_usage=0.1, scraped_at=9),
+            ),
+        ]
+    )
+
+    for _ in range(3):
+        with load_balancer.choose_replica() as replica:
+            assert replica.url == REPLICA_URLS[2]
+
+    load_balancer.max_server_metrics_age = 0.5
+    with load_balancer.choose_replica() as replica:
+        assert replica.url == REPLICA_URLS[0]
+
+
+async def test_client_routes_by_scraped_metrics() -> None:
+    waiting_requests_counts: typing.Final = {"replica-1": 0, "replica-2": 3}
+    requested_hosts: typing.Final[list[str]] = []
+
+    def handle_request(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/metrics":
+            if request.url.host == "replica-0":
+                return httpx.Response(500)
+            return httpx.Response(200, text=f"vllm:num_requests_waiting {waiting_requests_counts[request.url.host]}\n")
+        requested_hosts.append(request.url.host)
+        return make_response()
+
+    client: typing.Final = any_llm_client.OpenAIClient(
+        OpenAIConfigFactory.build(
+            url=REPLICA_URLS,
+            server_metrics_scrape_interval=0.01,
+            prefix_affinity_messages_count=0,
+            warm_up_connections_count=0,
+        ),
+        transport=httpx.MockTransport(handle_request),
+    )
+    async with client:
+        await asyncio.sleep(0.05)
+        for _ in range(4):
+            await client.request_llm_message("Hi")
+
+        # Replica without metrics is routed by client-side count only
+        assert set(requested_hosts) == {"replica-0", "replica-1"}
+        assert client.load_balancer.replicas[0].server_metrics is None
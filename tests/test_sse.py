@@ -0,0 +1,42 @@
+import typing
+
+import pytest
+
+from any_llm_client.sse import iter_sse_data
+
+
+async def parse(byte_chunks: typing.Iterable[bytes]) -> list[bytes]:
+    async def iter_byte_chunks() -> typing.AsyncIterator[bytes]:
+        for one_chunk in byte_chunks:
+            yield one_chunk
+
+    return [one_data async for one_data in iter_sse_data(iter_byte_chunks())]
+
+
+STREAM: typing.Final = (
+    b": comment\n"
+    b"event: message\nid: 1\ndata: first\n\n"
+    b"data:second\r\ndata: line\r\n\r\n"
+    b"retry: 10\n\n"
+    b"data: third\r\rdata: {}\n\n"
+    b"data: incomplete\n"
+)
+
+
+@pytest.mark.parametrize("split_index", range(len(STREAM) + 1))
+async def test_events_are_parsed_whatever_chunk_boundaries(split_index: int) -> None:
+    assert await parse([STREAM[:split_index], b"", STREAM[split_index:]]) == [
+        b"first",
+        b"second\nline",
+        b"third",
+        b"{}",
+    ]
+
+
+async def test_byte_by_byte_stream() -> None:
+    assert await parse(STREAM[index : index + 1] for index in range(len(STREAM))) == [
+        b"first",
+        b"second\nline",
+        b"third",
+        b"{}",
+    ]
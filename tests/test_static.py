@@ -21,6 +21,15 @@ def test_request_retry_config_default_kwargs_match() -> None:
     for one_ignored_setting in ("attempts",):
         config_defaults.pop(one_ignored_setting)
         stamina_defaults.pop(one_ignored_setting)
+    for one_setting_not_passed_to_stamina in (
+        "retry_status_codes",
+        "retry_server_errors",
+        "respect_retry_after",
+        "max_retry_after",
+        "retry_if",
+        "budget",
+    ):
+        config_defaults.pop(one_setting_not_passed_to_stamina)
 
     assert config_defaults == stamina_defaults
 
@@ -0,0 +1,132 @@
+import asyncio
+import typing
+
+import httpx
+import pytest
+import stamina
+from polyfactory.factories.pydantic_factory import ModelFactory
+
+import any_llm_client
+from any_llm_client.http import iter_with_chunk_timeouts
+from tests.conftest import consume_llm_message_chunks
+
+
+class OpenAIConfigFactory(ModelFactory[any_llm_client.OpenAIConfig]): ...
+
+
+class YandexGPTConfigFactory(ModelFactory[any_llm_client.YandexGPTConfig]): ...
+
+
+async def iter_delayed_chunks(delays: list[float]) -> typing.AsyncIterable[int]:
+    for chunk_index, one_delay in enumerate(delays):
+        await asyncio.sleep(one_delay)
+        yield chunk_index
+
+
+async def collect_chunks(chunks: typing.AsyncIterable[int]) -> list[int]:
+    return [one_chunk async for one_chunk in chunks]
+
+
+@pytest.mark.parametrize(("first_chunk_timeout", "chunk_idle_timeout"), [(0, 0), (0.5, 0), (0, 0.5), (0.5, 0.5)])
+async def test_chunks_in_time_are_passed_through(first_chunk_timeout: float, chunk_idle_timeout: float) -> None:
+    chunks: typing.Final = iter_with_chunk_timeouts(
+        iter_delayed_chunks([0.01, 0.01, 0.01]),
+        first_chunk_timeout=first_chunk_timeout,
+        chunk_idle_timeout=chunk_idle_timeout,
+    )
+    assert await collect_chunks(chunks) == [0, 1, 2]
+
+
+@pytest.mark.parametrize(
+    ("delays", "expected_error"),
+    [
+        ([0.5, 0], any_llm_client.LLMStreamTimeoutError(timeout=0.05, chunks_count=0)),
+        ([0, 0, 0.5], any_llm_client.LLMStreamTimeoutError(timeout=0.01, chunks_count=2)),
+    ],
+)
+async def test_slow_chunk_raises(delays: list[float], expected_error: any_llm_client.LLMStreamTimeoutError) -> None:
+    chunks: typing.Final = iter_with_chunk_timeouts(
+        iter_delayed_chunks(delays), first_chunk_timeout=0.05, chunk_idle_timeout=0.01
+    )
+    with pytest.raises(any_llm_client.LLMStreamTimeoutError) as exc_info:
+        await collect_chunks(chunks)
+    assert exc_info.value == expected_error
+
+
+async def test_time_between_reads_is_not_counted() -> None:
+    chunks: typing.Final = []
+    async for one_chunk in iter_with_chunk_timeouts(
+        iter_delayed_chunks([0, 0]), first_chunk_timeout=0.01, chunk_idle_timeout=0.01
+    ):
+        chunks.append(one_chunk)
+        await asyncio.sleep(0.05)
+    assert chunks == [0, 1]
+
+
+class StalledStream(httpx.AsyncByteStream):
+    def __init__(self, first_line: bytes) -> None:
+        self.first_line = first_line
+
+    async def __aiter__(self) -> typing.AsyncIterator[bytes]:
+        yield self.first_line
+        await asyncio.Event().wait()
+
+
+async def test_stalled_openai_stream_raises() -> None:
+    client: typing.Final = any_llm_client.OpenAIClient(
+        OpenAIConfigFactory.build(
+            url="http://llm/v1/chat/completions",
+            first_chunk_timeout=1,
+            chunk_idle_timeout=0.05,
+            server_metrics_scrape_interval=0,
+            force_user_assistant_message_alternation=False,
+        ),
+        transport=httpx.MockTransport(
+            lambda _: httpx.Response(
+                200,
+                headers={"Content-Type": "text/event-stream"},
+                stream=StalledStream(b'data: {"choices": [{"delta": {"content": "Hi"}}]}\n\n'),
+            )
+        ),
+    )
+
+    with pytest.raises(any_llm_client.LLMStreamTimeoutError) as exc_info:
+        await consume_llm_message_chunks(client.stream_llm_message_chunks("Hi"))
+    assert exc_info.value == any_llm_client.LLMStreamTimeoutError(timeout=0.05, chunks_count=1)
+
+
+async def test_stalled_yandexgpt_stream_raises() -> None:
+    client: typing.Final = any_llm_client.YandexGPTClient(
+        YandexGPTConfigFactory.build(first_chunk_timeout=0.05, chunk_idle_timeout=1),
+        transport=httpx.MockTransport(lambda _: httpx.Response(200, stream=StalledStream(b""))),
+    )
+
+    with pytest.raises(any_llm_client.LLMStreamTimeoutError) as exc_info:
+        await consume_llm_message_chunks(client.stream_llm_message_chunks("Hi"))
+    assert exc_info.value == any_llm_client.LLMStreamTimeoutError(timeout=0.05, chunks_count=0)
+
+
+@pytest.fixture
+def _activate_retries() -> typing.Iterator[None]:
+    stamina.set_active(True)
+    with stamina.set_testing(True, attempts=3):
+        yield
+    stamina.set_active(False)
+
+
+@pytest.mark.usefixtures("_activate_retries")
+async def test_stream_is_reopened_on_first_chunk_timeout() -> None:
+    response_streams: typing.Final = iter(
+        [
+            StalledStream(b""),
+            httpx.ByteStream(b'{"result": {"alternatives": [{"message": {"role": "assistant", "text": "Hi"}}]}}\n'),
+        ]
+    )
+    client: typing.Final = any_llm_client.YandexGPTClient(
+        YandexGPTConfigFactory.build(first_chunk_timeout=0.05, chunk_idle_timeout=0),
+        transport=httpx.MockTransport(lambda _: httpx.Response(200, stream=next(response_streams))),
+    )
+
+    assert await consume_llm_message_chunks(client.stream_llm_message_chunks("Hi")) == [
+        any_llm_client.LLMResponse(content="Hi")
+    ]
@@ -0,0 +1,96 @@
+import asyncio
+import typing
+
+import httpx
+import pytest
+from polyfactory.factories.pydantic_factory import ModelFactory
+
+import any_llm_client
+
+
+class OpenAIConfigFactory(ModelFactory[any_llm_client.OpenAIConfig]): ...
+
+
+REPLICA_URLS: typing.Final = ["http://replica-1/v1/chat/completions", "http://replica-2/v1/chat/completions"]
+
+
+def make_client(
+    handle_request: typing.Callable[[httpx.Request], typing.Any],
+    *,
+    warm_up_connections_count: int,
+    keep_alive_interval: float = 0,
+) -> any_llm_client.OpenAIClient:
+    return any_llm_client.OpenAIClient(
+        OpenAIConfigFactory.build(
+            url=REPLICA_URLS,
+            server_metrics_scrape_interval=0,
+            warm_up_connections_count=warm_up_connections_count,
+            keep_alive_interval=keep_alive_interval,
+        ),
+        transport=httpx.MockTransport(handle_request),
+    )
+
+
+async def test_connections_are_opened_concurrently() -> None:
+    warm_up_requests: typing.Final[list[httpx.Request]] = []
+    all_requests_sent: typing.Final = asyncio.Event()
+
+    async def handle_request(request: httpx.Request) -> httpx.Response:
+        warm_up_requests.append(request)
+        if len(warm_up_requests) == 6:  # noqa: PLR2004
+            all_requests_sent.set()
+        await all_requests_sent.wait()
+        return httpx.Response(405)
+
+    client: typing.Final = make_client(handle_request, warm_up_connections_count=3)
+
+    async with client:
+        assert await client.connections_warm_up.wait() == any_llm_client.WarmUpState.warm
+    assert client.connections_warm_up.state == any_llm_client.WarmUpState.cold
+    assert {one_request.method for one_request in warm_up_requests} == {"HEAD"}
+    assert sorted(str(one_request.url) for one_request in warm_up_requests) == sorted(REPLICA_URLS * 3)
+
+
+async def test_failed_warm_up() -> None:
+    def handle_request(request: httpx.Request) -> httpx.Response:
+        if request.url.host == "replica-2":
+            raise httpx.ConnectError("failed", request=request)
+        return httpx.Response(200)
+
+    async with make_client(handle_request, warm_up_connections_count=1) as client:
+        assert await client.connections_warm_up.wait() == any_llm_client.WarmUpState.failed
+
+
+async def test_connections_are_kept_alive() -> None:
+    requests_count = 0
+
+    def handle_request(_: httpx.Request) -> httpx.Response:
+        nonlocal requests_count
+        requests_count += 1
+        return httpx.Response(200)
+
+    async with make_client(handle_request, warm_up_connections_count=1, keep_alive_interval=0.01) as client:
+        await asyncio.sleep(0.05)
+        assert client.connections_warm_up.state == any_llm_client.WarmUpState.warm
+        assert requests_count > len(REPLICA_URLS)
+
+
+@pytest.mark.parametrize("config_type", [any_llm_client.OpenAIConfig, any_llm_client.YandexGPTConfig])
+async def test_disabled_warm_up(
+    config_type: type[any_llm_client.OpenAIConfig | any_llm_client.YandexGPTConfig],
+) -> None:
+    config: typing.Final = ModelFactory.create_factory(config_type).build(warm_up_connections_count=0)
+
+    async with any_llm_client.get_client(
+        config, transport=httpx.MockTransport(lambda _: httpx.Response(200))
+    ) as client:
+        assert await client.connections_warm_up.wait() == any_llm_client.WarmUpState.disabled  # type: ignore[attr-defined]
+
+
+async def test_wait_does_not_block_before_client_is_entered() -> None:
+    client: typing.Final = make_client(lambda _: httpx.Response(200), warm_up_connections_count=1)
+
+    assert await client.connections_warm_up.wait() == any_llm_client.WarmUpState.cold
+    async with client:
+        assert await client.connections_warm_up.wait() == any_llm_client.WarmUpState.warm
+    assert await client.connections_warm_up.wait() == any_llm_client.WarmUpState.cold
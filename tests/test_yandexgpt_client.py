@@ -160,6 +160,49 @@ class TestYandexGPTRequestLLMMessageChunks:
             )
 
 
+def make_stream_line(text: str) -> str:
+    return YandexGPTResponse(
+        result=YandexGPTResult(
+            alternatives=[
+                YandexGPTAlternative(message=YandexGPTMessage(role=any_llm_client.MessageRole.assistant, text=text))
+            ],
+        ),
+    ).model_dump_json()
+
+
+async def stream_lines(lines: list[str]) -> list[any_llm_client.LLMResponse]:
+    response: typing.Final = httpx.Response(200, content="\n".join(lines) + "\n")
+    client: typing.Final = any_llm_client.get_client(
+        YandexGPTConfigFactory.build(first_chunk_timeout=0, chunk_idle_timeout=0),
+        transport=httpx.MockTransport(lambda _: response),
+    )
+    return await consume_llm_message_chunks(
+        client.stream_llm_message_chunks(**LLMFuncRequestWithTextContentMessagesFactory.build()),
+    )
+
+
+class TestYandexGPTCumulativeStreamDecoding:
+    async def test_only_new_escaped_text_is_decoded(self) -> None:
+        texts: typing.Final = ['He said "', 'He said "hi\\', 'He said "hi\\" 😀\n', "Rewritten", "Rewritten text"]
+
+        assert await stream_lines([make_stream_line(one_text) for one_text in texts]) == [
+            any_llm_client.LLMResponse(content='He said "'),
+            any_llm_client.LLMResponse(content="hi\\"),
+            any_llm_client.LLMResponse(content='" 😀\n'),
+            # Like before, text that doesn't continue the previous one is cut at the length of the previous text
+            any_llm_client.LLMResponse(content=""),
+            any_llm_client.LLMResponse(content=" text"),
+        ]
+
+    @pytest.mark.parametrize(
+        "make_malformed_line",
+        [lambda line: line[: line.index('"ab"') + 3], lambda line: line.replace('"ab"', '"a\\x"')],
+    )
+    async def test_fails_with_malformed_continuation(self, make_malformed_line: typing.Callable[[str], str]) -> None:
+        with pytest.raises(LLMResponseValidationError):
+            await stream_lines([make_stream_line("a"), make_malformed_line(make_stream_line("ab"))])
+
+
 class TestYandexGPTLLMErrors:
     @pytest.mark.parametrize("stream", [True, False])
     @pytest.mark.parametrize("status_code", [400, 500])